@@ -1,17 +1,34 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, make_response
 import joblib
 import pandas as pd
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from flask_cors import CORS
 from flasgger import Swagger
-from pydantic import BaseModel, Field, validator, ValidationError
-from typing import Literal
+from pydantic import ValidationError
 import jwt
 from functools import wraps
+from schemas import LoanApplication
+from cache import cached_response, invalidate as invalidate_cache, init_cache_invalidation
+from sketches import record_scoring, get_live_stats
+from metrics import register_metrics, stage
+from tracing import register_tracing
+from profiling import profiled, list_profiles, download_profile
+from sampling_profiler import ensure_sampler, get_profile_samples, reset_profile_samples
+from querylog import get_slow_queries
+from memprofile import (
+    register_memory_hooks, get_memory_status, set_memory_mode,
+    take_memory_snapshot, diff_memory_snapshots
+)
+from capture import register_capture
+import model_store
+from online_learning import (
+    init_online_tables, ensure_online_learner, record_feedback,
+    get_online_status, run_online_update
+)
 
 # Load environment variables
 load_dotenv()
@@ -21,6 +38,10 @@ JWT_SECRET = os.getenv("JWT_SECRET", "loanguard-dev-secret-change-in-prod")
 app = Flask(__name__)
 CORS(app)
 Swagger(app)
+register_tracing(app)
+register_metrics(app)
+register_memory_hooks(app)
+register_capture(app)
 
 # --- JWT Auth Helper ---
 def token_required(f):
@@ -38,26 +59,6 @@ def token_required(f):
         return f(*args, **kwargs)
     return decorated
 
-# --- Input Validation Schema ---
-class LoanApplication(BaseModel):
-    ApplicantName: str = Field("", description="Full name of the applicant")
-    Gender: Literal["Male", "Female"]
-    Married: Literal["Yes", "No"]
-    Dependents: Literal["0", "1", "2", "3+"]
-    Education: Literal["Graduate", "Not Graduate"]
-    Self_Employed: Literal["Yes", "No"]
-    ApplicantIncome: int = Field(..., gt=0, description="Monthly income in ₹")
-    CoapplicantIncome: int = Field(..., ge=0)
-    LoanAmount: int = Field(..., gt=0, description="Loan amount in real ₹ (divided by 1000 internally before ML model)")
-    Loan_Amount_Term: int = Field(..., gt=0)
-    Credit_History: int = Field(..., ge=0, le=1, description="0 or 1")
-    Property_Area: Literal["Urban", "Semiurban", "Rural"]
-
-    @validator("Credit_History", pre=True)
-    def coerce_credit_history(cls, v):
-        """Accept '0', '1', 0, or 1 — all valid."""
-        return int(v)
-
 # Load ML model
 model = joblib.load("models/loan_model.pkl")
 scaler = joblib.load("models/scaler.pkl")
@@ -73,17 +74,21 @@ app.config["scaler"] = scaler
 app.config["label_encoders"] = label_encoders
 app.config["explainer"] = explainer
 app.config["classify_risk"] = None  # set after classify_risk is defined
+model_store.mark_loaded()
+
+
+@app.before_request
+def _hot_swap_models():
+    """Pick up a bundle published by a retrain or the online learner (checked at most once a second)."""
+    global model, scaler, label_encoders, explainer
+    bundle = model_store.poll_for_new_bundle()
+    if bundle:
+        model, scaler, label_encoders, explainer = bundle
+        app.config["model"] = model
+        app.config["scaler"] = scaler
+        app.config["label_encoders"] = label_encoders
+        app.config["explainer"] = explainer
 
-def get_connection():
-    return psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        database=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        port=os.getenv("DB_PORT"),
-        sslmode="require",
-        connect_timeout=10
-    )
 
 def classify_risk(prob):
     """prob is P(Approved). Invert for risk rating."""
@@ -133,7 +138,8 @@ def check_eligibility():
     try:
         raw = request.json or {}
         try:
-            app_input = LoanApplication.model_validate(raw)
+            with stage("validation"):
+                app_input = LoanApplication.model_validate(raw)
         except ValidationError as ve:
             errors = [{"field": e["loc"][0], "msg": e["msg"]} for e in ve.errors()]
             return jsonify({"error": "Validation failed", "details": errors}), 422
@@ -143,22 +149,24 @@ def check_eligibility():
         # Accept real ₹ LoanAmount; divide by 1000 for ML model (trained on ₹ thousands)
         real_loan_amount = data["LoanAmount"]
         data["LoanAmount"] = real_loan_amount / 1000
-        df = pd.DataFrame([data])
-
-        for col in df.columns:
-            if col in label_encoders:
-                df[col] = label_encoders[col].transform(df[col])
-
-        df_scaled = scaler.transform(df)
-        probability = float(model.predict_proba(df_scaled)[0][1])
-        prediction = int(model.predict(df_scaled)[0])
-        risk_level = classify_risk(probability)
+        with stage("encoding"):
+            df = pd.DataFrame([data])
+            for col in df.columns:
+                if col in label_encoders:
+                    df[col] = label_encoders[col].transform(df[col])
+            df_scaled = scaler.transform(df)
+
+        with stage("scoring"):
+            probability = float(model.predict_proba(df_scaled)[0][1])
+            prediction = int(model.predict(df_scaled)[0])
+            risk_level = classify_risk(probability)
 
         # Build human-readable tips from SHAP
         tips = []
         explanation = {}
         if explainer:
-            shap_values = explainer.shap_values(df_scaled)
+            with stage("explanation"):
+                shap_values = explainer.shap_values(df_scaled)
             vals = shap_values[1][0] if isinstance(shap_values, list) else shap_values[0]
             feat_imp = dict(zip(df.columns, vals))
             sorted_feats = sorted(feat_imp.items(), key=lambda x: abs(x[1]), reverse=True)
@@ -199,6 +207,9 @@ def check_eligibility():
             tips = ["⚠️ " + affordability_note] + tips
         # ───────────────────────────────────────────────────────────────────
 
+        record_scoring("check_eligibility", app_input.ApplicantIncome, app_input.CoapplicantIncome,
+                       real_loan_amount, probability, prediction)
+
         return jsonify({
             "prediction": prediction,
             "probability": round(probability, 4),
@@ -211,6 +222,7 @@ def check_eligibility():
         return jsonify({"error": str(e)}), 500
 
 @app.route("/predict", methods=["POST"])
+@profiled
 def predict():
     """Predict Loan Risk
     ---
@@ -243,7 +255,8 @@ def predict():
 
         # Validate input with Pydantic
         try:
-            app_input = LoanApplication.model_validate(raw)
+            with stage("validation"):
+                app_input = LoanApplication.model_validate(raw)
         except ValidationError as ve:
             errors = [{"field": e["loc"][0], "msg": e["msg"]} for e in ve.errors()]
             return jsonify({"error": "Validation failed", "details": errors}), 422
@@ -254,23 +267,26 @@ def predict():
         # Convert real ₹ LoanAmount → thousands for the ML model (trained in ₹ thousands)
         real_loan_amount = data["LoanAmount"]
         data["LoanAmount"] = real_loan_amount / 1000
-        df = pd.DataFrame([data])
-
-        # Encode categorical features
-        for col in df.columns:
-            if col in label_encoders:
-                df[col] = label_encoders[col].transform(df[col])
-
-        df_scaled = scaler.transform(df)
-
-        prediction = int(model.predict(df_scaled)[0])
-        probability = float(model.predict_proba(df_scaled)[0][1])
-        risk_level = classify_risk(probability)
+        with stage("encoding"):
+            df = pd.DataFrame([data])
+            # Encode categorical features
+            for col in df.columns:
+                if col in label_encoders:
+                    df[col] = label_encoders[col].transform(df[col])
+            df_scaled = scaler.transform(df)
+
+        with stage("scoring"):
+            prediction = int(model.predict(df_scaled)[0])
+            probability = float(model.predict_proba(df_scaled)[0][1])
+            risk_level = classify_risk(probability)
+        record_scoring("predict", app_input.ApplicantIncome, app_input.CoapplicantIncome,
+                       real_loan_amount, probability, prediction)
 
         # SHAP Explanation
         explanation = {}
         if explainer:
-            shap_values = explainer.shap_values(df_scaled)
+            with stage("explanation"):
+                shap_values = explainer.shap_values(df_scaled)
             # For linear explainer, it's a single array or list of arrays depending on model type
             if isinstance(shap_values, list):
                 vals = shap_values[1][0] # Class 1 (Approved)
@@ -284,36 +300,38 @@ def predict():
             explanation = {k: round(float(v), 4) for k, v in sorted_feats[:5]}
 
         # Save to Supabase
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO applications (
-                applicant_name, gender, married, dependents, education, self_employed,
-                applicant_income, coapplicant_income, loan_amount,
-                loan_term, credit_history, property_area,
-                prediction, probability, risk_level, created_at
-            ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        """, (
-            applicant_name,
-            input_data_for_db.get("Gender"),
-            input_data_for_db.get("Married"),
-            input_data_for_db.get("Dependents"),
-            input_data_for_db.get("Education"),
-            input_data_for_db.get("Self_Employed"),
-            int(input_data_for_db.get("ApplicantIncome", 0)),
-            int(input_data_for_db.get("CoapplicantIncome", 0)),
-            int(input_data_for_db.get("LoanAmount", 0)),
-            int(input_data_for_db.get("Loan_Amount_Term", 0)),
-            int(input_data_for_db.get("Credit_History", 0)),
-            input_data_for_db.get("Property_Area"),
-            prediction,
-            probability,
-            risk_level,
-            datetime.now()
-        ))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with stage("db_insert"):
+            conn = get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO applications (
+                    applicant_name, gender, married, dependents, education, self_employed,
+                    applicant_income, coapplicant_income, loan_amount,
+                    loan_term, credit_history, property_area,
+                    prediction, probability, risk_level, created_at
+                ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+            """, (
+                applicant_name,
+                input_data_for_db.get("Gender"),
+                input_data_for_db.get("Married"),
+                input_data_for_db.get("Dependents"),
+                input_data_for_db.get("Education"),
+                input_data_for_db.get("Self_Employed"),
+                int(input_data_for_db.get("ApplicantIncome", 0)),
+                int(input_data_for_db.get("CoapplicantIncome", 0)),
+                int(input_data_for_db.get("LoanAmount", 0)),
+                int(input_data_for_db.get("Loan_Amount_Term", 0)),
+                int(input_data_for_db.get("Credit_History", 0)),
+                input_data_for_db.get("Property_Area"),
+                prediction,
+                probability,
+                risk_level,
+                datetime.now()
+            ))
+            conn.commit()
+            cursor.close()
+            conn.close()
+        invalidate_cache()  # other workers hear about it via NOTIFY
 
         return jsonify({
             "prediction": prediction,
@@ -361,32 +379,13 @@ def login():
             JWT_SECRET,
             algorithm="HS256"
         )
-        try:
-            _audit_log("LOGIN", username, {"role": user["role"]})
-        except Exception:
-            pass
+        _audit_log("LOGIN", username, {"role": user["role"]})
         return jsonify({"token": token, "role": user["role"], "name": user["name"]})
     return jsonify({"error": "Invalid credentials"}), 401
 
-@app.route("/applications", methods=["GET"])
-@token_required
-def get_applications():
-    """Get All Applications
-    ---
-    responses:
-      200:
-        description: List of applications
-    """
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT * FROM applications ORDER BY id DESC")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return jsonify(rows)
-
 @app.route("/stats", methods=["GET"])
 @token_required
+@cached_response
 def stats():
     """Get Performance Statistics
     ---
@@ -416,7 +415,7 @@ from auth import (
     get_admin_users, get_me, get_connection as _ac_conn,
     create_user, update_user, delete_user, init_users_table
 )
-from monitoring import get_drift_status
+from monitoring import get_drift_status, init_drift_tables, ensure_drift_scheduler
 import subprocess
 import sys
 
@@ -426,6 +425,40 @@ try:
 except Exception as e:
     print(f"[LoanGuard] Warning: could not init lg_users table: {e}")
 
+# Init cache invalidation trigger (migration 006)
+try:
+    init_cache_invalidation(get_connection)
+except Exception as e:
+    print(f"[LoanGuard] Warning: could not init cache invalidation: {e}")
+
+# Init drift evaluation state (migration 007); the evaluator thread starts lazily
+# inside each worker so it survives gunicorn's pre-fork
+try:
+    init_drift_tables(get_connection)
+except Exception as e:
+    print(f"[LoanGuard] Warning: could not init drift tables: {e}")
+
+# Init online learning feedback buffer (migration 008)
+try:
+    init_online_tables(get_connection)
+except Exception as e:
+    print(f"[LoanGuard] Warning: could not init online learning tables: {e}")
+
+
+@app.before_request
+def _start_background_jobs():
+    ensure_drift_scheduler()
+    ensure_online_learner()
+    ensure_sampler()
+
+
+# Init analytics rollup tables (migration 005)
+from routes.analytics import init_analytics_rollups
+try:
+    init_analytics_rollups(get_connection)
+except Exception as e:
+    print(f"[LoanGuard] Warning: could not init analytics rollups: {e}")
+
 # Init leads tables
 from leads import init_leads_tables, register_leads_routes
 try:
@@ -436,17 +469,18 @@ except Exception as e:
 def _audit_log(event_type, username, details):
     """Append-only audit log insert."""
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO audit_log (event_type, username, details, created_at)
-            VALUES (%s, %s, %s::jsonb, %s)
-        """, (event_type, username, __import__('json').dumps(details), datetime.now()))
-        conn.commit()
-        cur.close()
-        conn.close()
-    except Exception:
-        pass  # audit never blocks the main flow
+        with stage("audit"):
+            conn = get_connection()
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO audit_log (event_type, username, details, created_at)
+                VALUES (%s, %s, %s::jsonb, %s)
+            """, (event_type, username, __import__('json').dumps(details), datetime.now()))
+            conn.commit()
+            cur.close()
+            conn.close()
+    except Exception as e:
+        print(f"[Audit] {event_type} by {username} not logged: {e}")  # audit never blocks the main flow
 
 @app.route("/me", methods=["GET"])
 @token_required
@@ -463,37 +497,29 @@ def admin_users_get():
 def admin_users_create():
     result = create_user()
     if result[1] == 201:
-        try:
-            data = request.json or {}
-            _audit_log("USER_CREATED", request.current_user, {
-                "new_username": data.get("username"), "role": data.get("role")
-            })
-        except Exception:
-            pass
+        data = request.json or {}
+        _audit_log("USER_CREATED", request.current_user, {
+            "new_username": data.get("username"), "role": data.get("role")
+        })
     return result
 
 @app.route("/admin/users/<username>", methods=["PUT"])
 @role_required("ADMIN")
 def admin_users_update(username):
     result = update_user(username)
-    try:
-        _audit_log("USER_UPDATED", request.current_user, {"target": username})
-    except Exception:
-        pass
+    _audit_log("USER_UPDATED", request.current_user, {"target": username})
     return result
 
 @app.route("/admin/users/<username>", methods=["DELETE"])
 @role_required("ADMIN")
 def admin_users_delete(username):
     result = delete_user(username)
-    try:
-        _audit_log("USER_DELETED", request.current_user, {"target": username})
-    except Exception:
-        pass
+    _audit_log("USER_DELETED", request.current_user, {"target": username})
     return result
 
 @app.route("/drift-status", methods=["GET"])
 @token_required
+@cached_response
 def drift_status():
     return jsonify(get_drift_status())
 
@@ -518,15 +544,20 @@ def audit_log_view():
 @role_required("ADMIN")
 def retrain_model():
     """Trigger model retraining — ADMIN only.
+    Skipped (skipped=true) when the data, options, training code and libraries
+    match the live model; pass ?force=1 to retrain anyway.
     ---
+    parameters:
+      - {name: force, in: query, type: boolean, description: "Retrain even if nothing changed"}
     responses:
       200:
         description: Retraining result with accuracy and F1
     """
     try:
         script_path = os.path.join(os.path.dirname(__file__), "train_model.py")
+        force = request.args.get("force", "").lower() in ("1", "true", "yes")
         result = subprocess.run(
-            [sys.executable, script_path],
+            [sys.executable, script_path] + (["--force"] if force else []),
             capture_output=True, text=True, timeout=120,
             cwd=os.path.dirname(__file__)
         )
@@ -542,8 +573,10 @@ def retrain_model():
                 except Exception:
                     pass
         success = result.returncode == 0
-        _audit_log("RETRAIN", request.current_user, {"success": success, "accuracy": accuracy, "f1": f1})
-        return jsonify({"success": success, "accuracy": accuracy, "f1": f1, "output": output})
+        skipped = "Training inputs unchanged" in output
+        _audit_log("RETRAIN", request.current_user,
+                   {"success": success, "accuracy": accuracy, "f1": f1, "skipped": skipped})
+        return jsonify({"success": success, "accuracy": accuracy, "f1": f1, "skipped": skipped, "output": output})
     except subprocess.TimeoutExpired:
         return jsonify({"error": "Retraining timed out after 120s"}), 500
     except Exception as e:
@@ -588,9 +621,11 @@ def update_application_status(app_id):
         if cursor.rowcount == 0:
             cursor.close(); conn.close()
             return jsonify({"error": "Application not found"}), 404
+        record_feedback(cursor, app_id, new_status)
         conn.commit()
         cursor.close()
         conn.close()
+        invalidate_cache()
         _audit_log("STATUS_UPDATE", request.current_user, {"app_id": app_id, "new_status": new_status})
         return jsonify({"success": True, "id": app_id, "status": new_status})
     except Exception as e:
@@ -655,21 +690,120 @@ def get_model_info():
 
 # Register modular routes
 from routes.batch import batch_predict
+from routes.applications import get_applications
 from routes.analytics import (
     get_trends, get_income_bracket, get_risk_distribution,
-    get_loan_amount_distribution, get_property_area_stats
+    get_loan_amount_distribution, get_property_area_stats, get_dashboard, get_aggregate
 )
 from routes.reports import generate_report
+from routes.export import export_table
+from bulk_import import import_applications
 
 app.config["classify_risk"] = classify_risk
 
-app.add_url_rule("/batch-predict", "batch_predict", token_required(batch_predict), methods=["POST"])
-app.add_url_rule("/analytics/trends", "analytics_trends", token_required(get_trends), methods=["GET"])
-app.add_url_rule("/analytics/income-bracket", "analytics_income", token_required(get_income_bracket), methods=["GET"])
-app.add_url_rule("/analytics/risk", "analytics_risk", token_required(get_risk_distribution), methods=["GET"])
-app.add_url_rule("/analytics/loan-distribution", "analytics_loan", token_required(get_loan_amount_distribution), methods=["GET"])
-app.add_url_rule("/analytics/property-area", "analytics_area", token_required(get_property_area_stats), methods=["GET"])
-app.add_url_rule("/report/<int:app_id>", "report", token_required(generate_report), methods=["GET"])
+app.add_url_rule("/applications", "get_applications", token_required(get_applications), methods=["GET"])
+app.add_url_rule("/batch-predict", "batch_predict", token_required(profiled(batch_predict)), methods=["POST"])
+app.add_url_rule("/analytics/trends", "analytics_trends", token_required(cached_response(get_trends)), methods=["GET"])
+app.add_url_rule("/analytics/income-bracket", "analytics_income", token_required(cached_response(get_income_bracket)), methods=["GET"])
+app.add_url_rule("/analytics/risk", "analytics_risk", token_required(cached_response(get_risk_distribution)), methods=["GET"])
+app.add_url_rule("/analytics/loan-distribution", "analytics_loan", token_required(cached_response(get_loan_amount_distribution)), methods=["GET"])
+app.add_url_rule("/analytics/property-area", "analytics_area", token_required(cached_response(get_property_area_stats)), methods=["GET"])
+app.add_url_rule("/analytics/dashboard", "analytics_dashboard", token_required(cached_response(get_dashboard)), methods=["GET"])
+app.add_url_rule("/analytics/live", "analytics_live", token_required(get_live_stats), methods=["GET"])
+app.add_url_rule("/analytics/aggregate", "analytics_aggregate", token_required(cached_response(get_aggregate)), methods=["GET"])
+app.add_url_rule("/report/<int:app_id>", "report", token_required(profiled(generate_report)), methods=["GET"])
+
+
+@app.route("/admin/profiles", methods=["GET"])
+@role_required("ADMIN")
+def admin_profiles():
+    return list_profiles()
+
+
+@app.route("/admin/profiles/<profile_id>", methods=["GET"])
+@role_required("ADMIN")
+def admin_profile_download(profile_id):
+    return download_profile(profile_id)
+
+
+@app.route("/admin/profiler", methods=["GET"])
+@role_required("ADMIN")
+def admin_profiler():
+    return get_profile_samples()
+
+
+@app.route("/admin/profiler/reset", methods=["POST"])
+@role_required("ADMIN")
+def admin_profiler_reset():
+    return reset_profile_samples()
+
+
+@app.route("/admin/slow-queries", methods=["GET"])
+@role_required("ADMIN")
+def admin_slow_queries():
+    return get_slow_queries()
+
+
+@app.route("/admin/memory", methods=["GET"])
+@role_required("ADMIN")
+def admin_memory_status():
+    return get_memory_status()
+
+
+@app.route("/admin/memory", methods=["POST"])
+@role_required("ADMIN")
+def admin_memory_mode():
+    result = set_memory_mode()
+    _audit_log("MEMORY_PROFILING", request.current_user, request.get_json(silent=True) or {})
+    return result
+
+
+@app.route("/admin/memory/snapshot", methods=["POST"])
+@role_required("ADMIN")
+def admin_memory_snapshot():
+    return take_memory_snapshot()
+
+
+@app.route("/admin/memory/diff", methods=["GET"])
+@role_required("ADMIN")
+def admin_memory_diff():
+    return diff_memory_snapshots()
+
+
+@app.route("/admin/online-learning", methods=["GET"])
+@role_required("ADMIN")
+def admin_online_learning():
+    return get_online_status()
+
+
+@app.route("/admin/online-learning/run", methods=["POST"])
+@role_required("ADMIN")
+def admin_online_learning_run():
+    result = run_online_update()
+    _audit_log("ONLINE_UPDATE", request.current_user, {})
+    return result
+
+
+@app.route("/admin/export/<table>", methods=["GET"])
+@role_required("ADMIN")
+def admin_export(table):
+    result = export_table(table)
+    _audit_log("EXPORT", request.current_user, {"table": table, **request.args.to_dict()})
+    return result
+
+
+@app.route("/admin/import", methods=["POST"])
+@role_required("ADMIN")
+def admin_import():
+    response = make_response(import_applications())
+    summary = response.get_json(silent=True) or {}
+    _audit_log("BULK_IMPORT", request.current_user, {
+        "filename": request.files["file"].filename if "file" in request.files else None,
+        "status": response.status_code,
+        "inserted": summary.get("inserted"), "rejected": summary.get("rejected"),
+        "failed_at_row": summary.get("failed_at_row"), "error": summary.get("error"),
+    })
+    return response
 
 # ── Gemini Chat ──────────────────────────────────────────────────────────────
 from routes.chat import chat_bp
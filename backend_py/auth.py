@@ -7,6 +7,7 @@ from functools import wraps
 from flask import request, jsonify
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection
 from dotenv import load_dotenv
 from datetime import datetime
 
@@ -17,18 +18,6 @@ RESEND_FROM = os.getenv("RESEND_FROM_EMAIL", "onboarding@resend.dev")
 APP_URL = os.getenv("APP_URL", "http://localhost:3000")
 
 
-def get_connection():
-    return psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        database=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        port=os.getenv("DB_PORT"),
-        sslmode="require",
-        connect_timeout=10
-    )
-
-
 def hash_password(password: str) -> str:
     """SHA-256 hash (simple — use bcrypt for production)."""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -0,0 +1,404 @@
+"""
+http_bench.py — End-to-end HTTP benchmark for the LoanGuard API
+Boots a local PostgreSQL stand-in (optional, via Docker), seeds it, starts the
+app (gunicorn when installed, else the Flask server) and drives every
+scenario at a fixed concurrency, reporting throughput and p50/p95/p99/max.
+
+    cd backend_py
+    python benchmarks/http_bench.py --docker                       # full run, JSON to bench_results.json
+    python benchmarks/http_bench.py --docker --save-baseline       # record benchmarks/baseline.json
+    python benchmarks/http_bench.py --docker --baseline benchmarks/baseline.json   # exit 1 on regression
+    python benchmarks/http_bench.py --url http://127.0.0.1:5000 --scenarios predict,dashboard
+
+The app connects with sslmode=require by default, so the Docker stand-in runs
+PostgreSQL with the image's snakeoil certificate. An existing local server
+(--db-host/--db-port/...) needs ssl=on as well, or --db-sslmode disable when it
+has no TLS (the app then gets DB_SSLMODE=disable). The server version and
+sslmode are recorded in the results' meta, since baselines are only comparable
+on the same setup.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import subprocess
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import psycopg2
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_SQL = os.path.join(BACKEND_DIR, "benchmarks", "schema.sql")
+BOOTSTRAP_MIGRATIONS = ["002_status_column.sql", "003_applicant_name.sql", "004_applications_indexes.sql"]
+LOAN_DATA = os.path.join(BACKEND_DIR, "data", "loan_data.csv")
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmarks", "baseline.json")
+
+DOCKER_NAME = "loanguard-bench-pg"
+DOCKER_IMAGE = "postgres:16"
+
+FEATURES = ["Gender", "Married", "Dependents", "Education", "Self_Employed",
+            "ApplicantIncome", "CoapplicantIncome", "LoanAmount", "Loan_Amount_Term",
+            "Credit_History", "Property_Area"]
+ANALYTICS_PATHS = {
+    "stats": "/stats",
+    "drift_status": "/drift-status",
+    "trends": "/analytics/trends",
+    "income_bracket": "/analytics/income-bracket",
+    "risk": "/analytics/risk",
+    "loan_distribution": "/analytics/loan-distribution",
+    "property_area": "/analytics/property-area",
+    "dashboard": "/analytics/dashboard",
+    # mean_probability is not in the rollup, so this exercises the raw-table path
+    "aggregate": "/analytics/aggregate?group_by=applicant_income&edges=3000,6000,10000"
+                 "&metrics=count,approval_rate,mean_probability",
+    "live": "/analytics/live",
+    "applications_page": "/applications?limit=100",
+}
+
+
+# ── Test data ─────────────────────────────────────────────────────────────────
+
+def sample_rows(n, seed):
+    """Resample complete rows of the training CSV (LoanAmount in ₹ thousands)."""
+    base = pd.read_csv(LOAN_DATA)[FEATURES].dropna()
+    df = base.sample(n=n, replace=True, random_state=seed).reset_index(drop=True)
+    df["Dependents"] = df["Dependents"].astype(str)
+    for col in ("ApplicantIncome", "CoapplicantIncome", "LoanAmount", "Loan_Amount_Term", "Credit_History"):
+        df[col] = df[col].astype(int)
+    return df
+
+
+def payloads(n, seed):
+    """JSON bodies for /predict and /check-eligibility (LoanAmount in real ₹)."""
+    df = sample_rows(n, seed)
+    df["LoanAmount"] = df["LoanAmount"] * 1000
+    df["ApplicantIncome"] = df["ApplicantIncome"].clip(lower=1)
+    df["LoanAmount"] = df["LoanAmount"].clip(lower=1000)
+    df["Loan_Amount_Term"] = df["Loan_Amount_Term"].clip(lower=12)
+    return [dict(r, ApplicantName=f"Bench {i}") for i, r in enumerate(df.to_dict(orient="records"))]
+
+
+def batch_csv(n, seed):
+    buf = io.StringIO()
+    sample_rows(n, seed).to_csv(buf, index=False)
+    return buf.getvalue().encode()
+
+
+# ── Database stand-in ─────────────────────────────────────────────────────────
+
+def start_docker_db(port):
+    if not shutil.which("docker"):
+        sys.exit("docker is not installed — pass --db-host/--db-port for an existing PostgreSQL")
+    subprocess.run(["docker", "rm", "-f", DOCKER_NAME], capture_output=True)
+    subprocess.run([
+        "docker", "run", "-d", "--rm", "--name", DOCKER_NAME,
+        "-e", "POSTGRES_PASSWORD=bench", "-e", "POSTGRES_DB=loanguard",
+        "-p", f"{port}:5432", DOCKER_IMAGE,
+        "-c", "ssl=on",
+        "-c", "ssl_cert_file=/etc/ssl/certs/ssl-cert-snakeoil.pem",
+        "-c", "ssl_key_file=/etc/ssl/private/ssl-cert-snakeoil.key",
+        "-c", "max_connections=200",
+    ], check=True, capture_output=True)
+    return {"DB_HOST": "127.0.0.1", "DB_PORT": str(port), "DB_NAME": "loanguard",
+            "DB_USER": "postgres", "DB_PASSWORD": "bench", "DB_SSLMODE": "require"}
+
+
+def stop_docker_db():
+    subprocess.run(["docker", "rm", "-f", DOCKER_NAME], capture_output=True)
+
+
+def connect(db, timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return psycopg2.connect(host=db["DB_HOST"], port=db["DB_PORT"], dbname=db["DB_NAME"],
+                                    user=db["DB_USER"], password=db["DB_PASSWORD"],
+                                    sslmode=db["DB_SSLMODE"], connect_timeout=5)
+        except psycopg2.OperationalError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(1)
+
+
+def prepare_db(db, seed_rows, seed):
+    """Create the base schema and seed `seed_rows` scored applications via COPY.
+
+    Returns the number of applications and the server's version / sslmode for the results' meta.
+    """
+    conn = connect(db)
+    conn.autocommit = True
+    cur = conn.cursor()
+    with open(SCHEMA_SQL) as f:
+        cur.execute(f.read())
+    for name in BOOTSTRAP_MIGRATIONS:
+        with open(os.path.join(BACKEND_DIR, "migrations", name)) as f:
+            cur.execute(f.read())
+    cur.execute("SELECT COUNT(*) FROM applications")
+    existing = cur.fetchone()[0]
+    cur.execute("SHOW server_version")
+    db_meta = {"server_version": cur.fetchone()[0], "sslmode": db["DB_SSLMODE"]}
+    cur.close()
+    conn.close()
+    if existing >= seed_rows:
+        return existing, db_meta
+
+    os.environ.update(db)
+    sys.path.insert(0, BACKEND_DIR)
+    import joblib
+    from bulk_import import run_import
+
+    df = sample_rows(seed_rows - existing, seed)
+    df["LoanAmount"] = df["LoanAmount"] * 1000  # bulk import takes real ₹
+    rng = np.random.default_rng(seed)
+    now = datetime.now()
+    df["created_at"] = [now - timedelta(days=int(d), seconds=int(s))
+                        for d, s in zip(rng.integers(0, 60, len(df)), rng.integers(0, 86400, len(df)))]
+    df["ApplicantName"] = "Seed"
+    df["status"] = "Pending"
+    models = tuple(joblib.load(os.path.join(BACKEND_DIR, "models", f))
+                   for f in ("loan_model.pkl", "scaler.pkl", "label_encoders.pkl"))
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False)
+    buf.seek(0)
+    summary, _ = run_import(buf, "seed.csv", models=models, score=True)
+    return existing + summary["inserted"], db_meta
+
+
+# ── App server ────────────────────────────────────────────────────────────────
+
+def start_app(db, port, workers, with_cache):
+    env = dict(os.environ, **db,
+               JWT_SECRET="loanguard-bench-secret",
+               RESPONSE_CACHE="1" if with_cache else "0",
+               TRACE_SAMPLE_RATE="0", RESEND_API_KEY="", DRIFT_EVAL_INTERVAL_SECONDS="3600")
+    if shutil.which("gunicorn"):
+        cmd = ["gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}", "--timeout", "600", "app:app"]
+    else:
+        cmd = [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port), "--with-threads"]
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"app exited during startup ({' '.join(cmd)})")
+        try:
+            requests.get(url + "/", timeout=2)
+            return proc, url
+        except (requests.ConnectionError, requests.Timeout):   # not listening yet / workers still importing
+            time.sleep(0.5)
+    proc.terminate()
+    sys.exit("app did not start within 120s")
+
+
+def login(url, username, password):
+    r = requests.post(url + "/login", json={"username": username, "password": password}, timeout=30)
+    r.raise_for_status()
+    return r.json()["token"]
+
+
+# ── Load driver ───────────────────────────────────────────────────────────────
+
+def build_scenarios(url, token, args):
+    auth = {"Authorization": f"Bearer {token}"}
+    bodies = payloads(1000, args.seed)
+    ids = [r["id"] for r in requests.get(url + "/applications?limit=500&fields=id",
+                                         headers=auth, timeout=60).json()["items"]] or [1]
+    small_batch, large_batch = batch_csv(1_000, args.seed), batch_csv(100_000, args.seed + 1)
+
+    def post_json(path, headers=None):
+        return lambda s, i: s.post(url + path, json=bodies[i % len(bodies)], headers=headers, timeout=300)
+
+    def post_batch(data):
+        return lambda s, i: s.post(url + "/batch-predict", headers=auth, timeout=1800,
+                                   files={"file": ("bench.csv", data, "text/csv")})
+
+    def get(path):
+        return lambda s, i: s.get(url + path, headers=auth, timeout=300)
+
+    scenarios = {
+        "check_eligibility": (post_json("/check-eligibility"), args.requests, args.concurrency),
+        "predict": (post_json("/predict"), args.requests, args.concurrency),
+        "batch_1k": (post_batch(small_batch), max(5, args.requests // 20), min(args.concurrency, 2)),
+        "batch_100k": (post_batch(large_batch), args.large_batch_requests, 1),
+        "report": (lambda s, i: s.get(f"{url}/report/{ids[i % len(ids)]}", headers=auth, timeout=300),
+                   args.requests, args.concurrency),
+    }
+    for name, path in ANALYTICS_PATHS.items():
+        scenarios[name] = (get(path), args.requests, args.concurrency)
+    return scenarios
+
+
+def run_scenario(call, total, concurrency, warmup):
+    sessions = [requests.Session() for _ in range(concurrency)]
+    for i in range(warmup):
+        call(sessions[0], i)
+
+    def worker(slot):
+        session, out = sessions[slot], []
+        for i in range(slot, total, concurrency):
+            start = time.perf_counter()
+            try:
+                ok = call(session, i).status_code < 400
+            except requests.RequestException:
+                ok = False
+            out.append((time.perf_counter() - start, ok))
+        return out
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = [r for chunk in pool.map(worker, range(concurrency)) for r in chunk]
+    wall = time.perf_counter() - started
+
+    latencies = np.array([d for d, _ in results]) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "requests": len(results),
+        "errors": sum(1 for _, ok in results if not ok),
+        "concurrency": concurrency,
+        "throughput_rps": round(len(results) / wall, 2),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(latencies.max()), 2),
+    }
+
+
+# ── Baseline comparison ───────────────────────────────────────────────────────
+
+def compare(results, baseline, tolerance):
+    """Flag scenarios whose p95/p99 grew or throughput fell by more than `tolerance`."""
+    regressions = []
+    for name, cur in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            if base[metric] and cur[metric] > base[metric] * (1 + tolerance):
+                regressions.append({"scenario": name, "metric": metric, "baseline": base[metric],
+                                    "current": cur[metric], "change_pct": round(100 * (cur[metric] / base[metric] - 1), 1)})
+        if base["throughput_rps"] and cur["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append({"scenario": name, "metric": "throughput_rps", "baseline": base["throughput_rps"],
+                                "current": cur["throughput_rps"],
+                                "change_pct": round(100 * (cur["throughput_rps"] / base["throughput_rps"] - 1), 1)})
+        if cur["errors"] > base.get("errors", 0):
+            regressions.append({"scenario": name, "metric": "errors", "baseline": base.get("errors", 0),
+                                "current": cur["errors"], "change_pct": None})
+    return regressions
+
+
+def git_sha():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end HTTP benchmark for the LoanGuard API.")
+    parser.add_argument("--url", help="benchmark an already-running app instead of starting one")
+    parser.add_argument("--docker", action="store_true", help=f"start a throwaway {DOCKER_IMAGE} container")
+    parser.add_argument("--db-host", default="127.0.0.1")
+    parser.add_argument("--db-port", type=int, default=55432)
+    parser.add_argument("--db-name", default="loanguard")
+    parser.add_argument("--db-user", default="postgres")
+    parser.add_argument("--db-password", default="bench")
+    parser.add_argument("--db-sslmode", default="require", help="libpq sslmode for the app and the seeding")
+    parser.add_argument("--seed-rows", type=int, default=50_000, help="applications to seed before the run")
+    parser.add_argument("--app-port", type=int, default=5055)
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--with-cache", action="store_true", help="keep the response cache on (default: measure queries)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--large-batch-requests", type=int, default=3, help="requests for batch_100k")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--scenarios", help="comma-separated subset of scenarios")
+    parser.add_argument("--username", default=os.getenv("ADMIN_USER", "admin"))
+    parser.add_argument("--password", default=os.getenv("ADMIN_PASS", "password"))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="compare against this results file and exit 1 on regression")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown (default 15%%)")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    proc, db_meta = None, None
+    try:
+        if args.url:
+            url = args.url.rstrip("/")
+        else:
+            db = start_docker_db(args.db_port) if args.docker else {
+                "DB_HOST": args.db_host, "DB_PORT": str(args.db_port), "DB_NAME": args.db_name,
+                "DB_USER": args.db_user, "DB_PASSWORD": args.db_password, "DB_SSLMODE": args.db_sslmode}
+            seeded, db_meta = prepare_db(db, args.seed_rows, args.seed)
+            print(f"[bench] database ready with {seeded} applications", file=sys.stderr)
+            proc, url = start_app(db, args.app_port, args.workers, args.with_cache)
+
+        token = login(url, args.username, args.password)
+        scenarios = build_scenarios(url, token, args)
+        if args.scenarios:
+            wanted = set(args.scenarios.split(","))
+            unknown = wanted - set(scenarios)
+            if unknown:
+                sys.exit(f"unknown scenarios: {', '.join(sorted(unknown))} (choose from {', '.join(scenarios)})")
+            scenarios = {k: v for k, v in scenarios.items() if k in wanted}
+
+        results = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "git_sha": git_sha(),
+                "python": platform.python_version(),
+                "host": platform.node(),
+                "server": "external" if args.url else ("gunicorn" if shutil.which("gunicorn") else "flask"),
+                "workers": args.workers,
+                "response_cache": args.with_cache,
+                "seed_rows": args.seed_rows,
+                "database": db_meta,
+                "cpus": os.cpu_count(),
+            },
+            "scenarios": {},
+        }
+        for name, (call, total, concurrency) in scenarios.items():
+            stats = run_scenario(call, total, concurrency, args.warmup if total > args.warmup else 0)
+            results["scenarios"][name] = stats
+            print(f"[bench] {name:<18} {stats['throughput_rps']:>9.1f} req/s  p50 {stats['p50_ms']:>8.1f}  "
+                  f"p95 {stats['p95_ms']:>8.1f}  p99 {stats['p99_ms']:>8.1f}  max {stats['max_ms']:>8.1f} ms"
+                  f"  errors {stats['errors']}", file=sys.stderr)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+        if args.docker and not args.url:
+            stop_docker_db()
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results["regressions"] = regressions
+        for r in regressions:
+            print(f"[bench] REGRESSION {r['scenario']} {r['metric']}: {r['baseline']} -> {r['current']}", file=sys.stderr)
+        exit_code = 1 if regressions else 0
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[bench] baseline written to {args.save_baseline}", file=sys.stderr)
+    print(json.dumps(results["scenarios"] if not args.baseline else
+                     {"scenarios": results["scenarios"], "regressions": results["regressions"]}, indent=2))
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
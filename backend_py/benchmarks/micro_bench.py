@@ -0,0 +1,293 @@
+"""
+micro_bench.py — Per-stage micro-benchmarks for the predict() pipeline
+Times every stage of /predict and /check-eligibility in isolation, with the
+production model artifacts, at several batch sizes, and reports ns per row so
+optimization work goes to the stage that actually dominates.
+
+    cd backend_py
+    python benchmarks/micro_bench.py                                    # sizes 1,64,4096,1000000
+    python benchmarks/micro_bench.py --sizes 1,64 --stages validate,shap
+    python benchmarks/micro_bench.py --save-baseline                    # record benchmarks/micro_baseline.json
+    python benchmarks/micro_bench.py --baseline benchmarks/micro_baseline.json   # exit 1 on regression
+
+Per-row stages (validate, model_dump, emi, jsonify) run once per row, as the
+API does per request; frame stages (dataframe, encode, scale, predict_proba,
+predict, shap) run once on an n-row frame, as the batch path does. Inputs are
+resampled training rows; at large sizes the per-row inputs reuse a pool of
+distinct payloads so memory stays flat. No database or running app is needed.
+"""
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+from datetime import datetime
+import joblib
+import pandas as pd
+from flask import Flask, jsonify
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from schemas import LoanApplication            # noqa: E402
+from http_bench import payloads, git_sha       # noqa: E402
+
+MODELS_DIR = os.path.join(BACKEND_DIR, "models")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "micro_baseline.json")
+DEFAULT_SIZES = [1, 64, 4096, 1_000_000]
+POOL_SIZE = 4096             # distinct payloads; larger batches cycle through them
+EMI_RATE = 10 / (12 * 100)   # 10% p.a., as in check_eligibility
+
+
+def load_artifacts():
+    model = joblib.load(os.path.join(MODELS_DIR, "loan_model.pkl"))
+    scaler = joblib.load(os.path.join(MODELS_DIR, "scaler.pkl"))
+    label_encoders = joblib.load(os.path.join(MODELS_DIR, "label_encoders.pkl"))
+    try:
+        explainer = joblib.load(os.path.join(MODELS_DIR, "shap_explainer.pkl"))
+    except Exception:
+        explainer = None
+    return model, scaler, label_encoders, explainer
+
+
+def cycle(pool, n):
+    return [pool[i % len(pool)] for i in range(n)]
+
+
+# ── Stages (same code paths as app.predict / app.check_eligibility) ───────────
+
+def stage_validate(ctx):
+    for raw in ctx["raw"]:
+        LoanApplication.model_validate(raw)
+
+
+def stage_model_dump(ctx):
+    for app_input in ctx["validated"]:
+        data = app_input.model_dump()
+        data.pop("ApplicantName", "")
+        data["LoanAmount"] = data["LoanAmount"] / 1000
+
+
+def stage_dataframe(ctx):
+    pd.DataFrame(ctx["records"])
+
+
+def stage_encode(ctx):
+    df = ctx["df_copy"]
+    for col in df.columns:
+        if col in ctx["label_encoders"]:
+            df[col] = ctx["label_encoders"][col].transform(df[col])
+
+
+def stage_scale(ctx):
+    ctx["scaler"].transform(ctx["df_encoded"])
+
+
+def stage_predict_proba(ctx):
+    ctx["model"].predict_proba(ctx["X"])
+
+
+def stage_predict(ctx):
+    ctx["model"].predict(ctx["X"])
+
+
+def stage_shap(ctx):
+    ctx["explainer"].shap_values(ctx["X"])
+
+
+def stage_emi(ctx):
+    for p, n, total_income in ctx["emi_inputs"]:
+        emi = round(p * EMI_RATE * (1 + EMI_RATE)**n / ((1 + EMI_RATE)**n - 1), 2) if n > 0 else 0
+        emi / total_income if total_income > 0 else float("inf")
+
+
+def stage_jsonify(ctx):
+    with ctx["flask_app"].app_context():
+        for body in ctx["responses"]:
+            jsonify(body)
+
+
+# name -> (function, fresh-input setup run untimed before every call)
+STAGES = {
+    "validate": (stage_validate, None),
+    "model_dump": (stage_model_dump, None),
+    "dataframe": (stage_dataframe, None),
+    "encode": (stage_encode, lambda ctx: ctx.__setitem__("df_copy", ctx["df"].copy())),
+    "scale": (stage_scale, None),
+    "predict_proba": (stage_predict_proba, None),
+    "predict": (stage_predict, None),
+    "shap": (stage_shap, None),
+    "emi": (stage_emi, None),
+    "jsonify": (stage_jsonify, None),
+}
+
+
+def build_context(n, artifacts, seed):
+    """Inputs for every stage at batch size n, each produced by the stage before it."""
+    model, scaler, label_encoders, explainer = artifacts
+    pool = payloads(min(n, POOL_SIZE), seed)
+    validated = [LoanApplication.model_validate(r) for r in pool]
+    records = []
+    for app_input in validated:
+        data = app_input.model_dump()
+        data.pop("ApplicantName", "")
+        data["LoanAmount"] = data["LoanAmount"] / 1000
+        records.append(data)
+
+    df = pd.DataFrame(cycle(records, n))
+    df_encoded = df.copy()
+    for col in df_encoded.columns:
+        if col in label_encoders:
+            df_encoded[col] = label_encoders[col].transform(df_encoded[col])
+    X = scaler.transform(df_encoded)
+    proba = model.predict_proba(X[:len(pool)])[:, 1]
+
+    return {
+        "model": model, "scaler": scaler, "label_encoders": label_encoders, "explainer": explainer,
+        "flask_app": Flask("micro_bench"),
+        "raw": cycle(pool, n),
+        "validated": cycle(validated, n),
+        "records": cycle(records, n),
+        "df": df,
+        "df_encoded": df_encoded,
+        "X": X,
+        "emi_inputs": cycle([(r["LoanAmount"] * 1000, r["Loan_Amount_Term"],
+                              r["ApplicantIncome"] + r["CoapplicantIncome"]) for r in records], n),
+        "responses": cycle([{
+            "prediction": int(p >= 0.5),
+            "probability": round(float(p), 4),
+            "risk_level": "Low Risk" if p >= 0.7 else "Medium Risk" if p >= 0.4 else "High Risk",
+            "explanation": {"Credit_History": -1.2345, "LoanAmount": 0.4321, "ApplicantIncome": -0.1234,
+                            "Property_Area": 0.0567, "Married": -0.0123},
+        } for p in proba], n),
+    }
+
+
+def time_stage(fn, setup, ctx, repeat, min_time):
+    """Best-of-`repeat` seconds per call; small batches loop until each sample spans min_time."""
+    if setup:
+        setup(ctx)
+    start = time.perf_counter()
+    fn(ctx)   # warm-up, also sizes the inner loop
+    elapsed = time.perf_counter() - start
+    loops = 1 if elapsed >= min_time else int(min_time / max(elapsed, 1e-7)) + 1
+
+    best = float("inf")
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            total = 0.0
+            for _ in range(loops):
+                if setup:
+                    setup(ctx)
+                start = time.perf_counter()
+                fn(ctx)
+                total += time.perf_counter() - start
+            best = min(best, total / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return best
+
+
+def compare(results, baseline, tolerance):
+    """Flag stage/size cells whose ns/row grew by more than `tolerance`."""
+    regressions = []
+    for name, sizes in results["stages"].items():
+        for size, cur in sizes.items():
+            base = baseline.get("stages", {}).get(name, {}).get(size)
+            if base and cur is not None and cur > base * (1 + tolerance):
+                regressions.append({"stage": name, "size": int(size), "baseline_ns": base, "current_ns": cur,
+                                    "change_pct": round(100 * (cur / base - 1), 1)})
+    return regressions
+
+
+def render_table(results, sizes):
+    names = list(results["stages"])
+    width = max(len(n) for n in names + ["total"]) + 2
+    lines = ["ns/row".ljust(width) + "".join(f"{s:>14,}" for s in sizes)]
+    for name in names + ["total"]:
+        cells = results["totals"] if name == "total" else results["stages"][name]
+        lines.append(name.ljust(width) + "".join(
+            f"{cells[str(s)]:>14,.0f}" if cells.get(str(s)) is not None else f"{'-':>14}" for s in sizes))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage micro-benchmarks for the LoanGuard predict pipeline.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="comma-separated batch sizes")
+    parser.add_argument("--stages", help=f"comma-separated subset of: {', '.join(STAGES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="timed samples per cell (best is kept)")
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds each sample should span")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="micro_results.json")
+    parser.add_argument("--baseline", help="compare against this results file and exit 1 on regression")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="allowed relative slowdown (default 20%%)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    stages = dict(STAGES)
+    if args.stages:
+        wanted = args.stages.split(",")
+        unknown = set(wanted) - set(STAGES)
+        if unknown:
+            sys.exit(f"unknown stages: {', '.join(sorted(unknown))} (choose from {', '.join(STAGES)})")
+        stages = {k: STAGES[k] for k in wanted}
+
+    artifacts = load_artifacts()
+    if artifacts[3] is None:
+        stages.pop("shap", None)
+        print("[micro] shap_explainer.pkl not loadable — skipping shap", file=sys.stderr)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_sha": git_sha(),
+            "python": platform.python_version(),
+            "host": platform.node(),
+            "repeat": args.repeat,
+            "min_time": args.min_time,
+        },
+        "stages": {name: {} for name in stages},
+        "totals": {},
+    }
+    for n in sizes:
+        ctx = build_context(n, artifacts, args.seed)
+        total = 0.0
+        for name, (fn, setup) in stages.items():
+            ns_per_row = time_stage(fn, setup, ctx, args.repeat, args.min_time) / n * 1e9
+            results["stages"][name][str(n)] = round(ns_per_row, 1)
+            total += ns_per_row
+            print(f"[micro] n={n:<9,} {name:<14} {ns_per_row:>14,.0f} ns/row", file=sys.stderr)
+        results["totals"][str(n)] = round(total, 1)
+        del ctx
+        gc.collect()
+
+    print(render_table(results, sizes))
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results["regressions"] = regressions
+        for r in regressions:
+            print(f"[micro] REGRESSION {r['stage']} n={r['size']}: {r['baseline_ns']} -> {r['current_ns']} ns/row "
+                  f"({r['change_pct']:+}%)", file=sys.stderr)
+        exit_code = 1 if regressions else 0
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[micro] baseline written to {args.save_baseline}", file=sys.stderr)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
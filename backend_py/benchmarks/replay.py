@@ -0,0 +1,238 @@
+"""
+replay.py — Replay captured production traffic against a build
+Reads the NDJSON files written by capture.py (TRAFFIC_CAPTURE=1), re-issues the
+requests against --url on the original schedule (or --speed times faster) and
+reports, per route, replayed vs captured latency percentiles, errors and status
+mismatches. Results can be saved and compared build-to-build like http_bench.
+
+    cd backend_py
+    python benchmarks/replay.py /tmp/loanguard_capture --url http://127.0.0.1:5055
+    python benchmarks/replay.py capture/ --url http://staging:5000 --speed 4 --save-baseline
+    python benchmarks/replay.py capture/ --url http://127.0.0.1:5055 --baseline benchmarks/replay_baseline.json
+
+Redacted applicant names are replaced with "Replay <n>"; batch uploads are
+recreated from their captured row count with resampled training rows.
+Writes go to the target's database, so point it at a disposable copy.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+import requests
+
+from http_bench import batch_csv, login, git_sha
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "replay_baseline.json")
+REDACTED = "[redacted]"
+
+_local = threading.local()
+
+
+def load_capture(paths, routes=None, limit=None):
+    """Captured records from files / directories, oldest first."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, n) for n in os.listdir(path) if n.endswith(".ndjson")]
+        else:
+            files.append(path)
+    records = []
+    for name in files:
+        with open(name) as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue   # torn last line of a live file
+                if routes is None or rec["route"] in routes:
+                    records.append(rec)
+    records.sort(key=lambda r: r["t"])
+    return records[:limit] if limit else records
+
+
+def schedule(records, speed, max_gap):
+    """Send offsets in seconds: original gaps (idle gaps capped at max_gap) divided by speed."""
+    offsets, clock, prev = [], 0.0, None
+    for rec in records:
+        if prev is not None:
+            clock += min(rec["t"] - prev, max_gap)
+        prev = rec["t"]
+        offsets.append(clock / speed if speed > 0 else 0.0)
+    return offsets
+
+
+def _session():
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def build_call(url, rec, i, auth, batches, seed):
+    target = url + rec["path"] + (f"?{rec['query']}" if rec["query"] else "")
+    if rec["method"] == "GET":
+        return lambda: _session().get(target, headers=auth, timeout=300)
+    if rec.get("batch"):
+        rows = max(1, rec["batch"]["rows"])
+        if rows not in batches:
+            batches[rows] = batch_csv(rows, seed)
+        data = batches[rows]
+        return lambda: _session().post(target, headers=auth, timeout=1800,
+                                       files={"file": (rec["batch"]["filename"] or "replay.csv", data, "text/csv")})
+    body = dict(rec["body"] or {})
+    if body.get("ApplicantName") == REDACTED:
+        body["ApplicantName"] = f"Replay {i}"
+    return lambda: _session().post(target, json=body, headers=auth, timeout=300)
+
+
+def replay(records, offsets, calls, concurrency):
+    results = [None] * len(records)
+
+    def send(i, due):
+        lag = time.perf_counter() - due
+        start = time.perf_counter()
+        try:
+            status = calls[i]().status_code
+        except requests.RequestException:
+            status = None
+        results[i] = {"status": status, "latency_ms": (time.perf_counter() - start) * 1000, "lag_ms": lag * 1000}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, offset in enumerate(offsets):
+            due = started + offset
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            pool.submit(send, i, due)
+    return results, time.perf_counter() - started
+
+
+def _percentiles(values):
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2)}
+
+
+def _change(cur, base):
+    return round(100 * (cur / base - 1), 1) if cur is not None and base else None
+
+
+def summarize(records, results):
+    by_route = defaultdict(list)
+    for rec, res in zip(records, results):
+        by_route[rec["route"]].append((rec, res))
+    routes = {}
+    for route, pairs in sorted(by_route.items()):
+        replayed = _percentiles([res["latency_ms"] for _, res in pairs if res["status"] is not None])
+        captured = _percentiles([rec["duration_ms"] for rec, _ in pairs])
+        routes[route] = {
+            "requests": len(pairs),
+            "errors": sum(1 for _, res in pairs if res["status"] is None or res["status"] >= 500),
+            "captured_errors": sum(1 for rec, _ in pairs if rec["status"] >= 500),
+            "status_mismatches": sum(1 for rec, res in pairs if res["status"] != rec["status"]),
+            "replayed": replayed,
+            "captured": captured,
+            "p50_change_pct": _change(replayed["p50_ms"], captured["p50_ms"]),
+            "p95_change_pct": _change(replayed["p95_ms"], captured["p95_ms"]),
+            "send_lag_p99_ms": round(float(np.percentile([res["lag_ms"] for _, res in pairs], 99)), 2),
+        }
+    return routes
+
+
+def compare(results, baseline, tolerance):
+    """Flag routes whose replayed p95/p99 grew by more than `tolerance`, or that gained errors."""
+    regressions = []
+    for route, cur in results["routes"].items():
+        base = baseline.get("routes", {}).get(route)
+        if not base:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            b, c = base["replayed"][metric], cur["replayed"][metric]
+            if b and c is not None and c > b * (1 + tolerance):
+                regressions.append({"route": route, "metric": metric, "baseline": b, "current": c,
+                                    "change_pct": _change(c, b)})
+        if cur["errors"] > base["errors"]:
+            regressions.append({"route": route, "metric": "errors", "baseline": base["errors"],
+                                "current": cur["errors"], "change_pct": None})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured LoanGuard traffic against a build.")
+    parser.add_argument("capture", nargs="+", help="capture directory or .ndjson files")
+    parser.add_argument("--url", required=True, help="build under test")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression (2 = twice as fast, 0 = no waits)")
+    parser.add_argument("--max-gap", type=float, default=60.0, help="cap idle gaps between requests (seconds)")
+    parser.add_argument("--concurrency", type=int, default=64, help="max requests in flight")
+    parser.add_argument("--routes", help="comma-separated subset, e.g. /predict,/analytics/dashboard")
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--username", default=os.getenv("ADMIN_USER", "admin"))
+    parser.add_argument("--password", default=os.getenv("ADMIN_PASS", "password"))
+    parser.add_argument("--seed", type=int, default=42, help="seed for recreated batch uploads")
+    parser.add_argument("--output", default="replay_results.json")
+    parser.add_argument("--baseline", help="compare against this results file and exit 1 on regression")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown (default 15%%)")
+    args = parser.parse_args()
+
+    records = load_capture(args.capture, set(args.routes.split(",")) if args.routes else None, args.limit)
+    if not records:
+        sys.exit("no captured requests found")
+    url = args.url.rstrip("/")
+    auth = {"Authorization": f"Bearer {login(url, args.username, args.password)}"}
+    batches = {}
+    calls = [build_call(url, rec, i, auth, batches, args.seed) for i, rec in enumerate(records)]
+    offsets = schedule(records, args.speed, args.max_gap)
+    print(f"[replay] {len(records)} requests over {offsets[-1]:.1f}s (speed {args.speed}x)", file=sys.stderr)
+
+    outcomes, elapsed = replay(records, offsets, calls, args.concurrency)
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_sha": git_sha(),
+            "python": platform.python_version(),
+            "url": url,
+            "speed": args.speed,
+            "requests": len(records),
+            "captured_from": datetime.fromtimestamp(records[0]["t"]).isoformat(timespec="seconds"),
+            "captured_to": datetime.fromtimestamp(records[-1]["t"]).isoformat(timespec="seconds"),
+            "seconds": round(elapsed, 2),
+        },
+        "routes": summarize(records, outcomes),
+    }
+    for route, r in results["routes"].items():
+        print(f"[replay] {route:<28} n={r['requests']:<6} p50 {r['replayed']['p50_ms']} ms "
+              f"(captured {r['captured']['p50_ms']})  p95 {r['replayed']['p95_ms']} ms "
+              f"(captured {r['captured']['p95_ms']})  errors {r['errors']}  mismatches {r['status_mismatches']}",
+              file=sys.stderr)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results["regressions"] = regressions
+        for r in regressions:
+            print(f"[replay] REGRESSION {r['route']} {r['metric']}: {r['baseline']} -> {r['current']}", file=sys.stderr)
+        exit_code = 1 if regressions else 0
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[replay] baseline written to {args.save_baseline}", file=sys.stderr)
+    print(json.dumps(results["routes"], indent=2))
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
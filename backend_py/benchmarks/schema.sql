@@ -0,0 +1,32 @@
+-- ============================================================
+-- LoanGuard benchmark bootstrap: base tables that predate the migrations
+-- (in production they were created in the Supabase dashboard).
+-- http_bench.py applies this, then migrations 002-004; the app applies the rest.
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS applications (
+    id                  SERIAL PRIMARY KEY,
+    gender              VARCHAR(10),
+    married             VARCHAR(5),
+    dependents          VARCHAR(5),
+    education           VARCHAR(20),
+    self_employed       VARCHAR(5),
+    applicant_income    INTEGER,
+    coapplicant_income  INTEGER,
+    loan_amount         INTEGER,
+    loan_term           INTEGER,
+    credit_history      INTEGER,
+    property_area       VARCHAR(20),
+    prediction          INTEGER,
+    probability         DOUBLE PRECISION,
+    risk_level          VARCHAR(20),
+    created_at          TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS audit_log (
+    id           SERIAL PRIMARY KEY,
+    event_type   VARCHAR(50),
+    username     VARCHAR(100),
+    details      JSONB,
+    created_at   TIMESTAMP DEFAULT NOW()
+);
@@ -0,0 +1,339 @@
+"""
+bulk_import.py — Bulk historical import of applications via COPY FROM STDIN
+Validates a CSV/Parquet file with vectorized checks that mirror LoanApplication,
+optionally (re)scores rows with the model, and loads them in chunked transactions.
+
+Route:  POST /admin/import  (registered on app.py, ADMIN only)
+CLI:    python bulk_import.py <file.csv|file.parquet> [--score] [--chunk-size N] [--rejects rejects.csv]
+"""
+import io
+import os
+import sys
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from db import get_connection
+from flask import request, jsonify, current_app
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_CHUNK_ROWS = 50_000
+MAX_REPORTED_REJECTS = 500
+
+FEATURES = ["Gender", "Married", "Dependents", "Education", "Self_Employed",
+            "ApplicantIncome", "CoapplicantIncome", "LoanAmount", "Loan_Amount_Term",
+            "Credit_History", "Property_Area"]
+
+# Same literals and bounds as schemas.LoanApplication
+CATEGORICAL_RULES = {
+    "Gender":        {"Male", "Female"},
+    "Married":       {"Yes", "No"},
+    "Dependents":    {"0", "1", "2", "3+"},
+    "Education":     {"Graduate", "Not Graduate"},
+    "Self_Employed": {"Yes", "No"},
+    "Property_Area": {"Urban", "Semiurban", "Rural"},
+}
+NUMERIC_RULES = {  # column -> (min, inclusive)
+    "ApplicantIncome":   (0, False),
+    "CoapplicantIncome": (0, True),
+    "LoanAmount":        (0, False),
+    "Loan_Amount_Term":  (0, False),
+    "Credit_History":    (0, True),
+}
+VALID_STATUSES = {"Pending", "Under Review", "Approved", "Rejected"}
+VALID_RISK_LEVELS = {"Low Risk", "Medium Risk", "High Risk"}
+
+# Input column -> applications column, in COPY order
+DB_COLUMNS = [
+    ("ApplicantName", "applicant_name"), ("Gender", "gender"), ("Married", "married"),
+    ("Dependents", "dependents"), ("Education", "education"), ("Self_Employed", "self_employed"),
+    ("ApplicantIncome", "applicant_income"), ("CoapplicantIncome", "coapplicant_income"),
+    ("LoanAmount", "loan_amount"), ("Loan_Amount_Term", "loan_term"),
+    ("Credit_History", "credit_history"), ("Property_Area", "property_area"),
+    ("prediction", "prediction"), ("probability", "probability"), ("risk_level", "risk_level"),
+    ("status", "status"), ("created_at", "created_at"),
+]
+
+
+def iter_chunks(source, filename, chunk_rows):
+    """Yield DataFrame chunks from a CSV (read as strings) or Parquet source."""
+    if filename.lower().endswith(".parquet"):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(source)
+        for batch in pf.iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(source, dtype=str, keep_default_na=False, na_values=[""],
+                               chunksize=chunk_rows)
+
+
+def validate_chunk(df):
+    """
+    Vectorized LoanApplication checks.
+    Returns (clean_df, rejects_df); rejects carry the original values plus an `errors` column.
+    """
+    errors = pd.Series("", index=df.index, dtype=object)
+
+    def flag(mask, msg):
+        nonlocal errors
+        errors = errors.where(~mask, errors + msg + "; ")
+
+    missing = [c for c in FEATURES if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {missing}")
+
+    out = pd.DataFrame(index=df.index)
+    out["ApplicantName"] = df["ApplicantName"].fillna("").str.strip() if "ApplicantName" in df.columns else ""
+
+    for col, allowed in CATEGORICAL_RULES.items():
+        values = df[col].astype(str).str.strip()
+        flag(~values.isin(allowed), f"{col}: must be one of {sorted(allowed)}")
+        out[col] = values
+
+    for col, (low, inclusive) in NUMERIC_RULES.items():
+        num = pd.to_numeric(df[col], errors="coerce")
+        bad_type = num.isna() | (num % 1 != 0)
+        flag(bad_type, f"{col}: must be an integer")
+        below = (num < low) if inclusive else (num <= low)
+        flag(~bad_type & below, f"{col}: must be {'>=' if inclusive else '>'} {low}")
+        out[col] = num
+
+    ch = out["Credit_History"]
+    flag(ch.notna() & (ch > 1), "Credit_History: must be 0 or 1")
+
+    # Historical decision columns are optional; validate only when supplied
+    if "status" in df.columns:
+        status = df["status"].fillna("Pending")
+        flag(~status.isin(VALID_STATUSES), f"status: must be one of {sorted(VALID_STATUSES)}")
+        out["status"] = status
+    else:
+        out["status"] = "Pending"
+
+    if "created_at" in df.columns:
+        created = pd.to_datetime(df["created_at"], errors="coerce")
+        flag(df["created_at"].notna() & created.isna(), "created_at: unparseable timestamp")
+        out["created_at"] = created.fillna(pd.Timestamp(datetime.now()))
+    else:
+        out["created_at"] = pd.Timestamp(datetime.now())
+
+    for col in ("prediction", "probability", "risk_level"):
+        if col in df.columns:
+            out[col] = df[col]
+    if "prediction" in out.columns:
+        pred = pd.to_numeric(out["prediction"], errors="coerce")
+        flag(out["prediction"].notna() & ~pred.isin([0, 1]), "prediction: must be 0 or 1")
+        out["prediction"] = pred
+    if "probability" in out.columns:
+        prob = pd.to_numeric(out["probability"], errors="coerce")
+        flag(out["probability"].notna() & ~prob.between(0, 1), "probability: must be between 0 and 1")
+        out["probability"] = prob
+    if "risk_level" in out.columns:
+        flag(out["risk_level"].notna() & ~out["risk_level"].isin(VALID_RISK_LEVELS),
+             f"risk_level: must be one of {sorted(VALID_RISK_LEVELS)}")
+
+    bad = errors != ""
+    rejects = df[bad].copy()
+    rejects["errors"] = errors[bad].str.rstrip("; ")
+    clean = out[~bad].copy()
+    for col in NUMERIC_RULES:
+        clean[col] = clean[col].astype("int64")
+    return clean, rejects
+
+
+def classify_risk_vec(prob):
+    """Vectorized app.classify_risk — same thresholds."""
+    return np.where(prob >= 0.7, "Low Risk", np.where(prob >= 0.4, "Medium Risk", "High Risk"))
+
+
+def score_frame(df, model, scaler, label_encoders):
+    """Score a validated frame in one pass. Returns (prediction, probability) arrays."""
+    X = df[FEATURES].copy()
+    # Model was trained on ₹ thousands; the API (and this import) take real ₹
+    X["LoanAmount"] = X["LoanAmount"] / 1000
+    for col in X.columns:
+        if col in label_encoders:
+            X[col] = label_encoders[col].transform(X[col])
+    X_scaled = scaler.transform(X)
+    probability = model.predict_proba(X_scaled)[:, 1]
+    prediction = model.predict(X_scaled).astype(int)
+    return prediction, probability
+
+
+def score_rows(clean, models, score=False):
+    """
+    Fill prediction / probability / risk_level in place. Only rows missing a
+    prediction or probability are scored (every row when `score`); supplied
+    historical decisions are kept, and a missing risk_level is derived from the
+    row's probability.
+    """
+    for col in ("prediction", "probability"):
+        if col not in clean.columns:
+            clean[col] = np.nan
+    if "risk_level" not in clean.columns:
+        clean["risk_level"] = pd.Series(None, index=clean.index, dtype=object)
+
+    if score:
+        mask = pd.Series(True, index=clean.index)
+    else:
+        mask = clean["prediction"].isna() | clean["probability"].isna()
+    if mask.any():
+        if models is None:
+            raise ValueError("Rows without prediction/probability need --score")
+        prediction, probability = score_frame(clean.loc[mask], *models)
+        clean.loc[mask, "prediction"] = prediction
+        clean.loc[mask, "probability"] = probability
+        clean.loc[mask, "risk_level"] = classify_risk_vec(probability)
+
+    missing_risk = clean["risk_level"].isna()
+    if missing_risk.any():
+        clean.loc[missing_risk, "risk_level"] = classify_risk_vec(
+            clean.loc[missing_risk, "probability"].to_numpy())
+
+
+def copy_chunk(conn, df):
+    """COPY one validated chunk into applications in a single transaction."""
+    frame = pd.DataFrame({db_col: df[src] for src, db_col in DB_COLUMNS})
+    frame["prediction"] = frame["prediction"].astype("int64")
+    buf = io.StringIO()
+    frame.to_csv(buf, header=False, index=False, date_format="%Y-%m-%d %H:%M:%S")
+    buf.seek(0)
+    cur = conn.cursor()
+    try:
+        cur.copy_expert(
+            f"COPY applications ({', '.join(c for _, c in DB_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buf
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def run_import(source, filename, models=None, score=False, chunk_rows=DEFAULT_CHUNK_ROWS,
+               get_conn=get_connection):
+    """
+    Validate, optionally score, and COPY every chunk.
+    `models` is (model, scaler, label_encoders) — required when scoring.
+    Returns a summary dict and the concatenated rejects DataFrame.
+
+    Each chunk is its own transaction. If a chunk fails after earlier ones were
+    committed, the summary covers what was imported and carries "error" and
+    "failed_at_row" (first row of the failed chunk — resume from there, e.g. by
+    dropping the rows before it, so nothing is inserted twice). A failure before
+    anything was inserted is raised.
+    """
+    inserted, row_offset, reject_frames = 0, 0, []
+    failure = None
+    started = datetime.now()
+    conn = get_conn()
+    try:
+        for chunk in iter_chunks(source, filename, chunk_rows):
+            chunk.index = pd.RangeIndex(row_offset + 1, row_offset + 1 + len(chunk), name="row_number")
+
+            clean, rejects = validate_chunk(chunk)
+            if not clean.empty:
+                score_rows(clean, models, score)
+                copy_chunk(conn, clean)
+                inserted += len(clean)
+            if not rejects.empty:
+                reject_frames.append(rejects)
+            row_offset += len(chunk)   # only once the chunk is committed
+    except Exception as e:
+        if not inserted:
+            raise
+        failure = {"error": str(e), "failed_at_row": row_offset + 1}
+    finally:
+        conn.close()
+
+    rejects = pd.concat(reject_frames) if reject_frames else pd.DataFrame(columns=["errors"])
+    elapsed = (datetime.now() - started).total_seconds()
+    summary = {
+        "rows_read": row_offset,
+        "inserted": inserted,
+        "rejected": len(rejects),
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(row_offset / elapsed) if elapsed > 0 else None,
+        **(failure or {}),
+    }
+    return summary, rejects
+
+
+def import_applications():
+    """Bulk Import Historical Applications (ADMIN only)
+    ---
+    consumes:
+      - multipart/form-data
+    parameters:
+      - name: file
+        in: formData
+        type: file
+        required: true
+        description: CSV or Parquet with LoanApplication columns (+ optional prediction, probability, risk_level, status, created_at)
+      - name: score
+        in: formData
+        type: boolean
+        description: Re-score every row with the current model
+    responses:
+      200:
+        description: Import summary with the first rejected rows
+      400:
+        description: No file, bad format, or missing columns
+      500:
+        description: Import failed; if earlier chunks were committed, the partial summary with error and failed_at_row
+    """
+    if "file" not in request.files:
+        return jsonify({"error": "No file uploaded"}), 400
+    file = request.files["file"]
+    if not file.filename.lower().endswith((".csv", ".parquet")):
+        return jsonify({"error": "Only CSV or Parquet files are accepted"}), 400
+
+    score = request.form.get("score", "").lower() in ("1", "true", "yes")
+    models = (current_app.config["model"], current_app.config["scaler"],
+              current_app.config["label_encoders"])
+    try:
+        summary, rejects = run_import(file.stream, file.filename, models=models, score=score)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    report = rejects.head(MAX_REPORTED_REJECTS).reset_index()
+    summary["rejected_rows"] = report.astype(object).where(report.notna(), None).to_dict(orient="records")
+    return jsonify(summary), (500 if "error" in summary else 200)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import historical loan applications.")
+    parser.add_argument("path", help="CSV or Parquet file")
+    parser.add_argument("--score", action="store_true", help="re-score every row with models/loan_model.pkl")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_ROWS, help="rows per COPY transaction")
+    parser.add_argument("--rejects", default="rejected_rows.csv", help="where to write the rejected-rows report")
+    args = parser.parse_args()
+
+    import joblib
+    models = None
+    if os.path.exists("models/loan_model.pkl"):
+        models = (joblib.load("models/loan_model.pkl"), joblib.load("models/scaler.pkl"),
+                  joblib.load("models/label_encoders.pkl"))
+
+    with open(args.path, "rb") as source:
+        summary, rejects = run_import(source, args.path, models=models,
+                                      score=args.score, chunk_rows=args.chunk_size)
+    if not rejects.empty:
+        rejects.to_csv(args.rejects)
+        print(f"Rejected rows written to {args.rejects}")
+    print(f"Imported {summary['inserted']} of {summary['rows_read']} rows "
+          f"({summary['rejected']} rejected) in {summary['seconds']}s "
+          f"— {summary['rows_per_second']} rows/s")
+    if "error" in summary:
+        print(f"Import stopped at row {summary['failed_at_row']}: {summary['error']}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+cache.py — Response cache for read-only dashboard endpoints
+Caches 200 responses per route + query string, serves strong ETags (304 on match),
+and drops every entry when PostgreSQL sends NOTIFY loanguard_cache
+(fired by the applications trigger in migration 006), so all gunicorn workers
+invalidate together on predict / status updates / imports.
+"""
+import os
+import time
+import select
+import hashlib
+import threading
+from functools import wraps
+from flask import request, make_response, Response
+from db import get_connection
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "1") == "1"
+CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL", "300"))  # safety net for time-windowed queries
+CACHE_MAX_ENTRIES = 256
+NOTIFY_CHANNEL = "loanguard_cache"
+NOTIFY_MIGRATION = os.path.join(os.path.dirname(__file__), "migrations", "006_cache_notify.sql")
+
+_cache = {}            # key -> (etag, body, mimetype, stored_at)
+_lock = threading.Lock()
+_generation = 0        # bumped on every invalidation; guards against storing stale results
+_listener_pid = None   # listener thread belongs to one (post-fork) worker process
+_listener_ok = False   # only serve from cache while invalidations can reach us
+
+
+def init_cache_invalidation(get_conn):
+    """Apply migration 006 (NOTIFY trigger on applications) if it is not installed."""
+    conn = get_conn()
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM pg_trigger WHERE tgname = 'trg_applications_cache_notify'")
+    if not cur.fetchone():
+        with open(NOTIFY_MIGRATION) as f:
+            cur.execute(f.read())
+        print("[LoanGuard] cache invalidation trigger installed.")
+    cur.close()
+    conn.close()
+
+
+def invalidate():
+    """Drop every cached response in this worker."""
+    global _generation
+    with _lock:
+        _generation += 1
+        _cache.clear()
+
+
+def _listen_forever():
+    global _listener_ok
+    while True:
+        conn = None
+        try:
+            conn = get_connection()
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            _listener_ok = True
+            invalidate()  # anything may have changed while we were disconnected
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                if conn.notifies:
+                    conn.notifies.clear()
+                    invalidate()
+        except Exception as e:
+            _listener_ok = False
+            print(f"[Cache] LISTEN connection lost, cache bypassed until reconnect: {e}")
+            time.sleep(5)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def _ensure_listener():
+    global _listener_pid
+    pid = os.getpid()
+    if _listener_pid == pid:
+        return
+    with _lock:
+        if _listener_pid != pid:
+            _listener_pid = pid
+            threading.Thread(target=_listen_forever, name="cache-listener", daemon=True).start()
+
+
+def _lookup(key):
+    entry = _cache.get(key)
+    if entry and time.monotonic() - entry[3] < CACHE_TTL_SECONDS:
+        return entry
+    return None
+
+
+def _store(key, entry, generation):
+    with _lock:
+        if generation != _generation:
+            return  # an invalidation landed while we were computing
+        if len(_cache) >= CACHE_MAX_ENTRIES:
+            _cache.pop(next(iter(_cache)))
+        _cache[key] = entry
+
+
+def cached_response(f):
+    """Cache a read-only JSON endpoint and answer If-None-Match with 304."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not CACHE_ENABLED:
+            return f(*args, **kwargs)
+        _ensure_listener()
+
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        entry = _lookup(key) if _listener_ok else None
+        if entry is None:
+            generation = _generation
+            resp = make_response(f(*args, **kwargs))
+            if resp.status_code != 200 or resp.is_streamed:
+                return resp
+            body = resp.get_data()
+            entry = ('"%s"' % hashlib.sha1(body).hexdigest(), body, resp.mimetype, time.monotonic())
+            if _listener_ok:
+                _store(key, entry, generation)
+
+        etag, body, mimetype, _ = entry
+        if request.if_none_match.contains(etag.strip('"')):
+            resp = Response(status=304)
+        else:
+            resp = Response(body, mimetype=mimetype)
+        resp.headers["ETag"] = etag
+        resp.headers["Cache-Control"] = "private, no-cache"  # always revalidate, never reuse blindly
+        return resp
+    return decorated
@@ -0,0 +1,162 @@
+"""
+capture.py — Opt-in production traffic capture for replay (TRAFFIC_CAPTURE=1)
+Records a sample (CAPTURE_SAMPLE_RATE) of /predict, /check-eligibility,
+/batch-predict and analytics requests as one NDJSON line each, with the wall
+clock arrival time so benchmarks/replay.py can reproduce the inter-arrival
+pattern:
+
+    {"t": 1767000000.123, "method": "POST", "route": "/predict", "path": "/predict",
+     "query": "", "body": {...}, "batch": null, "status": 200, "duration_ms": 41.2,
+     "request_id": "..."}
+
+Applicant names and contact fields are replaced with "[redacted]" before
+anything is written; batch uploads are recorded as metadata only (file name,
+size, row count, header). Each worker appends to its own file in CAPTURE_DIR,
+rotated at CAPTURE_MAX_MB, keeping the newest CAPTURE_MAX_FILES files overall
+(plus any live worker's current file, which may be older than that).
+"""
+import os
+import json
+import time
+import random
+import tempfile
+import threading
+from datetime import datetime
+from flask import request, g
+from tracing import current_request_id
+from perpid_store import pid_alive
+
+CAPTURE_ENABLED = os.getenv("TRAFFIC_CAPTURE", "0") == "1"
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "1.0"))
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", os.path.join(tempfile.gettempdir(), "loanguard_capture"))
+CAPTURE_MAX_BYTES = int(float(os.getenv("CAPTURE_MAX_MB", "50")) * 2**20)
+CAPTURE_MAX_FILES = int(os.getenv("CAPTURE_MAX_FILES", "20"))
+
+CAPTURE_ROUTES = {"/predict", "/check-eligibility", "/batch-predict"}
+CAPTURE_GET_PREFIXES = ("/analytics/", "/stats", "/drift-status", "/applications")
+REDACTED = "[redacted]"
+REDACT_FIELDS = {"applicantname", "applicant_name", "name", "full_name", "email", "phone", "mobile",
+                 "contact", "address", "pan", "aadhaar"}
+
+_lock = threading.Lock()
+_file = None
+_file_pid = None
+
+
+def redact(value):
+    """Copy of a JSON body with names / contact fields replaced, at any depth."""
+    if isinstance(value, dict):
+        return {k: REDACTED if k.lower() in REDACT_FIELDS and v not in (None, "") else redact(v)
+                for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    return value
+
+
+def _wanted(rule):
+    if rule in CAPTURE_ROUTES:
+        return request.method == "POST"
+    return request.method == "GET" and rule.startswith(CAPTURE_GET_PREFIXES)
+
+
+def _batch_metadata():
+    """Upload size, row count and header — never the rows themselves."""
+    upload = request.files.get("file")
+    if upload is None:
+        return None
+    stream = upload.stream
+    stream.seek(0)
+    first = stream.readline()
+    header = first.decode("utf-8", "replace").strip()
+    rows, size, last = 0, len(first), b"\n"
+    for chunk in iter(lambda: stream.read(1 << 20), b""):
+        rows += chunk.count(b"\n")
+        size += len(chunk)
+        last = chunk[-1:]
+    stream.seek(0)
+    if last != b"\n":
+        rows += 1   # final row without a trailing newline
+    return {"filename": upload.filename, "bytes": size, "rows": rows,
+            "columns": header.split(",") if header else []}
+
+
+def _mtime(name):
+    try:
+        return os.path.getmtime(os.path.join(CAPTURE_DIR, name))
+    except OSError:
+        return 0.0
+
+
+def _prune():
+    """Keep the newest CAPTURE_MAX_FILES files; a live worker's current file is never removed."""
+    names = [n for n in os.listdir(CAPTURE_DIR) if n.endswith(".ndjson")]
+    current = {}   # pid -> its newest file ({pid}-{timestamp} names sort by time)
+    for name in names:
+        pid = name.split("-", 1)[0]
+        if pid.isdigit() and name > current.get(pid, ""):
+            current[pid] = name
+    in_use = {name for pid, name in current.items() if pid_alive(int(pid))}
+    for stale in sorted(names, key=_mtime, reverse=True)[CAPTURE_MAX_FILES:]:
+        if stale in in_use:
+            continue
+        try:
+            os.remove(os.path.join(CAPTURE_DIR, stale))
+        except OSError:
+            pass
+
+
+def _open_file():
+    global _file, _file_pid
+    os.makedirs(CAPTURE_DIR, exist_ok=True)
+    name = f"{os.getpid()}-{datetime.now().strftime('%Y%m%dT%H%M%S%f')}.ndjson"
+    _file = open(os.path.join(CAPTURE_DIR, name), "a", buffering=1)
+    _file_pid = os.getpid()
+    _prune()
+
+
+def write(record):
+    line = json.dumps(record, default=str) + "\n"
+    with _lock:
+        if _file is None or _file_pid != os.getpid():
+            _open_file()   # first write in this (possibly forked) worker
+        elif _file.tell() >= CAPTURE_MAX_BYTES:
+            _file.close()
+            _open_file()
+        _file.write(line)
+
+
+def register_capture(app):
+    """Sample matching requests into the capture files (no-op unless TRAFFIC_CAPTURE=1)."""
+    if not CAPTURE_ENABLED:
+        return
+
+    @app.before_request
+    def _capture_start():
+        rule = request.url_rule.rule if request.url_rule else None
+        if rule and _wanted(rule) and random.random() < CAPTURE_SAMPLE_RATE:
+            g._capture = (time.time(), time.perf_counter(), rule)
+
+    @app.after_request
+    def _capture_finish(response):
+        start = g.pop("_capture", None)
+        if start is None:
+            return response
+        arrived, started, rule = start
+        try:
+            batch = _batch_metadata() if rule == "/batch-predict" else None
+            body = None if batch else request.get_json(silent=True)
+            write({
+                "t": round(arrived, 6),
+                "method": request.method,
+                "route": rule,
+                "path": request.path,
+                "query": request.query_string.decode("utf-8", "replace"),
+                "body": redact(body) if body is not None else None,
+                "batch": batch,
+                "status": response.status_code,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "request_id": current_request_id(),
+            })
+        except Exception as e:
+            print(f"[Capture] write failed: {e}")
+        return response
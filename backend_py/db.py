@@ -0,0 +1,31 @@
+"""
+db.py — PostgreSQL connections for every module
+Settings come from the environment / .env (DB_HOST, DB_NAME, DB_USER,
+DB_PASSWORD, DB_PORT, and DB_SSLMODE — require unless a local server
+without TLS is used). get_connection() is what request handlers, schedulers
+and scripts use: its cursors are timed by querylog. connect() is the plain
+connection underneath, for callers that must not be instrumented.
+"""
+import os
+import psycopg2
+from dotenv import load_dotenv
+from querylog import InstrumentedConnection
+
+load_dotenv()
+
+
+def connect(**kwargs):
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST"),
+        database=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        port=os.getenv("DB_PORT"),
+        sslmode=os.getenv("DB_SSLMODE", "require"),
+        connect_timeout=10,
+        **kwargs
+    )
+
+
+def get_connection():
+    return connect(connection_factory=InstrumentedConnection)
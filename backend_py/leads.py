@@ -11,6 +11,7 @@ from datetime import datetime
 from flask import request, jsonify, send_from_directory
 from psycopg2.extras import RealDictCursor
 from werkzeug.utils import secure_filename
+from metrics import stage
 
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -68,12 +69,13 @@ def _send(to_email: str, subject: str, html: str) -> bool:
     if not RESEND_API_KEY or not to_email:
         return False
     try:
-        r = _req.post(
-            "https://api.resend.com/emails",
-            headers={"Authorization": f"Bearer {RESEND_API_KEY}", "Content-Type": "application/json"},
-            json={"from": f"LoanGuard AI <{RESEND_FROM}>", "to": [to_email], "subject": subject, "html": html},
-            timeout=10,
-        )
+        with stage("email"):
+            r = _req.post(
+                "https://api.resend.com/emails",
+                headers={"Authorization": f"Bearer {RESEND_API_KEY}", "Content-Type": "application/json"},
+                json={"from": f"LoanGuard AI <{RESEND_FROM}>", "to": [to_email], "subject": subject, "html": html},
+                timeout=10,
+            )
         return r.status_code == 200
     except Exception as e:
         print(f"[Email] Failed: {e}")
@@ -260,24 +262,25 @@ def register_leads_routes(app, get_conn, role_required, token_required, audit_lo
         if len(phone.replace(" ", "")) < 10:
             return jsonify({"error": "Enter a valid phone number (min 10 digits)"}), 400
 
-        conn = get_conn()
-        cur  = conn.cursor(cursor_factory=RealDictCursor)
+        with stage("db_write"):
+            conn = get_conn()
+            cur  = conn.cursor(cursor_factory=RealDictCursor)
 
-        # Duplicate guard
-        cur.execute("SELECT id FROM loan_leads WHERE email=%s AND phone=%s", (email, phone))
-        existing = cur.fetchone()
-        if existing:
-            cur.close(); conn.close()
-            return jsonify({"error": "An application with this email and phone already exists.", "lead_id": existing["id"]}), 409
+            # Duplicate guard
+            cur.execute("SELECT id FROM loan_leads WHERE email=%s AND phone=%s", (email, phone))
+            existing = cur.fetchone()
+            if existing:
+                cur.close(); conn.close()
+                return jsonify({"error": "An application with this email and phone already exists.", "lead_id": existing["id"]}), 409
 
-        cur.execute(
-            """INSERT INTO loan_leads (applicant_name, email, phone, ai_result)
-               VALUES (%s, %s, %s, %s::jsonb) RETURNING id""",
-            (name, email, phone, json.dumps(ai))
-        )
-        lead_id = cur.fetchone()["id"]
-        conn.commit()
-        cur.close(); conn.close()
+            cur.execute(
+                """INSERT INTO loan_leads (applicant_name, email, phone, ai_result)
+                   VALUES (%s, %s, %s, %s::jsonb) RETURNING id""",
+                (name, email, phone, json.dumps(ai))
+            )
+            lead_id = cur.fetchone()["id"]
+            conn.commit()
+            cur.close(); conn.close()
 
         # Send emails (non-blocking — failures don't affect response)
         send_thankyou_email(name or "Applicant", email, ai)
@@ -309,23 +312,25 @@ def register_leads_routes(app, get_conn, role_required, token_required, audit_lo
         # Unique name to avoid collisions
         stored_name = f"{lead_id}_{uuid.uuid4().hex[:8]}_{fname}"
         file_path   = os.path.join(UPLOAD_FOLDER, stored_name)
-        f.save(file_path)
+        with stage("file_save"):
+            f.save(file_path)
 
-        conn = get_conn()
-        cur  = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute(
-            """INSERT INTO lead_documents (lead_id, doc_type, filename, file_path)
-               VALUES (%s, %s, %s, %s) RETURNING id""",
-            (lead_id, doc_type, fname, stored_name)
-        )
-        doc_id = cur.fetchone()["id"]
-        # Update lead status to DOCS_SUBMITTED
-        cur.execute(
-            "UPDATE loan_leads SET status='DOCS_SUBMITTED', updated_at=NOW() WHERE id=%s AND status NOT IN ('VERIFIED','REJECTED')",
-            (lead_id,)
-        )
-        conn.commit()
-        cur.close(); conn.close()
+        with stage("db_write"):
+            conn = get_conn()
+            cur  = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute(
+                """INSERT INTO lead_documents (lead_id, doc_type, filename, file_path)
+                   VALUES (%s, %s, %s, %s) RETURNING id""",
+                (lead_id, doc_type, fname, stored_name)
+            )
+            doc_id = cur.fetchone()["id"]
+            # Update lead status to DOCS_SUBMITTED
+            cur.execute(
+                "UPDATE loan_leads SET status='DOCS_SUBMITTED', updated_at=NOW() WHERE id=%s AND status NOT IN ('VERIFIED','REJECTED')",
+                (lead_id,)
+            )
+            conn.commit()
+            cur.close(); conn.close()
         return jsonify({"message": "Document uploaded", "doc_id": doc_id}), 201
 
 
@@ -380,20 +385,21 @@ def register_leads_routes(app, get_conn, role_required, token_required, audit_lo
         if status not in valid:
             return jsonify({"error": f"status must be one of {valid}"}), 400
 
-        conn = get_conn()
-        cur  = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("SELECT applicant_name, email FROM loan_leads WHERE id=%s", (lead_id,))
-        lead = cur.fetchone()
-        if not lead:
-            cur.close(); conn.close()
-            return jsonify({"error": "Lead not found"}), 404
+        with stage("db_write"):
+            conn = get_conn()
+            cur  = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute("SELECT applicant_name, email FROM loan_leads WHERE id=%s", (lead_id,))
+            lead = cur.fetchone()
+            if not lead:
+                cur.close(); conn.close()
+                return jsonify({"error": "Lead not found"}), 404
 
-        cur.execute(
-            "UPDATE loan_leads SET status=%s, notes=%s, updated_at=NOW() WHERE id=%s",
-            (status, notes, lead_id)
-        )
-        conn.commit()
-        cur.close(); conn.close()
+            cur.execute(
+                "UPDATE loan_leads SET status=%s, notes=%s, updated_at=NOW() WHERE id=%s",
+                (status, notes, lead_id)
+            )
+            conn.commit()
+            cur.close(); conn.close()
 
         # Send email based on final status
         if status == "VERIFIED":
@@ -435,42 +441,43 @@ def register_leads_routes(app, get_conn, role_required, token_required, audit_lo
         if action == "REJECTED" and not reason:
             return jsonify({"error": "reason is required when rejecting a document"}), 400
 
-        conn = get_conn()
-        cur  = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute(
-            """UPDATE lead_documents
-               SET status=%s, rejection_reason=%s, verified_at=NOW(), verified_by=%s
-               WHERE id=%s AND lead_id=%s RETURNING id""",
-            (action, reason if action == "REJECTED" else None,
-             request.current_user, doc_id, lead_id)
-        )
-        updated = cur.fetchone()
-        if not updated:
-            conn.rollback(); cur.close(); conn.close()
-            return jsonify({"error": "Document not found"}), 404
+        with stage("db_write"):
+            conn = get_conn()
+            cur  = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute(
+                """UPDATE lead_documents
+                   SET status=%s, rejection_reason=%s, verified_at=NOW(), verified_by=%s
+                   WHERE id=%s AND lead_id=%s RETURNING id""",
+                (action, reason if action == "REJECTED" else None,
+                 request.current_user, doc_id, lead_id)
+            )
+            updated = cur.fetchone()
+            if not updated:
+                conn.rollback(); cur.close(); conn.close()
+                return jsonify({"error": "Document not found"}), 404
 
-        # Check if all docs are now resolved — auto-update lead status
-        cur.execute(
-            "SELECT COUNT(*) AS total, COUNT(*) FILTER (WHERE status='PENDING') AS pending FROM lead_documents WHERE lead_id=%s",
-            (lead_id,)
-        )
-        counts = cur.fetchone()
-        lead_update_status = None
-        if counts["pending"] == 0 and counts["total"] > 0:
-            # Check if any rejected
-            cur.execute("SELECT COUNT(*) AS rej FROM lead_documents WHERE lead_id=%s AND status='REJECTED'", (lead_id,))
-            rej = cur.fetchone()["rej"]
-            lead_update_status = "REJECTED" if rej > 0 else "VERIFIED"
+            # Check if all docs are now resolved — auto-update lead status
             cur.execute(
-                "UPDATE loan_leads SET status=%s, updated_at=NOW() WHERE id=%s RETURNING applicant_name, email",
-                (lead_update_status, lead_id)
+                "SELECT COUNT(*) AS total, COUNT(*) FILTER (WHERE status='PENDING') AS pending FROM lead_documents WHERE lead_id=%s",
+                (lead_id,)
             )
-            lead = cur.fetchone()
-        else:
-            lead = None
+            counts = cur.fetchone()
+            lead_update_status = None
+            if counts["pending"] == 0 and counts["total"] > 0:
+                # Check if any rejected
+                cur.execute("SELECT COUNT(*) AS rej FROM lead_documents WHERE lead_id=%s AND status='REJECTED'", (lead_id,))
+                rej = cur.fetchone()["rej"]
+                lead_update_status = "REJECTED" if rej > 0 else "VERIFIED"
+                cur.execute(
+                    "UPDATE loan_leads SET status=%s, updated_at=NOW() WHERE id=%s RETURNING applicant_name, email",
+                    (lead_update_status, lead_id)
+                )
+                lead = cur.fetchone()
+            else:
+                lead = None
 
-        conn.commit()
-        cur.close(); conn.close()
+            conn.commit()
+            cur.close(); conn.close()
 
         # Send emails when all docs resolved
         if lead_update_status and lead:
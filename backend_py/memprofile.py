@@ -0,0 +1,267 @@
+"""
+memprofile.py — Admin-controlled memory instrumentation per route
+POST /admin/memory {"enabled": true} turns the mode on for every worker (a
+marker file in MEMORY_DIR, re-checked at most once a second). While on, each
+worker runs tracemalloc and records per route: peak traced allocation during
+the request and the RSS delta across it. Off means tracemalloc is stopped and
+the request hooks return after one clock comparison.
+
+Snapshots (POST /admin/memory/snapshot) are dumped to MEMORY_DIR and can be
+diffed later (GET /admin/memory/diff?base=..&target=..) to find the top
+allocation sites between two points in time. Peaks are process-wide, so with
+threaded workers concurrent requests share one peak.
+"""
+import os
+import time
+import resource
+import tempfile
+import threading
+import tracemalloc
+from datetime import datetime
+from flask import request, jsonify, g
+from perpid_store import worker_states, write_state
+
+MEMORY_DIR = os.getenv("MEMORY_DIR", os.path.join(tempfile.gettempdir(), "loanguard_memory"))
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "10"))
+MODE_FILE = "enabled"
+SNAPSHOT_RETENTION = 20
+CHECK_SECONDS = 1.0
+FLUSH_SECONDS = 10
+
+_lock = threading.Lock()
+_routes = {}            # route -> {"requests", "peak_max", "peak_sum", "rss_max", "rss_sum"}
+_enabled = False
+_checked_at = 0.0
+_flushed_at = 0.0
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes():
+    """Current resident set size (Linux /proc; falls back to peak RSS elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _mode_path():
+    return os.path.join(MEMORY_DIR, MODE_FILE)
+
+
+def _refresh_mode():
+    """Follow the shared on/off switch; starts/stops tracemalloc in this worker."""
+    global _enabled, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < CHECK_SECONDS:
+        return _enabled
+    _checked_at = now
+    wanted = os.path.exists(_mode_path())
+    if wanted != _enabled:
+        with _lock:
+            if wanted and not tracemalloc.is_tracing():
+                tracemalloc.start(MEMORY_TRACE_FRAMES)
+            elif not wanted and tracemalloc.is_tracing():
+                tracemalloc.stop()
+            if not wanted:
+                _routes.clear()   # the next window starts clean
+            _enabled = wanted
+        flush()
+    return _enabled
+
+
+def _record(route, peak, rss_delta):
+    global _flushed_at
+    with _lock:
+        r = _routes.setdefault(route, {"requests": 0, "peak_max": 0, "peak_sum": 0, "rss_max": 0, "rss_sum": 0})
+        r["requests"] += 1
+        r["peak_max"] = max(r["peak_max"], peak)
+        r["peak_sum"] += peak
+        r["rss_max"] = max(r["rss_max"], rss_delta)
+        r["rss_sum"] += rss_delta
+    if time.monotonic() - _flushed_at >= FLUSH_SECONDS:
+        _flushed_at = time.monotonic()
+        flush()
+
+
+def flush():
+    with _lock:
+        state = {"routes": {k: dict(v) for k, v in _routes.items()},
+                 "rss": rss_bytes(), "tracing": tracemalloc.is_tracing()}
+    write_state(MEMORY_DIR, state)
+
+
+def register_memory_hooks(app):
+    """Per-request peak / RSS accounting while the mode is on."""
+
+    @app.before_request
+    def _memory_start():
+        if not _refresh_mode():
+            return
+        tracemalloc.reset_peak()
+        g._mem_start = (tracemalloc.get_traced_memory()[0], rss_bytes())
+
+    @app.teardown_request
+    def _memory_finish(exc):
+        start = g.pop("_mem_start", None)
+        if start is None or not tracemalloc.is_tracing():
+            return
+        current_start, rss_start = start
+        peak = max(0, tracemalloc.get_traced_memory()[1] - current_start)
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        _record(route, peak, rss_bytes() - rss_start)
+
+
+# ── Snapshots ─────────────────────────────────────────────────────────────────
+
+def _snapshots():
+    if not os.path.isdir(MEMORY_DIR):
+        return []
+    names = [n for n in os.listdir(MEMORY_DIR) if n.endswith(".snapshot")]
+    return sorted(names, key=lambda n: os.path.getmtime(os.path.join(MEMORY_DIR, n)), reverse=True)
+
+
+def _snapshot_path(snapshot_id):
+    name = os.path.basename(snapshot_id) + ".snapshot"
+    path = os.path.join(MEMORY_DIR, name)
+    return path if os.path.exists(path) else None
+
+
+def _top_stats(stats, top):
+    return [{
+        "site": f"{s.traceback[0].filename}:{s.traceback[0].lineno}" if s.traceback else "?",
+        "size_kb": round(s.size / 1024, 1),
+        "count": s.count,
+        **({"size_diff_kb": round(s.size_diff / 1024, 1), "count_diff": s.count_diff}
+           if hasattr(s, "size_diff") else {}),
+    } for s in stats[:top]]
+
+
+def get_memory_status():
+    """Memory Instrumentation Status (ADMIN only)
+    ---
+    parameters:
+      - {name: top, in: query, type: integer, description: "Allocation sites to list for this worker (default 15)"}
+    responses:
+      200:
+        description: Mode, per-route peaks / RSS deltas merged across workers, snapshots and top sites
+    """
+    enabled = _refresh_mode()
+    top = request.args.get("top", 15, type=int)
+    if enabled:
+        flush()
+
+    routes, workers = {}, []
+    for pid, state in worker_states(MEMORY_DIR):
+        workers.append({"pid": pid, "rss_mb": round(state["rss"] / 2**20, 1), "tracing": state["tracing"]})
+        for route, r in state["routes"].items():
+            acc = routes.setdefault(route, {"requests": 0, "peak_max": 0, "peak_sum": 0, "rss_max": 0, "rss_sum": 0})
+            acc["requests"] += r["requests"]
+            acc["peak_max"] = max(acc["peak_max"], r["peak_max"])
+            acc["peak_sum"] += r["peak_sum"]
+            acc["rss_max"] = max(acc["rss_max"], r["rss_max"])
+            acc["rss_sum"] += r["rss_sum"]
+
+    return jsonify({
+        "enabled": enabled,
+        "pid": os.getpid(),
+        "rss_mb": round(rss_bytes() / 2**20, 1),
+        "workers": workers,
+        "routes": {route: {
+            "requests": r["requests"],
+            "peak_traced_kb_max": round(r["peak_max"] / 1024, 1),
+            "peak_traced_kb_mean": round(r["peak_sum"] / r["requests"] / 1024, 1),
+            "rss_delta_kb_max": round(r["rss_max"] / 1024, 1),
+            "rss_delta_kb_mean": round(r["rss_sum"] / r["requests"] / 1024, 1),
+        } for route, r in sorted(routes.items(), key=lambda kv: kv[1]["peak_max"], reverse=True)},
+        "top_sites": _top_stats(tracemalloc.take_snapshot().statistics("lineno"), top)
+                     if tracemalloc.is_tracing() else [],
+        "snapshots": [n[:-len(".snapshot")] for n in _snapshots()],
+    })
+
+
+def set_memory_mode():
+    """Turn Memory Instrumentation On/Off for Every Worker (ADMIN only)
+    ---
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            enabled: {type: boolean}
+    responses:
+      200:
+        description: New mode (other workers follow within a second)
+      400:
+        description: Missing enabled flag
+    """
+    global _checked_at
+    enabled = (request.json or {}).get("enabled")
+    if not isinstance(enabled, bool):
+        return jsonify({"error": "enabled (boolean) is required"}), 400
+    os.makedirs(MEMORY_DIR, exist_ok=True)
+    if enabled:
+        with open(_mode_path(), "w") as f:
+            f.write(datetime.now().isoformat())
+    elif os.path.exists(_mode_path()):
+        os.remove(_mode_path())
+    _checked_at = 0.0
+    return jsonify({"enabled": _refresh_mode()})
+
+
+def take_memory_snapshot():
+    """Dump a tracemalloc Snapshot of the Handling Worker (ADMIN only)
+    ---
+    responses:
+      200:
+        description: Snapshot id (diff two ids from the same pid)
+      400:
+        description: Memory instrumentation is off
+    """
+    if not _refresh_mode() or not tracemalloc.is_tracing():
+        return jsonify({"error": "Memory instrumentation is off — POST /admin/memory {\"enabled\": true}"}), 400
+    os.makedirs(MEMORY_DIR, exist_ok=True)
+    snapshot_id = f"{os.getpid()}_{datetime.now().strftime('%Y%m%dT%H%M%S%f')}"
+    tracemalloc.take_snapshot().dump(os.path.join(MEMORY_DIR, snapshot_id + ".snapshot"))
+    for stale in _snapshots()[SNAPSHOT_RETENTION:]:
+        try:
+            os.remove(os.path.join(MEMORY_DIR, stale))
+        except OSError:
+            pass
+    return jsonify({"snapshot_id": snapshot_id, "pid": os.getpid(), "rss_mb": round(rss_bytes() / 2**20, 1)})
+
+
+def diff_memory_snapshots():
+    """Top Allocation Sites Between Two Snapshots (ADMIN only)
+    ---
+    parameters:
+      - {name: base, in: query, type: string, required: true}
+      - {name: target, in: query, type: string, required: true}
+      - {name: top, in: query, type: integer, description: "Default 20"}
+      - {name: group_by, in: query, type: string, enum: [lineno, filename, traceback], description: "Default lineno"}
+    responses:
+      200:
+        description: Allocation growth per site, largest first
+      404:
+        description: Unknown snapshot id
+    """
+    base = _snapshot_path(request.args.get("base", ""))
+    target = _snapshot_path(request.args.get("target", ""))
+    if not base or not target:
+        return jsonify({"error": "base and target must be existing snapshot ids"}), 404
+    group_by = request.args.get("group_by", "lineno")
+    if group_by not in ("lineno", "filename", "traceback"):
+        return jsonify({"error": "group_by must be lineno, filename or traceback"}), 400
+    top = request.args.get("top", 20, type=int)
+
+    stats = tracemalloc.Snapshot.load(target).compare_to(tracemalloc.Snapshot.load(base), group_by)
+    same_worker = request.args["base"].split("_")[0] == request.args["target"].split("_")[0]
+    return jsonify({
+        "base": request.args["base"],
+        "target": request.args["target"],
+        "same_worker": same_worker,
+        "total_diff_kb": round(sum(s.size_diff for s in stats) / 1024, 1),
+        "top_sites": _top_stats(stats, top),
+    })
@@ -0,0 +1,364 @@
+"""
+metrics.py — Prometheus text-format /metrics for every gunicorn worker
+Counters and histograms are written into per-thread shards (no lock on the hot
+path); a flusher thread snapshots them to METRICS_DIR/<pid>.json and a scrape
+merges every worker's file. Totals of exited workers are folded into
+_retired.json so counters never go backwards when gunicorn recycles a worker.
+/metrics answers 404 unless METRICS_TOKEN is set; the scraper sends it as a
+bearer token. PostgreSQL pool gauges are sampled at most every
+DB_GAUGES_TTL_SECONDS per worker.
+
+    with stage("scoring"):            # loanguard_stage_seconds{route,stage} + a trace span
+        ...
+    inc("loanguard_batch_rows_total", n)
+"""
+import os
+import hmac
+import json
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+from flask import request, g, has_request_context, Response
+from db import get_connection
+from dotenv import load_dotenv
+from tracing import record_span
+from perpid_store import flusher, retire, retired_state, worker_states, write_state
+
+load_dotenv()
+
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "loanguard_metrics"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # bearer token for the scraper; /metrics is off without one
+DB_GAUGES_TTL_SECONDS = float(os.getenv("DB_GAUGES_TTL_SECONDS", "10"))
+FLUSH_SECONDS = 5
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+THROUGHPUT_BUCKETS = (10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
+HELP = {
+    "loanguard_http_requests_total": ("counter", "HTTP requests by route, method and status"),
+    "loanguard_http_request_seconds": ("histogram", "HTTP request latency by route"),
+    "loanguard_stage_seconds": ("histogram", "Latency of individual pipeline stages"),
+    "loanguard_http_in_flight": ("gauge", "Requests currently being handled, summed over workers"),
+    "loanguard_batch_rows_total": ("counter", "Rows scored by /batch-predict"),
+    "loanguard_batch_rows_per_second": ("histogram", "Throughput of each /batch-predict call"),
+    "loanguard_workers": ("gauge", "Live worker processes reporting metrics"),
+    "loanguard_db_connections": ("gauge", "PostgreSQL backends for this database by state"),
+    "loanguard_db_max_connections": ("gauge", "PostgreSQL max_connections"),
+    "loanguard_db_pool_utilization": ("gauge", "Share of max_connections in use"),
+    "loanguard_model_info": ("gauge", "Currently deployed model (value is always 1)"),
+}
+BUCKETS = {
+    "loanguard_http_request_seconds": LATENCY_BUCKETS,
+    "loanguard_stage_seconds": LATENCY_BUCKETS,
+    "loanguard_batch_rows_per_second": THROUGHPUT_BUCKETS,
+}
+
+
+class _Shard:
+    """One thread's private counters; only that thread ever writes to it."""
+    __slots__ = ("counters", "histograms", "gauges")
+
+    def __init__(self):
+        self.counters = {}     # (name, labels) -> float
+        self.histograms = {}   # (name, labels) -> [bucket counts..., +Inf, sum]
+        self.gauges = {}       # (name, labels) -> float (summed across workers)
+
+
+_local = threading.local()
+_shards = []                      # [(thread, shard)] of threads that have recorded something
+_exited = _Shard()                # totals of threads that have since finished
+_shards_lock = threading.Lock()   # taken once per new thread, never per update
+
+
+def _reset_after_fork():
+    global _shards, _exited, _shards_lock
+    _shards, _exited, _shards_lock = [], _Shard(), threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)  # a worker starts from zero, not the master's counts
+
+
+def _shard():
+    shard = getattr(_local, "shard", None)
+    if shard is None or getattr(_local, "pid", None) != os.getpid():
+        shard = _Shard()
+        _local.shard, _local.pid = shard, os.getpid()
+        with _shards_lock:
+            _shards.append((threading.current_thread(), shard))
+    return shard
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    c = _shard().counters
+    k = _key(name, labels)
+    c[k] = c.get(k, 0) + value
+
+
+def gauge_add(name, value, **labels):
+    gs = _shard().gauges
+    k = _key(name, labels)
+    gs[k] = gs.get(k, 0) + value
+
+
+def observe(name, value, **labels):
+    _flusher.ensure()
+    buckets = BUCKETS.get(name, LATENCY_BUCKETS)
+    hs = _shard().histograms
+    k = _key(name, labels)
+    h = hs.get(k)
+    if h is None:
+        h = hs[k] = [0] * (len(buckets) + 2)
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            h[i] += 1
+            break
+    else:
+        h[len(buckets)] += 1
+    h[-1] += value
+
+
+def _route():
+    if has_request_context():
+        return request.url_rule.rule if request.url_rule else "unmatched"
+    return "background"
+
+
+@contextmanager
+def stage(name):
+    """Time one pipeline stage of the current request (or background job).
+    Feeds the stage histogram and the request's trace / Server-Timing span."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        observe("loanguard_stage_seconds", duration, route=_route(), stage=name)
+        record_span(name, start, duration)
+
+
+# ── Cross-worker aggregation ──────────────────────────────────────────────────
+
+def _fold(target, shard):
+    for k, v in list(shard.counters.items()):
+        target.counters[k] = target.counters.get(k, 0) + v
+    for k, v in list(shard.gauges.items()):
+        target.gauges[k] = target.gauges.get(k, 0) + v
+    for k, h in list(shard.histograms.items()):
+        acc = target.histograms.get(k)
+        target.histograms[k] = list(h) if acc is None else [a + b for a, b in zip(acc, h)]
+
+
+def _snapshot():
+    """Merge this worker's thread shards (reads race benignly with writers)."""
+    with _shards_lock:
+        # Finished threads never write again: fold them so the list stays bounded
+        # under thread-per-request servers
+        for thread, shard in [e for e in _shards if not e[0].is_alive()]:
+            _fold(_exited, shard)
+            _shards.remove((thread, shard))
+        shards = [shard for _, shard in _shards]
+        total = _Shard()
+        _fold(total, _exited)
+    for shard in shards:
+        _fold(total, shard)
+    return {"counters": total.counters, "histograms": total.histograms, "gauges": total.gauges}
+
+
+def _encode(state):
+    return {kind: [[name, list(labels), v] for (name, labels), v in state[kind].items()]
+            for kind in ("counters", "histograms", "gauges")}
+
+
+def _decode(raw):
+    return {kind: {(name, tuple(tuple(l) for l in labels)): v for name, labels, v in raw.get(kind, [])}
+            for kind in ("counters", "histograms", "gauges")}
+
+
+def _merge_into(total, state, include_gauges=True):
+    for k, v in state["counters"].items():
+        total["counters"][k] = total["counters"].get(k, 0) + v
+    for k, h in state["histograms"].items():
+        acc = total["histograms"].get(k)
+        total["histograms"][k] = list(h) if acc is None else [a + b for a, b in zip(acc, h)]
+    if include_gauges:
+        for k, v in state["gauges"].items():
+            total["gauges"][k] = total["gauges"].get(k, 0) + v
+
+
+def flush():
+    write_state(METRICS_DIR, _encode(_snapshot()))
+
+
+_flusher = flusher("metrics-flusher", flush, FLUSH_SECONDS, "Metrics")
+
+
+def _fold_retired(retired, dead):
+    total = _decode(retired) if retired else {"counters": {}, "histograms": {}, "gauges": {}}
+    _merge_into(total, _decode(dead), include_gauges=False)
+    return _encode(total)
+
+
+def _retire(path):
+    """Fold a dead worker's counters into _retired.json exactly once."""
+    retire(METRICS_DIR, path, _fold_retired)
+
+
+def merged_state():
+    flush()
+    total = {"counters": {}, "histograms": {}, "gauges": {}}
+    workers = worker_states(METRICS_DIR, on_dead=_retire)   # retires dead workers first
+    for _, raw in workers:
+        _merge_into(total, _decode(raw))
+    retired = retired_state(METRICS_DIR)
+    if retired:
+        _merge_into(total, _decode(retired), include_gauges=False)
+    total["gauges"][("loanguard_workers", ())] = len(workers)
+    return total
+
+
+# ── Scrape-time gauges ────────────────────────────────────────────────────────
+
+
+_db_sample = (0.0, {})   # (monotonic expiry, gauges) — one pg_stat_activity query per TTL per worker
+_db_sample_lock = threading.Lock()
+
+
+def _sample_db_gauges():
+    """The app opens short-lived connections, so server-side backends are the pool."""
+    gauges = {}
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT COALESCE(state, 'unknown'), COUNT(*)
+            FROM pg_stat_activity
+            WHERE datname = current_database()
+            GROUP BY 1
+        """)
+        in_use = 0
+        for state, n in cur.fetchall():
+            gauges[("loanguard_db_connections", (("state", state),))] = n
+            in_use += n
+        cur.execute("SELECT current_setting('max_connections')::int")
+        max_conn = cur.fetchone()[0]
+        gauges[("loanguard_db_max_connections", ())] = max_conn
+        gauges[("loanguard_db_pool_utilization", ())] = round(in_use / max_conn, 4) if max_conn else 0
+        cur.close()
+    finally:
+        conn.close()
+    return gauges
+
+
+def _db_gauges(gauges):
+    """Pool gauges, sampled at most once per DB_GAUGES_TTL_SECONDS (scrapes stay off the database)."""
+    global _db_sample
+    with _db_sample_lock:
+        expires, sample = _db_sample
+        if time.monotonic() >= expires:
+            try:
+                sample = _sample_db_gauges()
+            except Exception as e:
+                print(f"[Metrics] DB gauges unavailable: {e}")
+                sample = {}
+            _db_sample = (time.monotonic() + DB_GAUGES_TTL_SECONDS, sample)
+    gauges.update(sample)
+
+
+def _model_gauge(gauges):
+    try:
+        with open("models/model_meta.json") as f:
+            meta = json.load(f)
+        labels = (("trained_at", str(meta.get("trained_at", ""))), ("version", str(meta.get("version", ""))))
+    except (OSError, ValueError):
+        labels = (("trained_at", ""), ("version", "unknown"))
+    gauges[("loanguard_model_info", labels)] = 1
+
+
+# ── Exposition ────────────────────────────────────────────────────────────────
+
+def _fmt_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def render(state):
+    by_name = {}
+    for kind in ("counters", "gauges", "histograms"):
+        for (name, labels), v in state[kind].items():
+            by_name.setdefault(name, []).append((labels, v))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, text = HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, v in sorted(by_name[name]):
+            if kind != "histogram":
+                lines.append(f"{name}{_fmt_labels(labels)} {v}")
+                continue
+            buckets = BUCKETS.get(name, LATENCY_BUCKETS)
+            cumulative = 0
+            for bound, n in zip(buckets, v):
+                cumulative += n
+                lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', bound)])} {cumulative}")
+            cumulative += v[len(buckets)]
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {round(v[-1], 6)}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def get_metrics():
+    """Prometheus Metrics (text exposition format)
+    ---
+    responses:
+      200:
+        description: Counters, gauges and latency histograms merged across workers
+      401:
+        description: Bearer token does not match METRICS_TOKEN
+      404:
+        description: METRICS_TOKEN is not set, so the endpoint is disabled
+    """
+    if not METRICS_TOKEN:
+        return Response("not found\n", status=404, mimetype="text/plain")
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"):
+        return Response("unauthorized\n", status=401, mimetype="text/plain")
+    state = merged_state()
+    _db_gauges(state["gauges"])
+    _model_gauge(state["gauges"])
+    return Response(render(state), mimetype="text/plain; version=0.0.4")
+
+
+def register_metrics(app):
+    """Install per-request timing hooks and the /metrics route."""
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.perf_counter()
+        gauge_add("loanguard_http_in_flight", 1)
+
+    @app.after_request
+    def _metrics_finish(response):
+        start = g.get("_metrics_start")
+        if start is not None:
+            route = _route()
+            observe("loanguard_http_request_seconds", time.perf_counter() - start, route=route)
+            inc("loanguard_http_requests_total", route=route, method=request.method,
+                status=str(response.status_code))
+        return response
+
+    @app.teardown_request
+    def _metrics_teardown(exc):
+        # teardown runs even when a view raised, so the gauge cannot leak
+        if g.pop("_metrics_start", None) is not None:
+            gauge_add("loanguard_http_in_flight", -1)
+
+    app.add_url_rule("/metrics", "metrics", get_metrics, methods=["GET"])
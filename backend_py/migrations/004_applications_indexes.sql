@@ -0,0 +1,14 @@
+-- ============================================================
+-- LoanGuard Migration 004: Indexes for paginated /applications
+-- Run in Supabase SQL Editor
+-- ============================================================
+
+-- Keyset pagination walks id DESC; each filter gets a composite index
+-- so "WHERE <filter> AND id < :cursor ORDER BY id DESC LIMIT n" is an index scan.
+CREATE INDEX IF NOT EXISTS idx_applications_status_id        ON applications (status, id DESC);
+CREATE INDEX IF NOT EXISTS idx_applications_risk_level_id    ON applications (risk_level, id DESC);
+CREATE INDEX IF NOT EXISTS idx_applications_property_area_id ON applications (property_area, id DESC);
+CREATE INDEX IF NOT EXISTS idx_applications_created_at       ON applications (created_at);
+
+-- Keep planner statistics fresh so the row estimates returned as total_estimate stay close
+ANALYZE applications;
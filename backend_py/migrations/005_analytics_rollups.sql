@@ -0,0 +1,90 @@
+-- ============================================================
+-- LoanGuard Migration 005: Incremental Analytics Rollups
+-- Run in Supabase SQL Editor (app.py also applies it on first boot)
+-- ============================================================
+
+-- Bucket helpers — the single definition of the dashboard brackets
+CREATE OR REPLACE FUNCTION lg_income_bracket(income NUMERIC) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE
+        WHEN income < 3000  THEN '<3k'
+        WHEN income < 6000  THEN '3k-6k'
+        WHEN income < 10000 THEN '6k-10k'
+        ELSE '10k+'
+    END
+$$;
+
+CREATE OR REPLACE FUNCTION lg_loan_bucket(loan_amount NUMERIC) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE
+        WHEN loan_amount * 1000 < 100000 THEN '<1L'
+        WHEN loan_amount * 1000 < 200000 THEN '1-2L'
+        WHEN loan_amount * 1000 < 500000 THEN '2-5L'
+        ELSE '5L+'
+    END
+$$;
+
+-- One row per day × income bracket × loan bucket × area × risk level.
+-- Size grows with calendar days (≤ 192 rows/day), not with application volume.
+CREATE TABLE IF NOT EXISTS applications_daily_rollup (
+    day             DATE    NOT NULL,
+    income_bracket  TEXT    NOT NULL,
+    loan_bucket     TEXT    NOT NULL,
+    property_area   TEXT    NOT NULL,
+    risk_level      TEXT    NOT NULL,
+    approved        BIGINT  NOT NULL DEFAULT 0,
+    rejected        BIGINT  NOT NULL DEFAULT 0,
+    total           BIGINT  NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, income_bracket, loan_bucket, property_area, risk_level)
+);
+
+-- Statement-level trigger: one aggregated upsert per INSERT statement, so a
+-- bulk COPY of 100k rows costs a handful of rollup writes, not 100k.
+CREATE OR REPLACE FUNCTION lg_rollup_applications() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO applications_daily_rollup AS r
+        (day, income_bracket, loan_bucket, property_area, risk_level, approved, rejected, total)
+    SELECT
+        DATE(COALESCE(created_at, NOW())),
+        lg_income_bracket(applicant_income),
+        lg_loan_bucket(loan_amount),
+        COALESCE(property_area, 'Unknown'),
+        COALESCE(risk_level, 'Unknown'),
+        COUNT(*) FILTER (WHERE prediction = 1),
+        COUNT(*) FILTER (WHERE prediction = 0),
+        COUNT(*)
+    FROM new_rows
+    GROUP BY 1, 2, 3, 4, 5
+    ON CONFLICT (day, income_bracket, loan_bucket, property_area, risk_level) DO UPDATE
+        SET approved = r.approved + EXCLUDED.approved,
+            rejected = r.rejected + EXCLUDED.rejected,
+            total    = r.total    + EXCLUDED.total;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_applications_rollup ON applications;
+CREATE TRIGGER trg_applications_rollup
+    AFTER INSERT ON applications
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION lg_rollup_applications();
+
+-- Backfill from existing history (rebuilds the rollup from scratch)
+BEGIN;
+LOCK TABLE applications IN SHARE MODE;
+TRUNCATE applications_daily_rollup;
+INSERT INTO applications_daily_rollup
+    (day, income_bracket, loan_bucket, property_area, risk_level, approved, rejected, total)
+SELECT
+    DATE(COALESCE(created_at, NOW())),
+    lg_income_bracket(applicant_income),
+    lg_loan_bucket(loan_amount),
+    COALESCE(property_area, 'Unknown'),
+    COALESCE(risk_level, 'Unknown'),
+    COUNT(*) FILTER (WHERE prediction = 1),
+    COUNT(*) FILTER (WHERE prediction = 0),
+    COUNT(*)
+FROM applications
+GROUP BY 1, 2, 3, 4, 5;
+COMMIT;
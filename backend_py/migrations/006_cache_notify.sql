@@ -0,0 +1,20 @@
+-- ============================================================
+-- LoanGuard Migration 006: Response-cache invalidation via NOTIFY
+-- Run in Supabase SQL Editor (app.py also applies it on first boot)
+-- ============================================================
+
+-- Every statement that changes applications (predict, status PATCH,
+-- bulk import, manual SQL) tells all listening API workers to drop
+-- their cached dashboard responses. NOTIFY is delivered on commit.
+CREATE OR REPLACE FUNCTION lg_notify_applications_changed() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('loanguard_cache', TG_OP);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_applications_cache_notify ON applications;
+CREATE TRIGGER trg_applications_cache_notify
+    AFTER INSERT OR UPDATE OR DELETE ON applications
+    FOR EACH STATEMENT EXECUTE FUNCTION lg_notify_applications_changed();
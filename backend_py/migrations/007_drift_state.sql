@@ -0,0 +1,24 @@
+-- ============================================================
+-- LoanGuard Migration 007: Scheduled Drift Evaluation State
+-- Run in Supabase SQL Editor (app.py also applies it on first boot)
+-- ============================================================
+
+-- Every scheduled evaluation; /drift-status serves the newest row
+CREATE TABLE IF NOT EXISTS drift_evaluations (
+    id              SERIAL PRIMARY KEY,
+    evaluated_at    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    window_days     INTEGER     NOT NULL,
+    drift_detected  BOOLEAN     NOT NULL,
+    result          JSONB       NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_drift_evaluations_evaluated_at ON drift_evaluations (evaluated_at);
+
+-- Single-row alert state shared by every worker: one email per drift episode
+CREATE TABLE IF NOT EXISTS drift_alert_state (
+    id                  INTEGER PRIMARY KEY CHECK (id = 1),
+    in_episode          BOOLEAN NOT NULL DEFAULT FALSE,
+    episode_started_at  TIMESTAMPTZ,
+    episode_ended_at    TIMESTAMPTZ,
+    alert_sent_at       TIMESTAMPTZ
+);
+INSERT INTO drift_alert_state (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
@@ -0,0 +1,26 @@
+-- ============================================================
+-- LoanGuard Migration 008: Online Learning Feedback Buffer
+-- Run in Supabase SQL Editor (app.py also applies it on first boot)
+-- ============================================================
+
+-- One row per final decision (PATCH status to Approved / Rejected) while
+-- ONLINE_LEARNING=1; the online learner consumes them in id order
+CREATE TABLE IF NOT EXISTS model_feedback (
+    id              BIGSERIAL   PRIMARY KEY,
+    application_id  INTEGER     NOT NULL REFERENCES applications (id) ON DELETE CASCADE,
+    label           SMALLINT    NOT NULL CHECK (label IN (0, 1)),
+    created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    consumed_at     TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS idx_model_feedback_pending ON model_feedback (id) WHERE consumed_at IS NULL;
+
+-- Every update cycle that trained a candidate, published or not
+CREATE TABLE IF NOT EXISTS online_updates (
+    id              SERIAL      PRIMARY KEY,
+    ran_at          TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    training_rows   INTEGER     NOT NULL,
+    holdout_rows    INTEGER     NOT NULL,
+    published       BOOLEAN     NOT NULL,
+    model_version   VARCHAR(40),
+    result          JSONB       NOT NULL
+);
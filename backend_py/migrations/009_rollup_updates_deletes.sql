@@ -0,0 +1,127 @@
+-- ============================================================
+-- LoanGuard Migration 009: Keep the Analytics Rollup Exact on UPDATE / DELETE
+-- Run in Supabase SQL Editor (app.py also applies it on first boot)
+-- ============================================================
+-- Migration 005 only adds inserted rows to applications_daily_rollup. These
+-- statement-level triggers subtract the old version of every updated or
+-- deleted row and add the new one, so a manual fix in the SQL editor or a
+-- purge no longer makes the dashboards diverge from applications.
+--
+-- lg_rebuild_rollup() recomputes the rollup from scratch. Run it
+--     SELECT lg_rebuild_rollup();
+-- after any change made with the triggers disabled or bypassed
+-- (session_replication_role = replica, TRUNCATE applications, restoring a
+-- dump of applications without the rollup), after changing lg_income_bracket
+-- / lg_loan_bucket, or whenever /analytics disagrees with the raw table.
+
+-- Rows whose rollup key or outcome changed: the old version is subtracted,
+-- the new one added. A status-only PATCH changes nothing here.
+CREATE OR REPLACE FUNCTION lg_rollup_applications_update() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    WITH changed AS (
+        SELECT o.id
+          FROM old_rows o JOIN new_rows n ON n.id = o.id
+         WHERE (o.created_at, o.applicant_income, o.loan_amount, o.property_area, o.risk_level, o.prediction)
+               IS DISTINCT FROM
+               (n.created_at, n.applicant_income, n.loan_amount, n.property_area, n.risk_level, n.prediction)
+    ), changes AS (
+        SELECT n.created_at, n.applicant_income, n.loan_amount, n.property_area, n.risk_level, n.prediction, 1 AS sign
+          FROM new_rows n JOIN changed c ON c.id = n.id
+        UNION ALL
+        SELECT o.created_at, o.applicant_income, o.loan_amount, o.property_area, o.risk_level, o.prediction, -1
+          FROM old_rows o JOIN changed c ON c.id = o.id
+    )
+    INSERT INTO applications_daily_rollup AS r
+        (day, income_bracket, loan_bucket, property_area, risk_level, approved, rejected, total)
+    SELECT
+        DATE(COALESCE(created_at, NOW())),
+        lg_income_bracket(applicant_income),
+        lg_loan_bucket(loan_amount),
+        COALESCE(property_area, 'Unknown'),
+        COALESCE(risk_level, 'Unknown'),
+        COALESCE(SUM(sign) FILTER (WHERE prediction = 1), 0),
+        COALESCE(SUM(sign) FILTER (WHERE prediction = 0), 0),
+        SUM(sign)
+    FROM changes
+    GROUP BY 1, 2, 3, 4, 5
+    ON CONFLICT (day, income_bracket, loan_bucket, property_area, risk_level) DO UPDATE
+        SET approved = r.approved + EXCLUDED.approved,
+            rejected = r.rejected + EXCLUDED.rejected,
+            total    = r.total    + EXCLUDED.total;
+
+    DELETE FROM applications_daily_rollup
+     WHERE total = 0 AND day IN (SELECT DATE(COALESCE(created_at, NOW())) FROM old_rows);
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION lg_rollup_applications_delete() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO applications_daily_rollup AS r
+        (day, income_bracket, loan_bucket, property_area, risk_level, approved, rejected, total)
+    SELECT
+        DATE(COALESCE(created_at, NOW())),
+        lg_income_bracket(applicant_income),
+        lg_loan_bucket(loan_amount),
+        COALESCE(property_area, 'Unknown'),
+        COALESCE(risk_level, 'Unknown'),
+        -COUNT(*) FILTER (WHERE prediction = 1),
+        -COUNT(*) FILTER (WHERE prediction = 0),
+        -COUNT(*)
+    FROM old_rows
+    GROUP BY 1, 2, 3, 4, 5
+    ON CONFLICT (day, income_bracket, loan_bucket, property_area, risk_level) DO UPDATE
+        SET approved = r.approved + EXCLUDED.approved,
+            rejected = r.rejected + EXCLUDED.rejected,
+            total    = r.total    + EXCLUDED.total;
+
+    DELETE FROM applications_daily_rollup
+     WHERE total = 0 AND day IN (SELECT DATE(COALESCE(created_at, NOW())) FROM old_rows);
+    RETURN NULL;
+END;
+$$;
+
+-- Transition tables cannot be combined with several events or an UPDATE OF
+-- column list, hence one trigger per event
+DROP TRIGGER IF EXISTS trg_applications_rollup_update ON applications;
+CREATE TRIGGER trg_applications_rollup_update
+    AFTER UPDATE ON applications
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION lg_rollup_applications_update();
+
+DROP TRIGGER IF EXISTS trg_applications_rollup_delete ON applications;
+CREATE TRIGGER trg_applications_rollup_delete
+    AFTER DELETE ON applications
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION lg_rollup_applications_delete();
+
+-- Rebuild from scratch (same aggregation as the backfill of migration 005)
+CREATE OR REPLACE FUNCTION lg_rebuild_rollup() RETURNS BIGINT
+LANGUAGE plpgsql AS $$
+DECLARE
+    groups BIGINT;
+BEGIN
+    LOCK TABLE applications IN SHARE MODE;   -- no writes while the rollup is recomputed
+    DELETE FROM applications_daily_rollup;
+    INSERT INTO applications_daily_rollup
+        (day, income_bracket, loan_bucket, property_area, risk_level, approved, rejected, total)
+    SELECT
+        DATE(COALESCE(created_at, NOW())),
+        lg_income_bracket(applicant_income),
+        lg_loan_bucket(loan_amount),
+        COALESCE(property_area, 'Unknown'),
+        COALESCE(risk_level, 'Unknown'),
+        COUNT(*) FILTER (WHERE prediction = 1),
+        COUNT(*) FILTER (WHERE prediction = 0),
+        COUNT(*)
+    FROM applications
+    GROUP BY 1, 2, 3, 4, 5;
+    GET DIAGNOSTICS groups = ROW_COUNT;
+    RETURN groups;
+END;
+$$;
+
+-- Repair whatever drifted before these triggers existed
+SELECT lg_rebuild_rollup();
@@ -0,0 +1,98 @@
+"""
+model_store.py — Model bundle loading, publishing and hot swap across workers
+A bundle is models/loan_model.pkl, scaler.pkl, label_encoders.pkl, the optional
+shap_explainer.pkl and model_meta.json. Publishers replace the files
+atomically and write model_meta.json last; every worker stats that file at most
+once per CHECK_SECONDS (from a before_request hook in app.py) and reloads the
+bundle when it changes, so a full retrain or an online update takes effect
+without a restart.
+"""
+import os
+import json
+import time
+import threading
+import joblib
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+META_PATH = os.path.join(MODELS_DIR, "model_meta.json")
+CHECK_SECONDS = 1.0
+
+_lock = threading.Lock()
+_loaded_mtime = None
+_checked_at = 0.0
+
+
+def _meta_mtime():
+    try:
+        return os.stat(META_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_meta():
+    try:
+        with open(META_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_bundle():
+    """(model, scaler, label_encoders, explainer) from MODELS_DIR; explainer is None if absent."""
+    model = joblib.load(os.path.join(MODELS_DIR, "loan_model.pkl"))
+    scaler = joblib.load(os.path.join(MODELS_DIR, "scaler.pkl"))
+    label_encoders = joblib.load(os.path.join(MODELS_DIR, "label_encoders.pkl"))
+    try:
+        explainer = joblib.load(os.path.join(MODELS_DIR, "shap_explainer.pkl"))
+    except Exception:
+        explainer = None
+    return model, scaler, label_encoders, explainer
+
+
+def mark_loaded():
+    """Record the bundle currently in memory (call right after the startup load)."""
+    global _loaded_mtime
+    _loaded_mtime = _meta_mtime()
+
+
+def poll_for_new_bundle():
+    """Return a freshly loaded bundle if a new one was published since the last load, else None."""
+    global _loaded_mtime, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < CHECK_SECONDS:
+        return None
+    _checked_at = now
+    mtime = _meta_mtime()
+    if mtime is None or mtime == _loaded_mtime:
+        return None
+    with _lock:
+        if mtime == _loaded_mtime:
+            return None
+        try:
+            bundle = load_bundle()
+        except Exception as e:
+            print(f"[ModelStore] reload failed, keeping the current model: {e}")
+            return None
+        if _meta_mtime() != mtime:
+            return None   # a publish is still in progress; pick it up on the next poll
+        _loaded_mtime = mtime
+    print(f"[ModelStore] loaded model version {load_meta().get('version')} in pid {os.getpid()}")
+    return bundle
+
+
+def _atomic_dump(obj, name):
+    path = os.path.join(MODELS_DIR, name)
+    joblib.dump(obj, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def publish(model, explainer, meta):
+    """Replace the model (and explainer) of the live bundle; model_meta.json goes last."""
+    _atomic_dump(model, "loan_model.pkl")
+    if explainer is not None:
+        _atomic_dump(explainer, "shap_explainer.pkl")
+    elif os.path.exists(os.path.join(MODELS_DIR, "shap_explainer.pkl")):
+        os.remove(os.path.join(MODELS_DIR, "shap_explainer.pkl"))   # would explain the old weights
+    with open(META_PATH + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(META_PATH + ".tmp", META_PATH)
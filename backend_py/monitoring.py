@@ -1,131 +1,402 @@
 """
 monitoring.py — Model Drift Detection + Email Alerts via Resend
-Compares rolling 7-day accuracy against a baseline.
+Compares rolling 7-day accuracy against a baseline, and the 7-day input/score
+distributions against the training reference profile (PSI + binned KS).
 Sends a no-reply email via Resend API when drift is detected.
+
+Evaluation runs on a background scheduler (one worker at a time, via a
+PostgreSQL advisory lock); /drift-status answers from the latest stored
+evaluation, and evaluations older than DRIFT_RETENTION_DAYS are pruned. Alert
+state lives in drift_alert_state, so every drift episode produces one email
+across all workers and restarts: the episode is committed first, the email is
+sent outside any transaction, and alert_sent_at is set in a second one.
 """
 import os
+import json
+import math
+import time
+import threading
 import requests
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection
 from dotenv import load_dotenv
+from metrics import stage
 
 load_dotenv()
 
 BASELINE_ACCURACY = float(os.getenv("BASELINE_ACCURACY", "0.82"))
+PSI_MODERATE = 0.1
+PSI_DRIFT = float(os.getenv("PSI_DRIFT_THRESHOLD", "0.2"))
+MIN_DRIFT_SAMPLE = 30       # below this, PSI/KS are reported but never flag drift
+PSI_EPSILON = 1e-4          # smoothing for empty bins
+REFERENCE_PROFILE = os.path.join(os.path.dirname(__file__), "models", "reference_profile.json")
+
+DRIFT_WINDOW_DAYS = int(os.getenv("DRIFT_WINDOW_DAYS", "7"))
+DRIFT_EVAL_INTERVAL = int(os.getenv("DRIFT_EVAL_INTERVAL_SECONDS", "300"))
+DRIFT_RETENTION_DAYS = int(os.getenv("DRIFT_RETENTION_DAYS", "30"))
+DRIFT_LOCK_KEY = 7_302_001  # pg advisory lock id shared by every worker
+DRIFT_MIGRATION = os.path.join(os.path.dirname(__file__), "migrations", "007_drift_state.sql")
 
-_drift_alert_sent = False  # In-process guard: send at most once per server restart
+_profile_cache = {"mtime": None, "profile": None}
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
 
 
-def send_drift_alert(accuracy_7d: float, baseline: float) -> None:
+def send_drift_alert(accuracy_7d: float, baseline: float, drifted_features=None) -> bool:
     """
     Send a drift-detected alert via Resend API (no-reply email).
-    Skipped silently if RESEND_API_KEY is not configured.
+    Skipped silently if RESEND_API_KEY is not configured. Returns True once delivered.
     """
-    global _drift_alert_sent
     api_key = os.getenv("RESEND_API_KEY", "")
     alert_email = os.getenv("ALERT_EMAIL", "")
-    if not api_key or not alert_email or _drift_alert_sent:
-        return
+    if not api_key or not alert_email:
+        return False
     try:
-        requests.post(
-            "https://api.resend.com/emails",
-            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
-            json={
-                "from": "LoanGuard Alerts <onboarding@resend.dev>",
-                "to": [alert_email],
-                "subject": "⚠️ LoanGuard: Model Drift Detected",
-                "html": (
-                    f"""
-                    <h2 style='color:#dc2626'>⚠️ Model Drift Detected</h2>
-                    <p>The rolling 7-day accuracy has dropped significantly below baseline.</p>
-                    <table style='border-collapse:collapse;font-family:monospace'>
-                      <tr><td style='padding:4px 12px;font-weight:bold'>7-Day Accuracy</td>
-                          <td style='padding:4px 12px;color:#dc2626'>{accuracy_7d:.2%}</td></tr>
-                      <tr><td style='padding:4px 12px;font-weight:bold'>Baseline</td>
-                          <td style='padding:4px 12px'>{baseline:.2%}</td></tr>
-                      <tr><td style='padding:4px 12px;font-weight:bold'>Drop</td>
-                          <td style='padding:4px 12px;color:#dc2626'>{(baseline - accuracy_7d):.2%}</td></tr>
-                    </table>
-                    <p style='margin-top:16px'>Please consider retraining the model via the Admin Panel.</p>
-                    <p style='color:#6b7280;font-size:12px'>This alert is sent at most once per server session.</p>
-                    """
-                )
-            },
-            timeout=8
-        )
-        _drift_alert_sent = True
+        with stage("email"):
+            resp = requests.post(
+                "https://api.resend.com/emails",
+                headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+                json={
+                    "from": "LoanGuard Alerts <onboarding@resend.dev>",
+                    "to": [alert_email],
+                    "subject": "⚠️ LoanGuard: Model Drift Detected",
+                    "html": (
+                        f"""
+                        <h2 style='color:#dc2626'>⚠️ Model Drift Detected</h2>
+                        <p>The rolling 7-day accuracy has dropped significantly below baseline.</p>
+                        <table style='border-collapse:collapse;font-family:monospace'>
+                          <tr><td style='padding:4px 12px;font-weight:bold'>7-Day Accuracy</td>
+                              <td style='padding:4px 12px;color:#dc2626'>{accuracy_7d:.2%}</td></tr>
+                          <tr><td style='padding:4px 12px;font-weight:bold'>Baseline</td>
+                              <td style='padding:4px 12px'>{baseline:.2%}</td></tr>
+                          <tr><td style='padding:4px 12px;font-weight:bold'>Drop</td>
+                              <td style='padding:4px 12px;color:#dc2626'>{(baseline - accuracy_7d):.2%}</td></tr>
+                        </table>
+                        {"<p>Distribution drift (PSI &gt; %.2f): <b>%s</b></p>" % (PSI_DRIFT, ", ".join(drifted_features)) if drifted_features else ""}
+                        <p style='margin-top:16px'>Please consider retraining the model via the Admin Panel.</p>
+                        <p style='color:#6b7280;font-size:12px'>This alert is sent once per drift episode.</p>
+                        """
+                    )
+                },
+                timeout=8
+            )
+        return resp.status_code == 200
     except Exception:
-        pass  # Never let email failure break monitoring
-
-
-def get_connection():
-    return psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        database=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        port=os.getenv("DB_PORT"),
-        sslmode="require",
-        connect_timeout=10
+        return False  # Never let email failure break monitoring
+
+
+def init_drift_tables(get_conn):
+    """Apply migration 007 (stored evaluations + alert state) if it has not run yet."""
+    conn = get_conn()
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('drift_alert_state') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        with open(DRIFT_MIGRATION) as f:
+            cur.execute(f.read())
+        print("[LoanGuard] drift state tables created.")
+    cur.close()
+    conn.close()
+
+
+def load_reference_profile():
+    """Training-time histograms written by train_model.py (reloaded when the file changes)."""
+    try:
+        mtime = os.path.getmtime(REFERENCE_PROFILE)
+    except OSError:
+        return None
+    if _profile_cache["mtime"] != mtime:
+        with open(REFERENCE_PROFILE) as f:
+            _profile_cache["profile"] = json.load(f)
+        _profile_cache["mtime"] = mtime
+    return _profile_cache["profile"]
+
+
+def psi(expected, actual):
+    """Population Stability Index between two aligned proportion vectors."""
+    total = 0.0
+    for e, a in zip(expected, actual):
+        e, a = max(e, PSI_EPSILON), max(a, PSI_EPSILON)
+        total += (a - e) * math.log(a / e)
+    return total
+
+
+def binned_ks(expected, actual):
+    """KS statistic on binned data: max gap between the two cumulative distributions."""
+    cum_e = cum_a = gap = 0.0
+    for e, a in zip(expected, actual):
+        cum_e += e
+        cum_a += a
+        gap = max(gap, abs(cum_e - cum_a))
+    return gap
+
+
+def _bin_counts(cursor, profile, window_days):
+    """
+    One scan of the window: every feature is binned server-side (width_bucket for
+    numeric, raw value for categorical) and only (feature, bin, count) rows come back.
+    """
+    values_sql, params = [], {}
+    for i, (col, hist) in enumerate(profile["numeric"].items()):
+        values_sql.append(f"('{col}', width_bucket({col}::numeric, %(e{i})s::numeric[])::text)")
+        params[f"e{i}"] = hist["edges"]
+    for col in profile["categorical"]:
+        values_sql.append(f"('{col}', {col}::text)")
+    values_sql.append("('__score__', width_bucket(probability::numeric, %(score_edges)s::numeric[])::text)")
+    params["score_edges"] = profile["score"]["edges"]
+    params["days"] = window_days
+
+    cursor.execute(f"""
+        SELECT v.feature, v.bin, COUNT(*) AS n
+        FROM applications,
+             LATERAL (VALUES {", ".join(values_sql)}) AS v(feature, bin)
+        WHERE created_at >= NOW() - make_interval(days => %(days)s)
+        GROUP BY v.feature, v.bin
+    """, params)
+    counts = {}
+    for row in cursor.fetchall():
+        counts.setdefault(row["feature"], {})[row["bin"]] = row["n"]
+    return counts
+
+
+def _compare(expected, observed):
+    total = sum(observed)
+    if not total:
+        return None
+    actual = [c / total for c in observed]
+    value = psi(expected, actual)
+    return {
+        "psi": round(value, 4),
+        "status": "drift" if value > PSI_DRIFT else "moderate" if value > PSI_MODERATE else "stable",
+        "sample_size": total,
+    }
+
+
+def compute_distribution_drift(cursor, profile, window_days=7):
+    """PSI (+ binned KS for ordered features) for each input feature and the score."""
+    counts = _bin_counts(cursor, profile, window_days)
+    result = {}
+
+    ordered = dict(profile["numeric"], __score__=profile["score"])
+    for col, hist in ordered.items():
+        observed_map = counts.get(col, {})
+        n_bins = len(hist["proportions"])
+        observed = [observed_map.get(str(b), 0) for b in range(n_bins)]
+        entry = _compare(hist["proportions"], observed)
+        if entry:
+            total = sum(observed)
+            entry["ks"] = round(binned_ks(hist["proportions"], [c / total for c in observed]), 4)
+        result["score" if col == "__score__" else col] = entry
+
+    for col, shares in profile["categorical"].items():
+        observed_map = counts.get(col, {})
+        categories = list(shares)
+        unseen = sum(n for k, n in observed_map.items() if k not in shares)
+        expected = [shares[c] for c in categories] + [0.0]
+        observed = [observed_map.get(c, 0) for c in categories] + [unseen]
+        result[col] = _compare(expected, observed)
+
+    return result
+
+
+def evaluate_drift(cursor, window_days=DRIFT_WINDOW_DAYS):
+    """
+    Compute the drift report for the sliding window (no side effects).
+    - accuracy_7d: agreement with a simple ground-truth proxy (high income +
+      credit history = expected Approved), aggregated in SQL.
+    - features / score: PSI and binned KS against the training reference
+      profile, binned server-side (O(bins) rows returned).
+    drift_detected=True if accuracy drops >10% below baseline or any feature /
+    the score distribution has PSI above PSI_DRIFT.
+    """
+    cursor.execute("""
+        SELECT
+            COUNT(*) AS n,
+            COUNT(*) FILTER (
+                WHERE prediction = CASE WHEN applicant_income > 3000 AND credit_history = 1 THEN 1 ELSE 0 END
+            ) AS correct
+        FROM applications
+        WHERE created_at >= NOW() - make_interval(days => %s)
+    """, (window_days,))
+    agg = cursor.fetchone()
+    sample_size = agg["n"]
+
+    if not sample_size:
+        return {
+            "drift_detected": False,
+            "accuracy_7d": None,
+            "accuracy_baseline": BASELINE_ACCURACY,
+            "sample_size": 0,
+            "window_days": window_days,
+            "message": f"No predictions in the last {window_days} days."
+        }
+
+    profile = load_reference_profile()
+    distribution = compute_distribution_drift(cursor, profile, window_days) if profile else {}
+
+    accuracy_7d = round(agg["correct"] / sample_size, 4)
+    accuracy_drift = accuracy_7d < (BASELINE_ACCURACY - 0.10)
+    drifted = [name for name, d in distribution.items() if d and d["status"] == "drift"]
+    distribution_drift = bool(drifted) and sample_size >= MIN_DRIFT_SAMPLE
+
+    if accuracy_drift:
+        message = "⚠️ Model drift detected — accuracy dropped significantly. Consider retraining."
+    elif distribution_drift:
+        message = f"⚠️ Input drift detected in: {', '.join(drifted)}. Consider retraining."
+    else:
+        message = "✅ Model performance is stable."
+    if not profile:
+        message += (" Input drift (PSI/KS) not checked: models/reference_profile.json is missing —"
+                    " run python train_model.py --reference-profile or retrain.")
+
+    return {
+        "drift_detected": accuracy_drift or distribution_drift,
+        "accuracy_7d": accuracy_7d,
+        "accuracy_baseline": BASELINE_ACCURACY,
+        "sample_size": sample_size,
+        "window_days": window_days,
+        "features": {k: v for k, v in distribution.items() if k != "score"},
+        "score": distribution.get("score"),
+        "drifted_features": drifted if distribution_drift else [],
+        "psi_threshold": PSI_DRIFT,
+        "reference_profile": bool(profile),
+        "message": message
+    }
+
+
+def _update_episode(cursor, result):
+    """
+    Open/close the drift episode inside the evaluation transaction.
+    Returns the episode's start time if its email is still owed, else None.
+    """
+    cursor.execute(
+        "SELECT in_episode, episode_started_at, alert_sent_at FROM drift_alert_state WHERE id = 1 FOR UPDATE"
     )
+    state = cursor.fetchone()
+    if result["drift_detected"]:
+        if not state["in_episode"]:
+            cursor.execute("""
+                UPDATE drift_alert_state SET in_episode = TRUE, episode_started_at = NOW(), alert_sent_at = NULL
+                WHERE id = 1 RETURNING episode_started_at
+            """)
+            return cursor.fetchone()["episode_started_at"]
+        return state["episode_started_at"] if state["alert_sent_at"] is None else None
+    if state["in_episode"]:
+        cursor.execute("UPDATE drift_alert_state SET in_episode = FALSE, episode_ended_at = NOW() WHERE id = 1")
+    return None
 
 
-def get_drift_status():
+def _send_episode_alert(conn, episode_started_at, result):
+    """Email after the episode is committed (no row lock held while SMTP/HTTP is slow), then record it."""
+    if not send_drift_alert(result["accuracy_7d"], BASELINE_ACCURACY, result["drifted_features"] or None):
+        return   # not configured or not delivered — retried on the next evaluation
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE drift_alert_state SET alert_sent_at = NOW()
+        WHERE id = 1 AND in_episode AND episode_started_at = %s AND alert_sent_at IS NULL
+    """, (episode_started_at,))
+    conn.commit()
+    cursor.close()
+
+
+def evaluate_and_store(force=False):
     """
-    GET /drift-status
-    Computes rolling 7-day accuracy by comparing model predictions
-    against a simple ground-truth proxy: applications with high income +
-    credit history = expected Approved; otherwise Rejected.
-    Returns drift_detected=True if accuracy drops >10% below baseline.
+    Run one evaluation if no other worker holds the lock and the stored result
+    is older than DRIFT_EVAL_INTERVAL (or force=True). Returns True if it ran.
     """
+    conn = get_connection()
     try:
-        conn = get_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("SELECT pg_try_advisory_xact_lock(%s) AS locked", (DRIFT_LOCK_KEY,))
+        if not cursor.fetchone()["locked"]:
+            conn.rollback()
+            return False
+        if not force:
+            cursor.execute("""
+                SELECT 1 FROM drift_evaluations
+                WHERE evaluated_at > NOW() - make_interval(secs => %s) LIMIT 1
+            """, (DRIFT_EVAL_INTERVAL,))
+            if cursor.fetchone():
+                conn.rollback()
+                return False
 
-        # Last 7 days of predictions
-        cursor.execute("""
-            SELECT applicant_income, credit_history, prediction, probability
-            FROM applications
-            WHERE created_at >= NOW() - INTERVAL '7 days'
-            ORDER BY created_at DESC
-        """)
-        rows = cursor.fetchall()
+        result = evaluate_drift(cursor)
+        alert_episode = _update_episode(cursor, result)
+        cursor.execute(
+            "INSERT INTO drift_evaluations (window_days, drift_detected, result) VALUES (%s, %s, %s::jsonb)",
+            (result["window_days"], result["drift_detected"], json.dumps(result))
+        )
+        cursor.execute(
+            "DELETE FROM drift_evaluations WHERE evaluated_at < NOW() - make_interval(days => %s)",
+            (DRIFT_RETENTION_DAYS,)
+        )
+        # Dashboards cache /drift-status — tell every worker a new result exists
+        cursor.execute("SELECT pg_notify('loanguard_cache', 'drift')")
+        conn.commit()
         cursor.close()
+        if alert_episode is not None:
+            _send_episode_alert(conn, alert_episode, result)
+        return True
+    finally:
         conn.close()
 
-        if not rows:
-            return {
-                "drift_detected": False,
-                "accuracy_7d": None,
-                "accuracy_baseline": BASELINE_ACCURACY,
-                "sample_size": 0,
-                "message": "No predictions in the last 7 days."
-            }
 
-        # Simple proxy ground truth
-        correct = 0
-        for row in rows:
-            expected = 1 if (row["applicant_income"] > 3000 and row["credit_history"] == 1) else 0
-            if row["prediction"] == expected:
-                correct += 1
+def _scheduler_loop():
+    while True:
+        try:
+            evaluate_and_store()
+        except Exception as e:
+            print(f"[Drift] scheduled evaluation failed: {e}")
+        time.sleep(DRIFT_EVAL_INTERVAL)
 
-        accuracy_7d = round(correct / len(rows), 4)
-        drift_detected = accuracy_7d < (BASELINE_ACCURACY - 0.10)
 
-        if drift_detected:
-            send_drift_alert(accuracy_7d, BASELINE_ACCURACY)
+def ensure_drift_scheduler():
+    """Start the background evaluator once per (post-fork) worker process."""
+    global _scheduler_pid
+    pid = os.getpid()
+    if _scheduler_pid == pid:
+        return
+    with _scheduler_lock:
+        if _scheduler_pid != pid:
+            _scheduler_pid = pid
+            threading.Thread(target=_scheduler_loop, name="drift-scheduler", daemon=True).start()
 
-        return {
-            "drift_detected": drift_detected,
-            "accuracy_7d": accuracy_7d,
-            "accuracy_baseline": BASELINE_ACCURACY,
-            "sample_size": len(rows),
-            "message": (
-                "⚠️ Model drift detected — accuracy dropped significantly. Consider retraining."
-                if drift_detected else
-                "✅ Model performance is stable."
-            )
-        }
+
+def get_drift_status():
+    """
+    GET /drift-status
+    Returns the latest stored evaluation (see evaluate_drift) with its
+    evaluated_at timestamp. Evaluates synchronously only if nothing is stored yet.
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("SELECT evaluated_at, result FROM drift_evaluations ORDER BY id DESC LIMIT 1")
+        row = cursor.fetchone()
+        cursor.close()
+        conn.close()
+
+        if row is None:
+            evaluate_and_store(force=True)
+            return get_drift_status() if _has_evaluation() else {
+                "drift_detected": False, "accuracy_7d": None,
+                "accuracy_baseline": BASELINE_ACCURACY, "sample_size": 0,
+                "message": "Drift evaluation pending."
+            }
+
+        result = row["result"]
+        result["evaluated_at"] = row["evaluated_at"].isoformat()
+        return result
 
     except Exception as e:
         return {"drift_detected": False, "error": str(e)}
+
+
+def _has_evaluation():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM drift_evaluations)")
+    found = cursor.fetchone()[0]
+    cursor.close()
+    conn.close()
+    return found
@@ -0,0 +1,363 @@
+"""
+online_learning.py — Incremental model updates from officer decisions (ONLINE_LEARNING=1)
+PATCH /applications/<id>/status to Approved / Rejected writes a label into
+model_feedback (same transaction as the status change). A background worker in
+every process wakes every ONLINE_UPDATE_INTERVAL_SECONDS; the one that gets the
+advisory lock takes the pending labels and, once there are ONLINE_MIN_BATCH:
+
+  1. updates the candidate — an SGD logistic model seeded from the published
+     weights and kept in models/online_candidate.pkl — with partial_fit on the
+     new labels (scaler and encoders stay those of the published bundle);
+  2. scores candidate and published model on a holdout of labelled
+     applications (a fixed id-hash bucket, never used for updates);
+  3. publishes the candidate through model_store.publish (every worker
+     hot-swaps it) only if its holdout accuracy and F1 are no worse than the
+     published model's by more than ONLINE_TOLERANCE.
+
+A full retrain publishes a new version, which re-seeds the candidate.
+Every cycle is logged to online_updates (GET /admin/online-learning).
+"""
+import os
+import json
+import time
+import threading
+import warnings
+from datetime import datetime
+import joblib
+import numpy as np
+import pandas as pd
+from psycopg2.extras import RealDictCursor
+from db import get_connection
+from flask import request, jsonify
+from dotenv import load_dotenv
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from model_store import MODELS_DIR, load_bundle, load_meta, publish
+from train_source import HASH_MULTIPLIER, HASH_MODULUS
+
+load_dotenv()
+
+ONLINE_LEARNING = os.getenv("ONLINE_LEARNING", "0") == "1"
+ONLINE_INTERVAL = int(os.getenv("ONLINE_UPDATE_INTERVAL_SECONDS", "300"))
+ONLINE_MIN_BATCH = int(os.getenv("ONLINE_MIN_BATCH", "50"))
+ONLINE_MAX_BATCH = 10_000
+ONLINE_TOLERANCE = float(os.getenv("ONLINE_TOLERANCE", "0.005"))
+ONLINE_ETA = float(os.getenv("ONLINE_LEARNING_RATE", "0.01"))
+ONLINE_ALPHA = 1e-4
+HOLDOUT_FRACTION = 0.2
+HOLDOUT_ROWS = 5_000
+MIN_HOLDOUT_ROWS = 100
+SHAP_BACKGROUND_ROWS = 1_000
+ONLINE_LOCK_KEY = 7_302_002  # pg advisory lock id shared by every worker
+CANDIDATE_PATH = os.path.join(MODELS_DIR, "online_candidate.pkl")
+ONLINE_MIGRATION = os.path.join(os.path.dirname(__file__), "migrations", "008_online_learning.sql")
+
+FEATURE_COLUMNS = [  # model feature -> applications column
+    ("Gender", "gender"), ("Married", "married"), ("Dependents", "dependents"),
+    ("Education", "education"), ("Self_Employed", "self_employed"),
+    ("ApplicantIncome", "applicant_income"), ("CoapplicantIncome", "coapplicant_income"),
+    ("LoanAmount", "loan_amount"), ("Loan_Amount_Term", "loan_term"),
+    ("Credit_History", "credit_history"), ("Property_Area", "property_area"),
+]
+HOLDOUT_SQL = f"(a.id::bigint * {HASH_MULTIPLIER}) % {HASH_MODULUS} < {int(HOLDOUT_FRACTION * HASH_MODULUS)}"
+LABELS = {"Approved": 1, "Rejected": 0}
+
+_learner_pid = None
+_learner_lock = threading.Lock()
+
+
+def init_online_tables(get_conn):
+    """Apply migration 008 (feedback buffer + update log) if it has not run yet."""
+    conn = get_conn()
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('online_updates') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        with open(ONLINE_MIGRATION) as f:
+            cur.execute(f.read())
+        print("[LoanGuard] online learning tables created.")
+    cur.close()
+    conn.close()
+
+
+def record_feedback(cursor, app_id, status):
+    """Queue a final decision as a label (call inside the status-update transaction)."""
+    if ONLINE_LEARNING and status in LABELS:
+        cursor.execute("INSERT INTO model_feedback (application_id, label) VALUES (%s, %s)",
+                       (app_id, LABELS[status]))
+
+
+# ── One update cycle ──────────────────────────────────────────────────────────
+
+def _features(rows, scaler, label_encoders):
+    """applications rows -> scaled model input, dropping rows the published encoders cannot take."""
+    df = pd.DataFrame({feature: [r[col] for r in rows] for feature, col in FEATURE_COLUMNS})
+    ok = df.notna().all(axis=1)
+    for col, le in label_encoders.items():
+        ok &= df[col].isin(le.classes_)
+    ok = ok.to_numpy()
+    X = df[ok].copy()
+    X["LoanAmount"] = X["LoanAmount"] / 1000   # model was trained on ₹ thousands
+    for col, le in label_encoders.items():
+        X[col] = le.transform(X[col])
+    return (scaler.transform(X) if len(X) else np.empty((0, len(FEATURE_COLUMNS)))), ok
+
+
+def _fetch_feedback(cursor):
+    cursor.execute(f"""
+        SELECT f.id AS feedback_id, f.label, a.id, {', '.join('a.' + c for _, c in FEATURE_COLUMNS)},
+               {HOLDOUT_SQL} AS holdout
+          FROM model_feedback f JOIN applications a ON a.id = f.application_id
+         WHERE f.consumed_at IS NULL
+         ORDER BY f.id
+         LIMIT %s
+    """, (ONLINE_MAX_BATCH,))
+    return cursor.fetchall()
+
+
+def _fetch_holdout(cursor):
+    cursor.execute(f"""
+        SELECT a.status, {', '.join('a.' + c for _, c in FEATURE_COLUMNS)}
+          FROM applications a
+         WHERE a.status IN ('Approved', 'Rejected') AND {HOLDOUT_SQL}
+         ORDER BY a.id DESC
+         LIMIT %s
+    """, (HOLDOUT_ROWS,))
+    return cursor.fetchall()
+
+
+def _load_candidate(version):
+    try:
+        candidate = joblib.load(CANDIDATE_PATH)
+        if candidate.get("base_version") == version:
+            return candidate
+    except Exception:
+        pass
+    return None
+
+
+def _save_candidate(candidate):
+    joblib.dump(candidate, CANDIDATE_PATH + ".tmp")
+    os.replace(CANDIDATE_PATH + ".tmp", CANDIDATE_PATH)
+
+
+def _scores(model, X, y):
+    pred = model.predict(X)
+    return {"accuracy": round(float(accuracy_score(y, pred)), 4),
+            "f1": round(float(f1_score(y, pred, zero_division=0)), 4)}
+
+
+def _explainer(model, background):
+    try:
+        import shap
+        return shap.LinearExplainer(model, background)
+    except Exception as e:
+        print(f"[Online] SHAP explainer skipped: {e}")
+        return None
+
+
+def run_update(force=False):
+    """
+    One cycle if no other worker holds the lock and enough labels are pending
+    (force=True ignores ONLINE_MIN_BATCH). Returns the logged result, None if
+    skipped, or {"skipped": True, "reason": ...} if the published model cannot
+    be updated online.
+    """
+    from train_streaming import as_logistic_regression   # pulls in mlflow; keep it out of app import
+
+    model, scaler, label_encoders, _ = load_bundle()
+    if not hasattr(model, "coef_"):   # checked before the lock: nothing to roll back
+        reason = f"online updates need a linear model; {type(model).__name__} is published"
+        print(f"[Online] update skipped: {reason}")
+        return {"skipped": True, "reason": reason}
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        # Session lock (released by conn.close()): it must outlive the commit below, so no other
+        # worker starts a cycle from the old candidate while this one is still publishing
+        cursor.execute("SELECT pg_try_advisory_lock(%s) AS locked", (ONLINE_LOCK_KEY,))
+        if not cursor.fetchone()["locked"]:
+            conn.rollback()
+            return None
+        feedback = _fetch_feedback(cursor)
+        latest = {}
+        for row in feedback:   # a later decision on the same application wins
+            latest[row["id"]] = row
+        train_rows = [r for r in latest.values() if not r["holdout"]]
+        if not train_rows or (len(train_rows) < ONLINE_MIN_BATCH and not force):
+            conn.rollback()
+            return None
+
+        meta = load_meta()
+        X, ok = _features(train_rows, scaler, label_encoders)
+        y = np.array([r["label"] for r in train_rows])[ok]
+        holdout = _fetch_holdout(cursor)
+        X_h, ok_h = _features(holdout, scaler, label_encoders)
+        y_h = np.array([LABELS[r["status"]] for r in holdout])[ok_h]
+
+        candidate = _load_candidate(meta.get("version"))
+        if candidate is None:
+            if len(set(y)) < 2:
+                conn.rollback()   # seeding needs both outcomes; keep the labels for the next cycle
+                return None
+            sgd = SGDClassifier(loss="log_loss", alpha=ONLINE_ALPHA, learning_rate="constant",
+                                eta0=ONLINE_ETA, max_iter=1, tol=None, random_state=0)
+            with warnings.catch_warnings():
+                # One epoch is the point (a seed close to the published weights), not convergence;
+                # partial_fit cannot take coef_init
+                warnings.simplefilter("ignore", ConvergenceWarning)
+                sgd.fit(X, y, coef_init=model.coef_, intercept_init=model.intercept_)
+            candidate = {"sgd": sgd, "base_version": meta.get("version"), "updates": 0, "rows": 0}
+        elif len(y):
+            candidate["sgd"].partial_fit(X, y)
+        candidate["updates"] += 1
+        candidate["rows"] += int(len(y))
+        candidate_model = as_logistic_regression(candidate["sgd"], candidate["updates"])
+
+        result = {"training_rows": int(len(y)), "holdout_rows": int(len(y_h)),
+                  "base_version": meta.get("version"), "candidate_updates": candidate["updates"]}
+        published_version = None
+        if len(y_h) >= MIN_HOLDOUT_ROWS:
+            result["published_scores"] = _scores(model, X_h, y_h)
+            result["candidate_scores"] = _scores(candidate_model, X_h, y_h)
+            passed = all(result["candidate_scores"][m] >= result["published_scores"][m] - ONLINE_TOLERANCE
+                         for m in ("accuracy", "f1"))
+            result["reason"] = "passed holdout" if passed else "worse than the published model on holdout"
+        else:
+            passed = False
+            result["reason"] = f"holdout too small ({len(y_h)} < {MIN_HOLDOUT_ROWS})"
+
+        if passed:
+            base = str(meta.get("version", "")).split("-online")[0]
+            published_version = f"{base}-online{candidate['updates']}"
+
+        # Labels and the log row are committed before any file changes, so a failure after
+        # this point can neither retrain on the same labels nor leave an unlogged model live
+        cursor.execute("UPDATE model_feedback SET consumed_at = NOW() WHERE id = ANY(%s)",
+                       ([r["feedback_id"] for r in feedback],))
+        cursor.execute("""
+            INSERT INTO online_updates (training_rows, holdout_rows, published, model_version, result)
+            VALUES (%s, %s, %s, %s, %s::jsonb)
+            RETURNING id
+        """, (result["training_rows"], result["holdout_rows"], passed, published_version, json.dumps(result)))
+        update_id = cursor.fetchone()["id"]
+        conn.commit()
+
+        if passed:
+            background = X_h[:SHAP_BACKGROUND_ROWS] if len(X_h) else X[:SHAP_BACKGROUND_ROWS]
+            try:
+                publish(candidate_model, _explainer(candidate_model, background), {
+                    **meta,
+                    "version": published_version,
+                    "trained_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
+                    "accuracy": result["candidate_scores"]["accuracy"],
+                    "f1": result["candidate_scores"]["f1"],
+                    "online_updates": candidate["updates"],
+                    "online_rows": candidate["rows"],
+                    "base_version": base,
+                })
+            except Exception as e:
+                result["reason"] = f"passed holdout, publish failed: {e}"
+                cursor.execute("""
+                    UPDATE online_updates SET published = FALSE, model_version = NULL, result = %s::jsonb
+                     WHERE id = %s
+                """, (json.dumps(result), update_id))
+                conn.commit()
+                _save_candidate(candidate)   # keeps what it learned from the consumed labels; the next cycle retries
+                raise
+            candidate["base_version"] = published_version
+        _save_candidate(candidate)
+        cursor.close()
+        result["published"] = passed
+        result["model_version"] = published_version
+        return result
+    finally:
+        conn.close()
+
+
+def _learner_loop():
+    while True:
+        time.sleep(ONLINE_INTERVAL)
+        try:
+            result = run_update()
+            if result and not result.get("skipped"):
+                print(f"[Online] update: {result['training_rows']} labels, "
+                      f"published={result['published']} ({result['reason']})")
+        except Exception as e:
+            print(f"[Online] update failed: {e}")
+
+
+def ensure_online_learner():
+    """Start the background learner once per (post-fork) worker when ONLINE_LEARNING=1."""
+    global _learner_pid
+    if not ONLINE_LEARNING:
+        return
+    pid = os.getpid()
+    if _learner_pid == pid:
+        return
+    with _learner_lock:
+        if _learner_pid != pid:
+            _learner_pid = pid
+            threading.Thread(target=_learner_loop, name="online-learner", daemon=True).start()
+
+
+# ── Admin endpoints ───────────────────────────────────────────────────────────
+
+def get_online_status():
+    """Online Learning Status (ADMIN only)
+    ---
+    parameters:
+      - {name: limit, in: query, type: integer, description: "Recent update cycles to list (default 20)"}
+    responses:
+      200:
+        description: Mode, pending labels, live model version and recent update cycles
+    """
+    limit = request.args.get("limit", 20, type=int)
+    conn = get_connection()
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("SELECT COUNT(*) AS pending FROM model_feedback WHERE consumed_at IS NULL")
+        pending = cursor.fetchone()["pending"]
+        cursor.execute("""
+            SELECT ran_at, training_rows, holdout_rows, published, model_version, result
+              FROM online_updates ORDER BY id DESC LIMIT %s
+        """, (limit,))
+        updates = [{**r, "ran_at": r["ran_at"].isoformat()} for r in cursor.fetchall()]
+        cursor.close()
+    finally:
+        conn.close()
+    return jsonify({
+        "enabled": ONLINE_LEARNING,
+        "interval_seconds": ONLINE_INTERVAL,
+        "min_batch": ONLINE_MIN_BATCH,
+        "tolerance": ONLINE_TOLERANCE,
+        "pending_labels": pending,
+        "model_version": load_meta().get("version"),
+        "updates": updates,
+    })
+
+
+def run_online_update():
+    """Run an Online Update Cycle Now (ADMIN only)
+    ---
+    responses:
+      200:
+        description: Cycle result (published or not, with holdout scores)
+      400:
+        description: Online learning disabled
+      409:
+        description: Another worker is updating, there are no usable labels, or the published model is not linear
+    """
+    if not ONLINE_LEARNING:
+        return jsonify({"error": "Online learning is disabled (set ONLINE_LEARNING=1)"}), 400
+    try:
+        result = run_update(force=True)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if result and result.get("skipped"):
+        return jsonify({"error": "No update ran", "reason": result["reason"]}), 409
+    if result is None:
+        return jsonify({"error": "No update ran (lock held by another worker, or no usable labels)"}), 409
+    return jsonify(result)
@@ -0,0 +1,145 @@
+"""
+perpid_store.py — Per-worker state files shared by the in-process collectors
+metrics, sketches, querylog, sampling_profiler and memprofile each keep their
+state in memory per gunicorn worker and publish it as <directory>/<pid>.json
+(written atomically). A reader merges the files of the live workers; files of
+dead workers are removed, or first folded into <directory>/_retired.json by
+collectors whose totals must never go backwards (metrics counters).
+
+    _flusher = flusher("sketch-flusher", flush, FLUSH_SECONDS, "Sketches")
+    _flusher.ensure()                       # once per (post-fork) worker
+    write_state(LIVE_STATS_DIR, state)
+    for pid, state in worker_states(LIVE_STATS_DIR): ...
+"""
+import os
+import json
+import time
+import fcntl
+import threading
+
+RETIRED_FILE = "_retired.json"
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def write_json(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def write_state(directory, state):
+    """Publish this worker's state as <directory>/<pid>.json."""
+    os.makedirs(directory, exist_ok=True)
+    write_json(os.path.join(directory, f"{os.getpid()}.json"), state)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def worker_states(directory, on_dead=None):
+    """[(pid, state)] of every live worker's file, by pid.
+
+    A dead worker's file is handed to on_dead(path) if given, else removed.
+    Unreadable (half-written) files are skipped.
+    """
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return []
+    states = []
+    for name in names:
+        stem = name[:-5]
+        if not name.endswith(".json") or not stem.isdigit():
+            continue
+        path = os.path.join(directory, name)
+        if not pid_alive(int(stem)):
+            (on_dead or _remove)(path)
+            continue
+        try:
+            with open(path) as f:
+                states.append((int(stem), json.load(f)))
+        except (OSError, ValueError):
+            continue
+    return states
+
+
+def retire(directory, path, fold):
+    """Fold a dead worker's file into _retired.json exactly once.
+
+    fold(retired, dead) returns the new retired state; retired is None the first time.
+    """
+    claimed = f"{path}.retiring.{os.getpid()}"
+    try:
+        os.rename(path, claimed)   # only one reader wins the rename
+    except OSError:
+        return
+    retired_path = os.path.join(directory, RETIRED_FILE)
+    with open(os.path.join(directory, ".retire.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(claimed) as f:
+                dead = json.load(f)
+            retired = None
+            if os.path.exists(retired_path):
+                with open(retired_path) as f:
+                    retired = json.load(f)
+            write_json(retired_path, fold(retired, dead))
+        except (OSError, ValueError) as e:
+            print(f"[PerPidStore] could not retire {path}: {e}")
+        finally:
+            _remove(claimed)
+
+
+def retired_state(directory):
+    """Contents of _retired.json, or None."""
+    try:
+        with open(os.path.join(directory, RETIRED_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class WorkerThread:
+    """A daemon thread started at most once per process — and again in each forked worker."""
+
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid != pid:
+                self._pid = pid
+                threading.Thread(target=self.target, name=self.name, daemon=True).start()
+
+
+def flusher(name, flush, seconds, label):
+    """WorkerThread calling flush() every `seconds`; failures are printed as [label]."""
+    def run():
+        while True:
+            time.sleep(seconds)
+            try:
+                flush()
+            except Exception as e:
+                print(f"[{label}] flush failed: {e}")
+    return WorkerThread(name, run)
+
@@ -0,0 +1,198 @@
+"""
+profiling.py — On-demand profiling of a single live request (ADMIN only)
+Send `X-Profile: pstats` (or `?profile=pstats`) with an ADMIN JWT to /predict,
+/batch-predict or /report/<id>; the request runs under a deterministic profiler
+and the response carries X-Profile-Id. 1 / true / yes mean pstats; any other
+value (0, false, off...) leaves the request unprofiled. Download the result from
+GET /admin/profiles/<id>:
+
+    pstats     cProfile dump   -> python -m pstats / snakeviz
+    collapsed  folded stacks   -> flamegraph.pl / speedscope (values in µs)
+
+Profiles are kept in PROFILE_DIR (newest PROFILE_RETENTION files, at most
+PROFILE_MAX_AGE_HOURS old); PROFILE_RATE_PER_MINUTE caps new profiles across
+all workers.
+"""
+import os
+import re
+import sys
+import time
+import cProfile
+import tempfile
+from collections import defaultdict
+from datetime import datetime
+from functools import wraps
+from flask import request, jsonify, send_file, make_response
+from auth import role_required
+from tracing import current_request_id
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "loanguard_profiles"))
+PROFILE_RETENTION = int(os.getenv("PROFILE_RETENTION", "50"))
+PROFILE_MAX_AGE_HOURS = float(os.getenv("PROFILE_MAX_AGE_HOURS", "24"))
+PROFILE_RATE_PER_MINUTE = int(os.getenv("PROFILE_RATE_PER_MINUTE", "5"))
+
+FORMATS = {"pstats": ".prof", "collapsed": ".collapsed"}
+_PROFILE_ID_RE = re.compile(r"^[0-9]{8}T[0-9]{6}_[A-Za-z0-9._-]+_[a-z0-9-]+$")
+
+
+def _requested_format():
+    """pstats / collapsed if the request asks to be profiled, else None ("0", "off", typos...)."""
+    flag = (request.headers.get("X-Profile") or request.args.get("profile") or "").strip().lower()
+    if flag in ("1", "true", "yes"):
+        return "pstats"
+    return flag if flag in FORMATS else None
+
+
+class _StackProfiler:
+    """Deterministic profiler that keeps full call stacks (self time per stack)."""
+
+    def __init__(self):
+        self.stacks = defaultdict(float)   # "a;b;c" -> self seconds
+        self._frames = []                  # [[label, started, child_time]]
+
+    @staticmethod
+    def _label(frame, event, arg):
+        if event.startswith("c_"):
+            module = getattr(arg, "__module__", None) or "builtins"
+            return f"{module}.{getattr(arg, '__qualname__', getattr(arg, '__name__', '?'))}"
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _callback(self, frame, event, arg):
+        now = time.perf_counter()
+        if event in ("call", "c_call"):
+            self._frames.append([self._label(frame, event, arg), now, 0.0])
+        elif self._frames:
+            label, started, child = self._frames.pop()
+            elapsed = now - started
+            self.stacks[";".join([f[0] for f in self._frames] + [label])] += elapsed - child
+            if self._frames:
+                self._frames[-1][2] += elapsed
+
+    def enable(self):
+        sys.setprofile(self._callback)
+
+    def disable(self):
+        sys.setprofile(None)
+
+    def dump_stats(self, path):
+        with open(path, "w") as f:
+            for stack, seconds in sorted(self.stacks.items()):
+                micros = int(seconds * 1_000_000)
+                if micros:
+                    f.write(f"{stack} {micros}\n")
+
+
+def _profiles():
+    """(mtime, name) of stored profiles, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    out = []
+    for name in os.listdir(PROFILE_DIR):
+        stem, ext = os.path.splitext(name)
+        if ext in FORMATS.values():
+            try:
+                out.append((os.path.getmtime(os.path.join(PROFILE_DIR, name)), name))
+            except OSError:
+                continue
+    return sorted(out, reverse=True)
+
+
+def _prune():
+    cutoff = time.time() - PROFILE_MAX_AGE_HOURS * 3600
+    for i, (mtime, name) in enumerate(_profiles()):
+        if i >= PROFILE_RETENTION or mtime < cutoff:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name))
+            except OSError:
+                pass
+
+
+def _rate_limited():
+    window_start = time.time() - 60
+    return sum(1 for mtime, _ in _profiles() if mtime >= window_start) >= PROFILE_RATE_PER_MINUTE
+
+
+def _run_profiled(f, fmt):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if _rate_limited():
+            return jsonify({"error": f"Profiling is limited to {PROFILE_RATE_PER_MINUTE} requests per minute"}), 429
+
+        profiler = cProfile.Profile() if fmt == "pstats" else _StackProfiler()
+        profiler.enable()
+        try:
+            resp = make_response(f(*args, **kwargs))
+        finally:
+            profiler.disable()
+
+        route = (request.url_rule.rule if request.url_rule else request.path).strip("/")
+        profile_id = "_".join([
+            datetime.now().strftime("%Y%m%dT%H%M%S"),
+            current_request_id() or str(os.getpid()),
+            re.sub(r"[^a-z0-9]+", "-", route.lower()).strip("-") or "root",
+        ])
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(PROFILE_DIR, profile_id + FORMATS[fmt]))
+        _prune()
+
+        resp.headers["X-Profile-Id"] = profile_id
+        resp.headers["X-Profile-URL"] = f"/admin/profiles/{profile_id}"
+        return resp
+    return decorated
+
+
+def profiled(f):
+    """Run the wrapped view under a profiler when an ADMIN asks for it."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        fmt = _requested_format()
+        if fmt is None:
+            return f(*args, **kwargs)
+        return role_required("ADMIN")(_run_profiled(f, fmt))(*args, **kwargs)
+    return decorated
+
+
+def list_profiles():
+    """List Stored Request Profiles (ADMIN only)
+    ---
+    responses:
+      200:
+        description: Newest first, with format, size and creation time
+    """
+    items = []
+    for mtime, name in _profiles():
+        stem, ext = os.path.splitext(name)
+        items.append({
+            "id": stem,
+            "format": next(k for k, v in FORMATS.items() if v == ext),
+            "size_bytes": os.path.getsize(os.path.join(PROFILE_DIR, name)),
+            "created_at": datetime.fromtimestamp(mtime).isoformat(timespec="seconds"),
+            "download": f"/admin/profiles/{stem}",
+        })
+    return jsonify({"profiles": items, "retention": PROFILE_RETENTION,
+                    "rate_per_minute": PROFILE_RATE_PER_MINUTE})
+
+
+def download_profile(profile_id):
+    """Download a Stored Request Profile (ADMIN only)
+    ---
+    parameters:
+      - name: profile_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: pstats dump (.prof) or collapsed stacks (.collapsed)
+      404:
+        description: Unknown or expired profile
+    """
+    if not _PROFILE_ID_RE.match(profile_id):
+        return jsonify({"error": "Profile not found"}), 404
+    for ext in FORMATS.values():
+        path = os.path.join(PROFILE_DIR, profile_id + ext)
+        if os.path.exists(path):
+            return send_file(path, mimetype="application/octet-stream" if ext == ".prof" else "text/plain",
+                             as_attachment=True, download_name=profile_id + ext)
+    return jsonify({"error": "Profile not found"}), 404
@@ -0,0 +1,277 @@
+"""
+querylog.py — Per-statement timing and slow-query log for every database call
+db.get_connection() passes connection_factory=InstrumentedConnection,
+so each cursor (including RealDictCursor and named cursors) times execute /
+executemany / copy_expert and records, per normalized statement fingerprint:
+calls, total/max time, rows and the calling routes.
+
+Statements slower than QUERY_SLOW_MS are printed as a JSON line; their EXPLAIN
+plan is fetched on a separate connection in the background (once per
+fingerprint per EXPLAIN_COOLDOWN_SECONDS) and attached to the slow-log entry.
+The plan is the generic one of the parameterized text (PREPARE + EXPLAIN
+EXECUTE with plan_cache_mode=force_generic_plan), so bound values never
+appear in logs.
+Workers flush their aggregates to QUERYLOG_DIR/<pid>.json and
+GET /admin/slow-queries merges all live workers.
+"""
+import os
+import re
+import json
+import time
+import tempfile
+import threading
+from collections import Counter, deque
+from functools import lru_cache
+from flask import request, jsonify, has_request_context
+import psycopg2
+import psycopg2.extensions
+from dotenv import load_dotenv
+from tracing import current_request_id
+from perpid_store import flusher, worker_states, write_state
+
+load_dotenv()
+
+QUERY_SLOW_MS = float(os.getenv("QUERY_SLOW_MS", "200"))
+EXPLAIN_COOLDOWN_SECONDS = 300
+MAX_FINGERPRINTS = 500        # distinct statements tracked per worker
+MAX_ROUTES_PER_STATEMENT = 8
+SLOW_LOG_SIZE = 50            # recent slow statements kept per worker
+FLUSH_SECONDS = 10
+QUERYLOG_DIR = os.getenv("QUERYLOG_DIR", os.path.join(tempfile.gettempdir(), "loanguard_querylog"))
+OVERFLOW_FINGERPRINT = "[other statements]"
+EXPLAINABLE = ("select", "insert", "update", "delete", "with")
+EXPLAIN_STATEMENT = "loanguard_explain"
+
+_lock = threading.Lock()
+_stats = {}                           # fingerprint -> {"calls", "total_ms", "max_ms", "rows", "routes"}
+_slow = deque(maxlen=SLOW_LOG_SIZE)   # recent slow statements (dicts, plan filled in later)
+_explained_at = {}                    # fingerprint -> time of last EXPLAIN
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PARAM_RE = re.compile(r"%\(\w+\)s|%s")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+_PLACEHOLDER_RE = re.compile(r"%%|%\((\w+)\)s|%s")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql_text):
+    """Normalize a statement so calls that differ only in literals group together."""
+    s = _COMMENT_RE.sub(" ", sql_text)
+    s = _STRING_RE.sub("?", s)
+    s = _PARAM_RE.sub("?", s)
+    s = _NUMBER_RE.sub("?", s)
+    s = _LIST_RE.sub("(...)", s)
+    return _SPACE_RE.sub(" ", s).strip()[:500]
+
+
+def _route():
+    if has_request_context():
+        return request.url_rule.rule if request.url_rule else request.path
+    return "background"
+
+
+def get_connection():
+    """Plain (uninstrumented) connection used for EXPLAIN."""
+    from db import connect   # db builds on this module's InstrumentedConnection
+    return connect()
+
+
+def _parameterized(sql_text):
+    """psycopg2 placeholders rewritten to $1..$n (same name -> same number), and n.
+
+    Like psycopg2 itself this ignores SQL quoting: %% is a literal percent everywhere.
+    """
+    numbers = {}
+
+    def number(m):
+        token, name = m.group(0), m.group(1)
+        if token == "%%":
+            return "%"
+        key = name if name else len(numbers)
+        if key not in numbers:
+            numbers[key] = len(numbers) + 1
+        return f"${numbers[key]}"
+
+    return _PLACEHOLDER_RE.sub(number, sql_text), len(numbers)
+
+
+def _explain(entry, sql_text, has_params):
+    """Generic plan of the statement text; bound values never reach the server or the log."""
+    conn = None
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        if has_params:
+            sql_text, n = _parameterized(sql_text)
+            cur.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+            cur.execute(f"PREPARE {EXPLAIN_STATEMENT} AS {sql_text}")
+            args = f"({', '.join(['NULL'] * n)})" if n else ""
+            cur.execute(f"EXPLAIN EXECUTE {EXPLAIN_STATEMENT}{args}")
+        else:
+            cur.execute("EXPLAIN " + sql_text)
+        entry["plan"] = "\n".join(row[0] for row in cur.fetchall())
+        cur.close()
+        conn.rollback()   # EXPLAIN without ANALYZE never executes, but stay read-only
+    except Exception as e:
+        entry["plan"] = f"EXPLAIN failed: {e}"
+    finally:
+        if conn is not None:
+            conn.close()
+    print(json.dumps({"slow_query": entry}), flush=True)
+
+
+def _record(cursor, query, params, seconds):
+    try:
+        _flusher.ensure()
+        text = query.as_string(cursor) if hasattr(query, "as_string") else \
+            query.decode() if isinstance(query, bytes) else query
+        fp = fingerprint(text)
+        ms = seconds * 1000
+        rows = cursor.rowcount if cursor.rowcount and cursor.rowcount > 0 else 0
+        route = _route()
+        with _lock:
+            stat = _stats.get(fp)
+            if stat is None:
+                if len(_stats) >= MAX_FINGERPRINTS:
+                    fp = OVERFLOW_FINGERPRINT
+                stat = _stats.setdefault(fp, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                              "rows": 0, "routes": Counter()})
+            stat["calls"] += 1
+            stat["total_ms"] += ms
+            stat["max_ms"] = max(stat["max_ms"], ms)
+            stat["rows"] += rows
+            if route in stat["routes"] or len(stat["routes"]) < MAX_ROUTES_PER_STATEMENT:
+                stat["routes"][route] += 1
+
+        if ms < QUERY_SLOW_MS:
+            return
+        entry = {"fingerprint": fp, "duration_ms": round(ms, 2), "rows": rows, "route": route,
+                 "request_id": current_request_id(), "pid": os.getpid(),
+                 "at": time.strftime("%Y-%m-%dT%H:%M:%S"), "plan": None}
+        with _lock:
+            _slow.append(entry)
+            now = time.time()
+            explain = (text.lstrip().lower().startswith(EXPLAINABLE)
+                       and now - _explained_at.get(fp, 0) >= EXPLAIN_COOLDOWN_SECONDS)
+            if explain:
+                _explained_at[fp] = now
+        if explain:
+            threading.Thread(target=_explain, args=(entry, text, params is not None), daemon=True).start()
+        else:
+            print(json.dumps({"slow_query": entry}), flush=True)
+    except Exception:
+        pass  # instrumentation never breaks a query
+
+
+class _TimedCursorMixin:
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _record(self, query, vars, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _record(self, query, vars_list, time.perf_counter() - start)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            _record(self, sql, None, time.perf_counter() - start)
+
+
+@lru_cache(maxsize=None)
+def _timed(cursor_class):
+    return type(f"Timed{cursor_class.__name__}", (_TimedCursorMixin, cursor_class), {})
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    """psycopg2 connection whose cursors are all timed (pass as connection_factory)."""
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs["cursor_factory"] = _timed(base)
+        return super().cursor(*args, **kwargs)
+
+
+# ── Cross-worker aggregation ──────────────────────────────────────────────────
+
+def flush():
+    with _lock:
+        state = {
+            "stats": {fp: {**s, "routes": dict(s["routes"])} for fp, s in _stats.items()},
+            "slow": list(_slow),
+        }
+    write_state(QUERYLOG_DIR, state)
+
+
+_flusher = flusher("querylog-flusher", flush, FLUSH_SECONDS, "QueryLog")
+
+
+def merged_state():
+    flush()
+    stats, slow = {}, []
+    for _, state in worker_states(QUERYLOG_DIR):
+        for fp, s in state["stats"].items():
+            acc = stats.setdefault(fp, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "routes": Counter()})
+            acc["calls"] += s["calls"]
+            acc["total_ms"] += s["total_ms"]
+            acc["max_ms"] = max(acc["max_ms"], s["max_ms"])
+            acc["rows"] += s["rows"]
+            acc["routes"].update(s["routes"])
+        slow.extend(state["slow"])
+    return stats, slow
+
+
+SORT_KEYS = {
+    "total": lambda s: s["total_ms"],
+    "max": lambda s: s["max_ms"],
+    "mean": lambda s: s["total_ms"] / s["calls"],
+    "calls": lambda s: s["calls"],
+}
+
+
+def get_slow_queries():
+    """Slowest Database Statements (ADMIN only)
+    ---
+    parameters:
+      - {name: top, in: query, type: integer, description: "Number of statements (default 20)"}
+      - {name: sort, in: query, type: string, enum: [total, max, mean, calls], description: "Default total"}
+    responses:
+      200:
+        description: Per-fingerprint aggregates merged across workers, plus recent slow statements with plans
+      400:
+        description: Bad parameter
+    """
+    sort = request.args.get("sort", "total")
+    if sort not in SORT_KEYS:
+        return jsonify({"error": f"sort must be one of: {', '.join(SORT_KEYS)}"}), 400
+    try:
+        top = int(request.args.get("top", 20))
+    except ValueError:
+        return jsonify({"error": "top must be an integer"}), 400
+
+    stats, slow = merged_state()
+    ranked = sorted(stats.items(), key=lambda kv: SORT_KEYS[sort](kv[1]), reverse=True)[:top]
+    return jsonify({
+        "slow_threshold_ms": QUERY_SLOW_MS,
+        "statements": [{
+            "fingerprint": fp,
+            "calls": s["calls"],
+            "total_ms": round(s["total_ms"], 2),
+            "mean_ms": round(s["total_ms"] / s["calls"], 3),
+            "max_ms": round(s["max_ms"], 2),
+            "rows": s["rows"],
+            "routes": dict(s["routes"].most_common()),
+        } for fp, s in ranked],
+        "recent_slow": sorted(slow, key=lambda e: e["at"], reverse=True)[:SLOW_LOG_SIZE],
+    })
@@ -1,19 +1,239 @@
-from flask import jsonify
-import psycopg2
+from flask import jsonify, request
 from psycopg2.extras import RealDictCursor
+from db import get_connection
 import os
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 
+ROLLUP_MIGRATION = os.path.join(os.path.dirname(__file__), "..", "migrations", "005_analytics_rollups.sql")
+ROLLUP_MAINTENANCE_MIGRATION = os.path.join(os.path.dirname(__file__), "..", "migrations",
+                                            "009_rollup_updates_deletes.sql")
 
-def get_connection():
-    return psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        database=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        port=os.getenv("DB_PORT"),
-        sslmode="require",
-        connect_timeout=10
+# Display order for the bracket labels produced by lg_income_bracket / lg_loan_bucket
+INCOME_BRACKETS = ["<3k", "3k-6k", "6k-10k", "10k+"]
+LOAN_BUCKETS = ["<1L", "1-2L", "2-5L", "5L+"]
+
+TREND_DAYS = 30
+
+
+def init_analytics_rollups(get_conn):
+    """Apply migrations 005 (rollup table, insert trigger, backfill) and 009
+    (update / delete triggers, lg_rebuild_rollup) if they have not run yet."""
+    conn = get_conn()
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('applications_daily_rollup') IS NOT NULL")
+    if cur.fetchone()[0]:
+        print("[LoanGuard] analytics rollups ready.")
+    else:
+        with open(ROLLUP_MIGRATION) as f:
+            cur.execute(f.read())
+        print("[LoanGuard] analytics rollups created and backfilled.")
+    cur.execute("SELECT to_regprocedure('lg_rebuild_rollup()') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        with open(ROLLUP_MAINTENANCE_MIGRATION) as f:
+            cur.execute(f.read())
+        print("[LoanGuard] analytics rollups now follow updates and deletes (rebuilt).")
+    cur.close()
+    conn.close()
+
+
+# ── Aggregation engine ───────────────────────────────────────────────────────
+# Every breakdown is (dimension [+ bucket edges]) × metrics × filters, compiled
+# into one parameterized GROUP BY. Specs the rollup can answer are routed there;
+# anything else (custom edges, mean_probability, status filter) scans applications.
+
+DIMENSIONS = {
+    "day":                "DATE(created_at)",
+    "applicant_income":   "applicant_income",
+    "coapplicant_income": "coapplicant_income",
+    "loan_amount":        "loan_amount",
+    "loan_term":          "loan_term",
+    "credit_history":     "credit_history",
+    "property_area":      "property_area",
+    "risk_level":         "risk_level",
+    "status":             "status",
+    "gender":             "gender",
+    "married":            "married",
+    "dependents":         "dependents",
+    "education":          "education",
+    "self_employed":      "self_employed",
+    "prediction":         "prediction",
+}
+NUMERIC_DIMENSIONS = {"applicant_income", "coapplicant_income", "loan_amount", "loan_term", "credit_history"}
+
+METRICS = {  # name -> (expression over applications, expression over the rollup or None)
+    "count":            ("COUNT(*)", "SUM(total)::bigint"),
+    "approved":         ("COUNT(*) FILTER (WHERE prediction = 1)", "SUM(approved)::bigint"),
+    "rejected":         ("COUNT(*) FILTER (WHERE prediction = 0)", "SUM(rejected)::bigint"),
+    "approval_rate":    ("ROUND(COUNT(*) FILTER (WHERE prediction = 1) * 100.0 / NULLIF(COUNT(*), 0), 1)",
+                         "ROUND(SUM(approved) * 100.0 / NULLIF(SUM(total), 0), 1)"),
+    "mean_probability": ("ROUND(AVG(probability)::numeric, 4)", None),
+}
+
+FILTERS = {"property_area", "risk_level", "status", "prediction", "date_from", "date_to"}
+ROLLUP_FILTERS = {"property_area", "risk_level", "date_from", "date_to"}
+
+# (dimension, edges) the rollup already materializes -> (rollup column, its stored labels)
+ROLLUP_DIMENSIONS = {
+    ("day", None):                          ("day", None),
+    ("property_area", None):                ("property_area", None),
+    ("risk_level", None):                   ("risk_level", None),
+    ("applicant_income", (3000, 6000, 10000)): ("income_bracket", INCOME_BRACKETS),
+    ("loan_amount", (100, 200, 500)):          ("loan_bucket", LOAN_BUCKETS),  # loan_amount * 1000 in ₹
+}
+
+
+def _default_labels(edges):
+    fmt = lambda v: f"{v:g}"
+    return ([f"<{fmt(edges[0])}"]
+            + [f"{fmt(a)}-{fmt(b)}" for a, b in zip(edges, edges[1:])]
+            + [f"{fmt(edges[-1])}+"])
+
+
+@lru_cache(maxsize=128)
+def _compile(dimension, edges, metrics, filter_keys, use_rollup):
+    """Build the SQL for one spec. Filter values are bound later, so the text is cacheable."""
+    if use_rollup:
+        column, stored_labels = ROLLUP_DIMENSIONS[(dimension, edges)]
+        key_expr = column
+        order_expr = f"array_position(%(stored_labels)s::text[], {column})" if stored_labels else "1"
+        table = "applications_daily_rollup"
+        date_col, date_to_op = "day", "<="
+    else:
+        key_expr = DIMENSIONS[dimension]
+        if edges is not None:
+            key_expr = f"width_bucket({key_expr}::numeric, %(edges)s::numeric[])"
+        order_expr = "1"
+        table = "applications"
+        date_col, date_to_op = "created_at", "<"
+
+    clauses = []
+    for key in filter_keys:
+        if key == "date_from":
+            clauses.append(f"{date_col} >= %(date_from)s")
+        elif key == "date_to":
+            clauses.append(f"{date_col} {date_to_op} %(date_to)s")
+        else:
+            clauses.append(f"{DIMENSIONS[key]} = %({key})s")
+
+    select = ", ".join(f"{METRICS[m][1 if use_rollup else 0]} AS {m}" for m in metrics)
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    return (f"SELECT {key_expr} AS key, {select} FROM {table} {where} "
+            f"GROUP BY 1 ORDER BY {order_expr}")
+
+
+def run_aggregation(dimension, metrics, edges=None, labels=None, filters=None):
+    """
+    Run one breakdown. Returns (rows, source) where rows are dicts with `key`
+    plus one entry per metric. Raises ValueError on anything outside the whitelists.
+    """
+    filters = {k: v for k, v in (filters or {}).items() if v not in (None, "")}
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"group_by must be one of: {', '.join(DIMENSIONS)}")
+    metrics = tuple(metrics)
+    if not metrics or any(m not in METRICS for m in metrics):
+        raise ValueError(f"metrics must be drawn from: {', '.join(METRICS)}")
+    unknown = set(filters) - FILTERS
+    if unknown:
+        raise ValueError(f"Unknown filters: {sorted(unknown)}")
+    if edges is not None:
+        edges = tuple(edges)
+        if dimension not in NUMERIC_DIMENSIONS:
+            raise ValueError("edges are only valid for numeric dimensions")
+        if not edges or any(b <= a for a, b in zip(edges, edges[1:])):
+            raise ValueError("edges must be a strictly increasing list")
+        labels = list(labels) if labels else _default_labels(edges)
+        if len(labels) != len(edges) + 1:
+            raise ValueError(f"labels must have {len(edges) + 1} entries for {len(edges)} edges")
+
+    use_rollup = (
+        (dimension, edges) in ROLLUP_DIMENSIONS
+        and all(METRICS[m][1] for m in metrics)
+        and set(filters) <= ROLLUP_FILTERS
     )
+    sql = _compile(dimension, edges, metrics, tuple(sorted(filters)), use_rollup)
+
+    params = dict(filters)
+    if edges is not None:
+        params["edges"] = list(edges)
+    stored_labels = ROLLUP_DIMENSIONS.get((dimension, edges), (None, None))[1] if use_rollup else None
+    if stored_labels:
+        params["stored_labels"] = stored_labels
+    if "date_to" in params and not use_rollup:
+        params["date_to"] = params["date_to"] + timedelta(days=1)  # inclusive day on a timestamp
+
+    conn = get_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor.execute(sql, params)
+    rows = [dict(r) for r in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+
+    # Bucket keys come back as an index (width_bucket) or a stored rollup label
+    if edges is not None:
+        for r in rows:
+            idx = stored_labels.index(r["key"]) if stored_labels and r["key"] in stored_labels else r["key"]
+            r["key"] = labels[idx] if isinstance(idx, int) and 0 <= idx < len(labels) else r["key"]
+    return rows, ("rollup" if use_rollup else "applications")
+
+
+def _parse_aggregate_args(args):
+    def csv_list(name, cast=str):
+        raw = args.get(name, "")
+        try:
+            return [cast(v.strip()) for v in raw.split(",") if v.strip()] or None
+        except ValueError:
+            raise ValueError(f"{name} must be a comma-separated list of numbers")
+
+    filters = {k: args.get(k) for k in FILTERS if args.get(k)}
+    for key in ("date_from", "date_to"):
+        if key in filters:
+            try:
+                filters[key] = datetime.strptime(filters[key], "%Y-%m-%d").date()
+            except ValueError:
+                raise ValueError(f"{key} must be a date in YYYY-MM-DD format")
+    return {
+        "dimension": args.get("group_by", ""),
+        "metrics": csv_list("metrics") or ["count", "approval_rate"],
+        "edges": csv_list("edges", float),
+        "labels": csv_list("labels"),
+        "filters": filters,
+    }
+
+
+def get_aggregate():
+    """Generic aggregation over applications
+    ---
+    parameters:
+      - {name: group_by, in: query, type: string, required: true, description: "Dimension, e.g. applicant_income, property_area, day"}
+      - {name: edges, in: query, type: string, description: "Comma-separated bucket edges for numeric dimensions (width_bucket)"}
+      - {name: labels, in: query, type: string, description: "Comma-separated bucket labels (edges + 1 entries)"}
+      - {name: metrics, in: query, type: string, description: "count, approved, rejected, approval_rate, mean_probability"}
+      - {name: property_area, in: query, type: string}
+      - {name: risk_level, in: query, type: string}
+      - {name: status, in: query, type: string}
+      - {name: prediction, in: query, type: integer}
+      - {name: date_from, in: query, type: string, description: "YYYY-MM-DD"}
+      - {name: date_to, in: query, type: string, description: "YYYY-MM-DD (inclusive)"}
+    responses:
+      200:
+        description: "{group_by, source, rows: [{key, <metric>...}]}"
+      400:
+        description: Dimension, metric or filter outside the whitelist
+    """
+    try:
+        spec = _parse_aggregate_args(request.args)
+        rows, source = run_aggregation(**spec)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"group_by": spec["dimension"], "source": source, "rows": rows})
+
+
+def _preset(key_name, dimension, metrics, rename=None, **spec):
+    rows, _ = run_aggregation(dimension, metrics, **spec)
+    rename = dict(rename or {}, key=key_name)
+    return jsonify([{rename.get(k, k): v for k, v in r.items()} for r in rows])
 
 
 def get_trends():
@@ -23,22 +243,8 @@ def get_trends():
       200:
         description: Daily approval/rejection counts for the last 30 days
     """
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("""
-        SELECT
-            DATE(created_at) as date,
-            COUNT(*) FILTER (WHERE prediction = 1) as approved,
-            COUNT(*) FILTER (WHERE prediction = 0) as rejected
-        FROM applications
-        WHERE created_at >= NOW() - INTERVAL '30 days'
-        GROUP BY DATE(created_at)
-        ORDER BY date ASC
-    """)
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return jsonify([dict(r) for r in rows])
+    return _preset("date", "day", ("approved", "rejected"),
+                   filters={"date_from": date.today() - timedelta(days=TREND_DAYS)})
 
 
 def get_income_bracket():
@@ -48,27 +254,8 @@ def get_income_bracket():
       200:
         description: Approval rates bucketed by income
     """
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("""
-        SELECT
-            CASE
-                WHEN applicant_income < 3000 THEN '<3k'
-                WHEN applicant_income < 6000 THEN '3k-6k'
-                WHEN applicant_income < 10000 THEN '6k-10k'
-                ELSE '10k+'
-            END as bracket,
-            COUNT(*) FILTER (WHERE prediction = 1) as approved,
-            COUNT(*) FILTER (WHERE prediction = 0) as rejected,
-            COUNT(*) as total
-        FROM applications
-        GROUP BY bracket
-        ORDER BY MIN(applicant_income)
-    """)
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return jsonify([dict(r) for r in rows])
+    return _preset("bracket", "applicant_income", ("approved", "rejected", "count"), {"count": "total"},
+                   edges=(3000, 6000, 10000), labels=INCOME_BRACKETS)
 
 
 def get_risk_distribution():
@@ -78,17 +265,7 @@ def get_risk_distribution():
       200:
         description: Count of applications per risk level
     """
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("""
-        SELECT risk_level, COUNT(*) as count
-        FROM applications
-        GROUP BY risk_level
-    """)
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return jsonify([dict(r) for r in rows])
+    return _preset("risk_level", "risk_level", ("count",))
 
 
 def get_loan_amount_distribution():
@@ -98,27 +275,8 @@ def get_loan_amount_distribution():
       200:
         description: Count of applications per loan amount bucket
     """
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("""
-        SELECT
-            CASE
-                WHEN loan_amount * 1000 < 100000  THEN '<1L'
-                WHEN loan_amount * 1000 < 200000  THEN '1-2L'
-                WHEN loan_amount * 1000 < 500000  THEN '2-5L'
-                ELSE '5L+'
-            END as bucket,
-            COUNT(*) FILTER (WHERE prediction = 1) as approved,
-            COUNT(*) FILTER (WHERE prediction = 0) as rejected,
-            COUNT(*) as total
-        FROM applications
-        GROUP BY bucket
-        ORDER BY MIN(loan_amount)
-    """)
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return jsonify([dict(r) for r in rows])
+    return _preset("bucket", "loan_amount", ("approved", "rejected", "count"), {"count": "total"},
+                   edges=(100, 200, 500), labels=LOAN_BUCKETS)
 
 
 def get_property_area_stats():
@@ -128,20 +286,97 @@ def get_property_area_stats():
       200:
         description: Approval/rejection count grouped by property area
     """
+    return _preset("area", "property_area", ("approved", "rejected", "count", "approval_rate"),
+                   {"count": "total"})
+
+
+def get_dashboard():
+    """Get every Analytics tile in one round trip
+    ---
+    parameters:
+      - {name: date_from, in: query, type: string, description: "YYYY-MM-DD — applies to every tile"}
+      - {name: date_to, in: query, type: string, description: "YYYY-MM-DD (inclusive)"}
+    responses:
+      200:
+        description: "stats, trends, income_bracket, risk, loan_distribution and property_area"
+      400:
+        description: Bad date parameter
+    """
+    try:
+        date_from = request.args.get("date_from")
+        date_to = request.args.get("date_to")
+        date_from = datetime.strptime(date_from, "%Y-%m-%d").date() if date_from else None
+        date_to = datetime.strptime(date_to, "%Y-%m-%d").date() if date_to else None
+    except ValueError:
+        return jsonify({"error": "date_from / date_to must be dates in YYYY-MM-DD format"}), 400
+
+    clauses, params = [], []
+    if date_from:
+        clauses.append("day >= %s"); params.append(date_from)
+    if date_to:
+        clauses.append("day <= %s"); params.append(date_to)
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+
+    # One pass over the rollup: each grouping set is one dashboard tile
     conn = get_connection()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT
-            property_area as area,
-            COUNT(*) FILTER (WHERE prediction = 1) as approved,
-            COUNT(*) FILTER (WHERE prediction = 0) as rejected,
-            COUNT(*) as total,
-            ROUND(COUNT(*) FILTER (WHERE prediction = 1) * 100.0 / NULLIF(COUNT(*), 0), 1) as approval_rate
-        FROM applications
-        GROUP BY property_area
-        ORDER BY property_area
-    """)
+            CASE
+                WHEN GROUPING(day) = 0            THEN 'trends'
+                WHEN GROUPING(income_bracket) = 0 THEN 'income_bracket'
+                WHEN GROUPING(loan_bucket) = 0    THEN 'loan_distribution'
+                WHEN GROUPING(property_area) = 0  THEN 'property_area'
+                WHEN GROUPING(risk_level) = 0     THEN 'risk'
+                ELSE 'stats'
+            END as tile,
+            day, income_bracket, loan_bucket, property_area, risk_level,
+            SUM(approved)::bigint as approved,
+            SUM(rejected)::bigint as rejected,
+            SUM(total)::bigint as total
+        FROM applications_daily_rollup
+        {where}
+        GROUP BY GROUPING SETS ((day), (income_bracket), (loan_bucket), (property_area), (risk_level), ())
+    """, params)
     rows = cursor.fetchall()
     cursor.close()
     conn.close()
-    return jsonify([dict(r) for r in rows])
+
+    tiles = {"trends": [], "income_bracket": [], "loan_distribution": [], "property_area": [], "risk": []}
+    stats = {"total_applications": 0, "approved": 0, "rejected": 0}
+    # Without an explicit window the trend line keeps its usual 30-day span
+    trend_start = date_from or (date.today() - timedelta(days=TREND_DAYS))
+    for r in rows:
+        tile = r["tile"]
+        if tile == "stats":
+            stats = {"total_applications": r["total"] or 0, "approved": r["approved"] or 0,
+                     "rejected": r["rejected"] or 0}
+        elif tile == "trends":
+            if r["day"] >= trend_start:
+                tiles["trends"].append({"date": r["day"], "approved": r["approved"], "rejected": r["rejected"]})
+        elif tile == "income_bracket":
+            tiles["income_bracket"].append({"bracket": r["income_bracket"], "approved": r["approved"],
+                                            "rejected": r["rejected"], "total": r["total"]})
+        elif tile == "loan_distribution":
+            tiles["loan_distribution"].append({"bucket": r["loan_bucket"], "approved": r["approved"],
+                                               "rejected": r["rejected"], "total": r["total"]})
+        elif tile == "property_area":
+            tiles["property_area"].append({
+                "area": r["property_area"], "approved": r["approved"], "rejected": r["rejected"],
+                "total": r["total"],
+                "approval_rate": round(r["approved"] * 100.0 / r["total"], 1) if r["total"] else None,
+            })
+        else:
+            tiles["risk"].append({"risk_level": r["risk_level"], "count": r["total"]})
+
+    tiles["trends"].sort(key=lambda t: t["date"])
+    tiles["income_bracket"].sort(key=lambda t: INCOME_BRACKETS.index(t["bracket"]) if t["bracket"] in INCOME_BRACKETS else len(INCOME_BRACKETS))
+    tiles["loan_distribution"].sort(key=lambda t: LOAN_BUCKETS.index(t["bucket"]) if t["bucket"] in LOAN_BUCKETS else len(LOAN_BUCKETS))
+    tiles["property_area"].sort(key=lambda t: t["area"])
+
+    return jsonify({
+        "window": {"date_from": date_from.isoformat() if date_from else None,
+                   "date_to": date_to.isoformat() if date_to else None},
+        "stats": stats,
+        **tiles,
+    })
@@ -0,0 +1,176 @@
+import json
+from datetime import datetime, timedelta
+from flask import request, jsonify, Response, stream_with_context, current_app
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor
+from db import get_connection
+
+
+# Every column a client may project or filter on (guards the dynamic SQL below)
+APPLICATION_COLUMNS = [
+    "id", "applicant_name", "gender", "married", "dependents", "education",
+    "self_employed", "applicant_income", "coapplicant_income", "loan_amount",
+    "loan_term", "credit_history", "property_area", "prediction", "probability",
+    "risk_level", "status", "created_at",
+]
+
+VALID_STATUSES = {"Pending", "Under Review", "Approved", "Rejected"}
+VALID_RISK_LEVELS = {"Low Risk", "Medium Risk", "High Risk"}
+VALID_AREAS = {"Urban", "Semiurban", "Rural"}
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_ROWS = 200
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+
+
+def build_application_filters(args):
+    """
+    Translate query-string filters into a SQL WHERE clause + params.
+    Supported: status, risk_level, property_area, date_from, date_to (inclusive).
+    Raises ValueError with a client-facing message on bad input.
+    """
+    clauses, params = [], []
+
+    status = args.get("status")
+    if status:
+        if status not in VALID_STATUSES:
+            raise ValueError(f"status must be one of: {', '.join(sorted(VALID_STATUSES))}")
+        clauses.append("status = %s"); params.append(status)
+
+    risk_level = args.get("risk_level")
+    if risk_level:
+        if risk_level not in VALID_RISK_LEVELS:
+            raise ValueError(f"risk_level must be one of: {', '.join(sorted(VALID_RISK_LEVELS))}")
+        clauses.append("risk_level = %s"); params.append(risk_level)
+
+    area = args.get("property_area")
+    if area:
+        if area not in VALID_AREAS:
+            raise ValueError(f"property_area must be one of: {', '.join(sorted(VALID_AREAS))}")
+        clauses.append("property_area = %s"); params.append(area)
+
+    date_from = args.get("date_from")
+    if date_from:
+        clauses.append("created_at >= %s"); params.append(_parse_date(date_from, "date_from"))
+
+    date_to = args.get("date_to")
+    if date_to:
+        # Inclusive upper bound: everything before the start of the next day
+        clauses.append("created_at < %s"); params.append(_parse_date(date_to, "date_to") + timedelta(days=1))
+
+    return clauses, params
+
+
+def _parse_fields(raw):
+    if not raw:
+        return list(APPLICATION_COLUMNS)
+    fields = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in APPLICATION_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {unknown}")
+    # id is the pagination cursor, so it is always returned
+    if "id" not in fields:
+        fields.insert(0, "id")
+    return fields
+
+
+def _estimate_count(cursor, where_sql, params):
+    """
+    Cheap row-count estimate — planner statistics instead of COUNT(*).
+    Unfiltered: pg_class.reltuples. Filtered: the planner's row estimate.
+    """
+    if not where_sql:
+        cursor.execute("SELECT reltuples::bigint AS estimate FROM pg_class WHERE relname = 'applications'")
+        row = cursor.fetchone()
+        return max(int(row["estimate"]), 0) if row else None
+    cursor.execute(
+        sql.SQL("EXPLAIN (FORMAT JSON) SELECT 1 FROM applications WHERE {}").format(sql.SQL(where_sql)),
+        params
+    )
+    plan = cursor.fetchone()["QUERY PLAN"]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def get_applications():
+    """Get Applications (keyset-paginated)
+    ---
+    parameters:
+      - {name: after_id, in: query, type: integer, description: "Return rows with id below this cursor"}
+      - {name: limit, in: query, type: integer, description: "Page size (default 100, max 1000)"}
+      - {name: fields, in: query, type: string, description: "Comma-separated column projection"}
+      - {name: status, in: query, type: string}
+      - {name: risk_level, in: query, type: string}
+      - {name: property_area, in: query, type: string}
+      - {name: date_from, in: query, type: string, description: "YYYY-MM-DD"}
+      - {name: date_to, in: query, type: string, description: "YYYY-MM-DD (inclusive)"}
+    responses:
+      200:
+        description: "Page of applications: {items, next_after_id, total_estimate}"
+      400:
+        description: Invalid filter or pagination parameter
+    """
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+        after_id = request.args.get("after_id")
+        after_id = int(after_id) if after_id else None
+        if limit < 1:
+            raise ValueError("limit must be a positive integer")
+        limit = min(limit, MAX_PAGE_SIZE)
+        fields = _parse_fields(request.args.get("fields"))
+        clauses, params = build_application_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # The estimate ignores the cursor — it describes the whole filtered result
+    filter_sql, filter_params = " AND ".join(clauses), list(params)
+    if after_id is not None:
+        clauses.append("id < %s"); params.append(after_id)
+    where_sql = " AND ".join(clauses)
+
+    query = sql.SQL("SELECT {fields} FROM applications {where} ORDER BY id DESC LIMIT %s").format(
+        fields=sql.SQL(", ").join(sql.Identifier(f) for f in fields),
+        where=sql.SQL("WHERE " + where_sql) if where_sql else sql.SQL(""),
+    )
+
+    conn = get_connection()
+    try:
+        meta_cur = conn.cursor(cursor_factory=RealDictCursor)
+        total_estimate = _estimate_count(meta_cur, filter_sql, filter_params)
+        meta_cur.close()
+        # Server-side cursor: rows are pulled from PostgreSQL in chunks as they are written out
+        cursor = conn.cursor(name="applications_page", cursor_factory=RealDictCursor)
+        cursor.itersize = STREAM_CHUNK_ROWS
+        cursor.execute(query, params + [limit])
+    except Exception:
+        conn.close()
+        raise
+
+    dumps = current_app.json.dumps
+
+    def generate():
+        last_id = None
+        count = 0
+        try:
+            yield '{"items": ['
+            for row in cursor:
+                yield ("," if count else "") + dumps(dict(row))
+                last_id = row["id"]
+                count += 1
+            next_after_id = last_id if count == limit else None
+            yield '], "next_after_id": %s, "total_estimate": %s}' % (
+                dumps(next_after_id), dumps(total_estimate)
+            )
+        finally:
+            cursor.close()
+            conn.close()
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
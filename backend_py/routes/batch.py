@@ -4,6 +4,9 @@ from flask import request, jsonify, send_file, current_app
 import joblib
 import os
 import csv
+import time
+from sketches import record_batch
+from metrics import stage, inc, observe
 
 
 def get_models():
@@ -43,7 +46,8 @@ def batch_predict():
     model, scaler, label_encoders, explainer, classify_risk = get_models()
 
     try:
-        df_in = pd.read_csv(file)
+        with stage("parse"):
+            df_in = pd.read_csv(file)
     except Exception as e:
         return jsonify({"error": f"Could not parse CSV: {e}"}), 400
 
@@ -56,41 +60,59 @@ def batch_predict():
         return jsonify({"error": f"Missing columns: {missing}"}), 400
 
     results = []
-    for idx, row in df_in.iterrows():
-        try:
-            row_data = row[required].to_dict()
-            df_row = pd.DataFrame([row_data])
-            for col in df_row.columns:
-                if col in label_encoders:
-                    df_row[col] = label_encoders[col].transform(df_row[col].astype(str))
-            df_scaled = scaler.transform(df_row)
-            prob = float(model.predict_proba(df_scaled)[0][1])
-            pred = int(model.predict(df_scaled)[0])
-            risk = classify_risk(prob)
-
-            # Top SHAP factor
-            top_factor = ""
-            if explainer:
-                shap_vals = explainer.shap_values(df_scaled)
-                vals = shap_vals[1][0] if isinstance(shap_vals, list) else shap_vals[0]
-                feat_imp = dict(zip(df_row.columns, vals))
-                top_factor = max(feat_imp, key=lambda k: abs(feat_imp[k]))
-
-            results.append({
-                **row_data,
-                "Prediction": "Approved" if pred == 1 else "Rejected",
-                "Probability": round(prob, 4),
-                "Risk_Level": risk,
-                "Top_Factor": top_factor
-            })
-        except Exception as e:
-            results.append({**row.to_dict(), "Prediction": "ERROR", "Probability": 0, "Risk_Level": "N/A", "Top_Factor": str(e)})
+    started = time.perf_counter()
+    with stage("scoring"):
+        for idx, row in df_in.iterrows():
+            try:
+                row_data = row[required].to_dict()
+                df_row = pd.DataFrame([row_data])
+                for col in df_row.columns:
+                    if col in label_encoders:
+                        df_row[col] = label_encoders[col].transform(df_row[col].astype(str))
+                df_scaled = scaler.transform(df_row)
+                prob = float(model.predict_proba(df_scaled)[0][1])
+                pred = int(model.predict(df_scaled)[0])
+                risk = classify_risk(prob)
+
+                # Top SHAP factor
+                top_factor = ""
+                if explainer:
+                    shap_vals = explainer.shap_values(df_scaled)
+                    vals = shap_vals[1][0] if isinstance(shap_vals, list) else shap_vals[0]
+                    feat_imp = dict(zip(df_row.columns, vals))
+                    top_factor = max(feat_imp, key=lambda k: abs(feat_imp[k]))
+
+                results.append({
+                    **row_data,
+                    "Prediction": "Approved" if pred == 1 else "Rejected",
+                    "Probability": round(prob, 4),
+                    "Risk_Level": risk,
+                    "Top_Factor": top_factor
+                })
+            except Exception as e:
+                results.append({**row.to_dict(), "Prediction": "ERROR", "Probability": 0, "Risk_Level": "N/A", "Top_Factor": str(e)})
+
+    elapsed = time.perf_counter() - started
+    inc("loanguard_batch_rows_total", len(results))
+    if elapsed > 0 and results:
+        observe("loanguard_batch_rows_per_second", len(results) / elapsed)
+
+    scored = pd.DataFrame([r for r in results if r["Prediction"] != "ERROR"])
+    if not scored.empty:
+        # Batch CSVs carry LoanAmount in ₹ thousands (model units); sketches track real ₹
+        with stage("sketches"):
+            record_batch("batch",
+                         pd.to_numeric(scored["ApplicantIncome"], errors="coerce"),
+                         pd.to_numeric(scored["CoapplicantIncome"], errors="coerce"),
+                         pd.to_numeric(scored["LoanAmount"], errors="coerce") * 1000,
+                         scored["Probability"], (scored["Prediction"] == "Approved").astype(int))
 
     out = io.StringIO()
     if results:
-        writer = csv.DictWriter(out, fieldnames=results[0].keys())
-        writer.writeheader()
-        writer.writerows(results)
+        with stage("serialize"):
+            writer = csv.DictWriter(out, fieldnames=results[0].keys())
+            writer.writeheader()
+            writer.writerows(results)
 
     out.seek(0)
     return send_file(
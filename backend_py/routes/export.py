@@ -0,0 +1,210 @@
+import io
+import os
+import zlib
+import threading
+from datetime import datetime
+from flask import request, jsonify, Response
+from psycopg2 import sql
+from db import get_connection
+from tracing import current_request_id
+
+from routes.applications import APPLICATION_COLUMNS, build_application_filters
+
+
+READ_CHUNK_BYTES = 64 * 1024
+PARQUET_BLOCK_BYTES = 4 * 1024 * 1024
+
+# Exportable tables: column order + the Arrow type of every column (pyarrow
+# aliases). Parquet needs the whole schema up front: types inferred per CSV
+# block break the writer as soon as a column is all NULL in the first block
+# (probability / prediction of rows imported unscored) and filled later.
+EXPORT_TABLES = {
+    "applications": {
+        "columns": APPLICATION_COLUMNS,
+        "types": {
+            "id": "int64", "applicant_name": "string", "gender": "string", "married": "string",
+            "dependents": "string", "education": "string", "self_employed": "string",
+            "applicant_income": "float64", "coapplicant_income": "float64", "loan_amount": "float64",
+            "loan_term": "float64", "credit_history": "float64", "property_area": "string",
+            "prediction": "int64", "probability": "float64", "risk_level": "string",
+            "status": "string", "created_at": "timestamp[us]",
+        },
+    },
+    "audit_log": {
+        "columns": ["id", "event_type", "username", "details", "created_at"],
+        "types": {"id": "int64", "event_type": "string", "username": "string", "details": "string",
+                  "created_at": "timestamp[us]"},
+    },
+}
+
+
+def _build_copy_sql(conn, table, args):
+    """Render a COPY (SELECT ...) TO STDOUT statement with filters bound in."""
+    spec = EXPORT_TABLES[table]
+    if table == "applications":
+        clauses, params = build_application_filters(args)
+    else:
+        # audit_log has no status/risk columns — only the date window applies
+        clauses, params = build_application_filters({
+            k: args.get(k) for k in ("date_from", "date_to")
+        })
+    select = sql.SQL("SELECT {fields} FROM {table} {where} ORDER BY id").format(
+        fields=sql.SQL(", ").join(sql.Identifier(c) for c in spec["columns"]),
+        table=sql.Identifier(table),
+        where=sql.SQL("WHERE " + " AND ".join(clauses)) if clauses else sql.SQL(""),
+    )
+    cur = conn.cursor()
+    # COPY does not accept bind parameters, so they are escaped client-side
+    bound = cur.mogrify(select, params).decode()
+    cur.close()
+    return f"COPY ({bound}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+
+
+def _copy_into_pipe(conn, copy_sql, write_fd, state, request_id):
+    """
+    Background writer: PostgreSQL streams COPY output straight into the pipe.
+    A failure is stored in state["error"] before the pipe is closed, so the
+    reader sees it as soon as it reaches end of stream.
+    """
+    sink = os.fdopen(write_fd, "wb")
+    try:
+        cur = conn.cursor()
+        cur.copy_expert(copy_sql, sink, size=READ_CHUNK_BYTES)
+        cur.close()
+    except (BrokenPipeError, OSError):
+        pass  # client went away — the reader closed its end of the pipe
+    except Exception as e:
+        state["error"] = e
+        print(f"[Export] COPY failed (request {request_id}): {e}")
+    finally:
+        try:
+            sink.close()
+        except OSError:
+            pass
+        conn.close()
+
+
+def _raise_if_failed(state):
+    """Abort the response instead of ending a truncated export cleanly."""
+    if state["error"] is not None:
+        raise RuntimeError(f"export aborted, COPY failed: {state['error']}")
+
+
+def _csv_chunks(source, use_gzip, check):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if use_gzip else None
+    while True:
+        chunk = source.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        if compressor:
+            chunk = compressor.compress(chunk)
+            if not chunk:
+                continue
+        yield chunk
+    check()
+    if compressor:
+        yield compressor.flush()
+
+
+def _parquet_chunks(source, types, check):
+    """Convert the CSV stream into Parquet one row group per CSV block."""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+
+    reader = pacsv.open_csv(
+        source,
+        read_options=pacsv.ReadOptions(block_size=PARQUET_BLOCK_BYTES),
+        convert_options=pacsv.ConvertOptions(
+            column_types={c: pa.type_for_alias(t) for c, t in types.items()}),
+    )
+    buf = io.BytesIO()
+    writer = pq.ParquetWriter(buf, reader.schema, compression="snappy")
+
+    def drain():
+        data = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return data
+
+    for batch in reader:
+        writer.write_table(pa.Table.from_batches([batch]))
+        data = drain()
+        if data:
+            yield data
+    check()   # before the footer, so a failed COPY never yields a readable file
+    writer.close()
+    yield drain()
+
+
+def export_table(table):
+    """Stream a Table Export (ADMIN only)
+    ---
+    parameters:
+      - name: table
+        in: path
+        type: string
+        enum: [applications, audit_log]
+        required: true
+      - {name: format, in: query, type: string, enum: [csv, parquet], description: "Default csv"}
+      - {name: gzip, in: query, type: boolean, description: "gzip the CSV stream"}
+      - {name: status, in: query, type: string, description: "applications only"}
+      - {name: date_from, in: query, type: string, description: "YYYY-MM-DD"}
+      - {name: date_to, in: query, type: string, description: "YYYY-MM-DD (inclusive)"}
+    responses:
+      200:
+        description: Chunked CSV / CSV.gz / Parquet download
+      400:
+        description: Unknown table, format or filter
+    """
+    if table not in EXPORT_TABLES:
+        return jsonify({"error": f"table must be one of: {', '.join(EXPORT_TABLES)}"}), 400
+
+    fmt = request.args.get("format", "csv").lower()
+    use_gzip = request.args.get("gzip", "").lower() in ("1", "true", "yes")
+    if fmt not in ("csv", "parquet"):
+        return jsonify({"error": "format must be csv or parquet"}), 400
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return jsonify({"error": "Parquet export requires pyarrow to be installed"}), 400
+
+    conn = get_connection()
+    try:
+        copy_sql = _build_copy_sql(conn, table, request.args)
+    except ValueError as e:
+        conn.close()
+        return jsonify({"error": str(e)}), 400
+
+    # COPY runs on its own thread and writes into an OS pipe; the response
+    # generator reads from the other end, so memory is bounded by the pipe buffer
+    read_fd, write_fd = os.pipe()
+    source = os.fdopen(read_fd, "rb")
+    state = {"error": None}
+    threading.Thread(target=_copy_into_pipe, args=(conn, copy_sql, write_fd, state, current_request_id()),
+                     daemon=True).start()
+
+    def generate():
+        check = lambda: _raise_if_failed(state)
+        if fmt == "parquet":
+            yield from _parquet_chunks(source, EXPORT_TABLES[table]["types"], check)
+        else:
+            yield from _csv_chunks(source, use_gzip, check)
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M")
+    if fmt == "parquet":
+        filename, mimetype = f"{table}_{stamp}.parquet", "application/vnd.apache.parquet"
+    elif use_gzip:
+        filename, mimetype = f"{table}_{stamp}.csv.gz", "application/gzip"
+    else:
+        filename, mimetype = f"{table}_{stamp}.csv", "text/csv"
+
+    response = Response(generate(), mimetype=mimetype, headers={
+        "Content-Disposition": f"attachment; filename={filename}",
+        "X-Accel-Buffering": "no",  # keep nginx from buffering the whole export
+    })
+    # Closed even if the client leaves before the body starts (the generator may
+    # never run); the writer then gets EPIPE and releases its connection
+    response.call_on_close(source.close)
+    return response
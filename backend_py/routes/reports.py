@@ -1,8 +1,7 @@
 import io
 from flask import send_file, jsonify
-import psycopg2
 from psycopg2.extras import RealDictCursor
-import os
+from db import get_connection
 from datetime import datetime
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
@@ -10,6 +9,7 @@ from reportlab.lib.units import cm
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, HRFlowable
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
+from metrics import stage
 
 
 ROYAL_BLUE = colors.HexColor("#1E40AF")
@@ -22,14 +22,6 @@ RED        = colors.HexColor("#DC2626")
 AMBER      = colors.HexColor("#D97706")
 
 
-def get_connection():
-    return psycopg2.connect(
-        host=os.getenv("DB_HOST"), database=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"), password=os.getenv("DB_PASSWORD"),
-        port=os.getenv("DB_PORT"), sslmode="require", connect_timeout=10
-    )
-
-
 def generate_report(app_id):
     """Generate PDF Report for a Single Application
     ---
@@ -45,12 +37,13 @@ def generate_report(app_id):
         description: Application not found
     """
     try:
-        conn = get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT * FROM applications WHERE id = %s", (app_id,))
-        app = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with stage("db_fetch"):
+            conn = get_connection()
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute("SELECT * FROM applications WHERE id = %s", (app_id,))
+            app = cursor.fetchone()
+            cursor.close()
+            conn.close()
 
         if not app:
             return jsonify({"error": "Application not found"}), 404
@@ -174,7 +167,8 @@ def generate_report(app_id):
             ),
         ]
 
-        doc.build(story)
+        with stage("render_pdf"):
+            doc.build(story)
         buf.seek(0)
         return send_file(buf, mimetype="application/pdf", as_attachment=True,
                          download_name=f"LoanGuard_Report_{app_id:05d}.pdf")
@@ -0,0 +1,219 @@
+"""
+sampling_profiler.py — Opt-in continuous sampling profiler (SAMPLING_PROFILER=1)
+A daemon thread in every worker wakes every SAMPLING_INTERVAL_MS, grabs the
+Python stacks of all request threads (sys._current_frames) and counts them as
+collapsed stacks. Memory is bounded: at most SAMPLING_MAX_STACKS distinct
+stacks per window; anything new after that is counted under "[other]".
+
+Each worker flushes its window to SAMPLES_DIR/<pid>.json; GET /admin/profiler
+merges all live workers into flamegraph-ready collapsed stacks.
+POST /admin/profiler/reset closes the current window on every worker (the
+closed window stays readable as window=previous).
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+from collections import Counter
+from flask import request, jsonify, Response
+from perpid_store import WorkerThread, worker_states, write_state
+
+SAMPLING_ENABLED = os.getenv("SAMPLING_PROFILER", "0") == "1"
+SAMPLING_INTERVAL = float(os.getenv("SAMPLING_INTERVAL_MS", "20")) / 1000
+SAMPLING_MAX_STACKS = int(os.getenv("SAMPLING_MAX_STACKS", "5000"))
+SAMPLING_MAX_DEPTH = 64
+FLUSH_SECONDS = 10
+SAMPLES_DIR = os.getenv("SAMPLES_DIR", os.path.join(tempfile.gettempdir(), "loanguard_samples"))
+RESET_MARKER = "reset_at"
+OVERFLOW_STACK = "[other]"
+
+# Our own housekeeping threads only ever sleep or wait on a socket
+BACKGROUND_THREADS = {"sampling-profiler", "metrics-flusher", "sketch-flusher",
+                      "cache-listener", "drift-scheduler", "querylog-flusher", "online-learner"}
+# Leaf frames of a thread parked waiting for work (not CPU)
+IDLE_LEAVES = {("selectors.py", "select"), ("selectors.py", "poll"), ("socket.py", "accept"),
+               ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+               ("queue.py", "get"), ("sync.py", "wait")}   # sync.py: gunicorn sync worker loop
+
+
+class _Window:
+    def __init__(self, started=None):
+        self.started = started or time.time()
+        self.stacks = Counter()
+        self.samples = 0
+        self.idle = 0
+        self.sampling_seconds = 0.0   # CPU the sampler itself spent in this window
+
+    def to_dict(self):
+        return {"started": self.started, "stacks": dict(self.stacks), "samples": self.samples,
+                "idle": self.idle, "sampling_seconds": self.sampling_seconds}
+
+
+_lock = threading.Lock()
+_current = _Window()
+_previous = None
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None and len(names) < SAMPLING_MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _sample_once(own_ident):
+    names = {t.ident: t.name for t in threading.enumerate()}
+    stacks, idle = [], 0
+    for ident, frame in sys._current_frames().items():
+        if ident == own_ident or names.get(ident) in BACKGROUND_THREADS:
+            continue
+        if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_LEAVES:
+            idle += 1
+            continue
+        stacks.append(_collapse(frame))
+    return stacks, idle
+
+
+def _rotate(started=None):
+    global _current, _previous
+    with _lock:
+        _previous, _current = _current, _Window(started)
+
+
+def _reset_requested():
+    try:
+        return os.path.getmtime(os.path.join(SAMPLES_DIR, RESET_MARKER)) > _current.started
+    except OSError:
+        return False
+
+
+def flush():
+    with _lock:
+        state = {"current": _current.to_dict(), "previous": _previous.to_dict() if _previous else None}
+    write_state(SAMPLES_DIR, state)
+
+
+def _sample_forever():
+    own = threading.get_ident()
+    next_flush = time.monotonic() + FLUSH_SECONDS
+    while True:
+        time.sleep(SAMPLING_INTERVAL)
+        cpu_start = time.thread_time()
+        try:
+            stacks, idle = _sample_once(own)
+            with _lock:
+                window = _current
+                for stack in stacks:
+                    if stack in window.stacks or len(window.stacks) < SAMPLING_MAX_STACKS:
+                        window.stacks[stack] += 1
+                    else:
+                        window.stacks[OVERFLOW_STACK] += 1
+                window.samples += 1
+                window.idle += idle
+                window.sampling_seconds += time.thread_time() - cpu_start
+            if time.monotonic() >= next_flush:
+                next_flush = time.monotonic() + FLUSH_SECONDS
+                if _reset_requested():
+                    _rotate()
+                flush()
+        except Exception as e:
+            print(f"[Sampler] sample failed: {e}")
+
+
+_sampler = WorkerThread("sampling-profiler", _sample_forever)
+
+
+def ensure_sampler():
+    """Start the sampler once per (post-fork) worker when SAMPLING_PROFILER=1."""
+    if SAMPLING_ENABLED:
+        _sampler.ensure()
+
+
+def merged_window(which="current"):
+    """Merge one window across every live worker (stale files are removed)."""
+    flush()
+    stacks, samples, idle, sampling_seconds, started, workers = Counter(), 0, 0, 0.0, None, 0
+    for _, state in worker_states(SAMPLES_DIR):
+        window = state.get(which)
+        if not window:
+            continue
+        workers += 1
+        stacks.update(window["stacks"])
+        samples += window["samples"]
+        idle += window["idle"]
+        sampling_seconds += window["sampling_seconds"]
+        started = window["started"] if started is None else min(started, window["started"])
+    return {"stacks": stacks, "samples": samples, "idle": idle, "started": started,
+            "sampling_seconds": sampling_seconds, "workers": workers}
+
+
+def get_profile_samples():
+    """Aggregated Sampling Profile (ADMIN only)
+    ---
+    parameters:
+      - {name: window, in: query, type: string, enum: [current, previous], description: "Default current"}
+      - {name: format, in: query, type: string, enum: [json, collapsed], description: "collapsed = flamegraph.pl / speedscope input"}
+      - {name: top, in: query, type: integer, description: "json only: number of hottest stacks (default 50)"}
+    responses:
+      200:
+        description: Sample counts per collapsed stack, merged across workers
+      400:
+        description: Profiler disabled or bad parameter
+    """
+    if not SAMPLING_ENABLED:
+        return jsonify({"error": "Sampling profiler is disabled (set SAMPLING_PROFILER=1)"}), 400
+    ensure_sampler()
+    which = request.args.get("window", "current")
+    if which not in ("current", "previous"):
+        return jsonify({"error": "window must be current or previous"}), 400
+    try:
+        top = int(request.args.get("top", 50))
+    except ValueError:
+        return jsonify({"error": "top must be an integer"}), 400
+
+    merged = merged_window(which)
+    if request.args.get("format") == "collapsed":
+        body = "".join(f"{stack} {n}\n" for stack, n in merged["stacks"].most_common())
+        return Response(body, mimetype="text/plain")
+
+    wall = time.time() - merged["started"] if merged["started"] else 0
+    busy = sum(merged["stacks"].values())
+    return jsonify({
+        "window": which,
+        "started_at": merged["started"],
+        "workers": merged["workers"],
+        "interval_ms": SAMPLING_INTERVAL * 1000,
+        "samples": merged["samples"],
+        "busy_thread_samples": busy,
+        "idle_thread_samples": merged["idle"],
+        "distinct_stacks": len(merged["stacks"]),
+        # sampler CPU per worker-second of wall time (target < 1%)
+        "overhead_pct": round(100 * merged["sampling_seconds"] / (wall * merged["workers"]), 3)
+                        if wall and merged["workers"] and which == "current" else None,
+        "top": [{"stack": stack, "samples": n, "pct": round(100 * n / busy, 2)}
+                for stack, n in merged["stacks"].most_common(top)],
+    })
+
+
+def reset_profile_samples():
+    """Start a New Sampling Window on every worker (ADMIN only)
+    ---
+    responses:
+      200:
+        description: The closed window is kept as window=previous
+    """
+    if not SAMPLING_ENABLED:
+        return jsonify({"error": "Sampling profiler is disabled (set SAMPLING_PROFILER=1)"}), 400
+    ensure_sampler()
+    os.makedirs(SAMPLES_DIR, exist_ok=True)
+    marker = os.path.join(SAMPLES_DIR, RESET_MARKER)
+    with open(marker, "w") as f:
+        f.write(str(time.time()))
+    now = os.path.getmtime(marker)
+    _rotate(now)
+    flush()
+    return jsonify({"message": "Sampling window reset; other workers follow within "
+                               f"{FLUSH_SECONDS}s", "started_at": now})
@@ -0,0 +1,27 @@
+"""
+schemas.py — Request schemas shared by the API and the offline tools
+Kept free of app / database imports so benchmarks and scripts can validate
+payloads exactly like the API without starting it.
+"""
+from pydantic import BaseModel, Field, validator
+from typing import Literal
+
+
+class LoanApplication(BaseModel):
+    ApplicantName: str = Field("", description="Full name of the applicant")
+    Gender: Literal["Male", "Female"]
+    Married: Literal["Yes", "No"]
+    Dependents: Literal["0", "1", "2", "3+"]
+    Education: Literal["Graduate", "Not Graduate"]
+    Self_Employed: Literal["Yes", "No"]
+    ApplicantIncome: int = Field(..., gt=0, description="Monthly income in ₹")
+    CoapplicantIncome: int = Field(..., ge=0)
+    LoanAmount: int = Field(..., gt=0, description="Loan amount in real ₹ (divided by 1000 internally before ML model)")
+    Loan_Amount_Term: int = Field(..., gt=0)
+    Credit_History: int = Field(..., ge=0, le=1, description="0 or 1")
+    Property_Area: Literal["Urban", "Semiurban", "Rural"]
+
+    @validator("Credit_History", pre=True)
+    def coerce_credit_history(cls, v):
+        """Accept '0', '1', 0, or 1 — all valid."""
+        return int(v)
@@ -0,0 +1,252 @@
+"""
+sketches.py — Live distribution analytics without touching PostgreSQL
+Every scoring path (predict, check_eligibility, batch) feeds per-feature
+quantile sketches and a per-minute approval ring buffer held in memory.
+Each worker periodically writes its state to LIVE_STATS_DIR/<pid>.json;
+GET /analytics/live merges the files of all live workers.
+
+Sketch: DDSketch-style log-spaced buckets (relative accuracy ALPHA, bounded
+bucket count). Updates are O(1) and sketches merge by adding bucket counts.
+"""
+import os
+import math
+import time
+import tempfile
+import threading
+from collections import Counter
+import numpy as np
+from flask import jsonify
+from perpid_store import flusher, worker_states, write_state
+
+ALPHA = 0.01                 # ±1% relative error on every reported quantile
+MAX_BUCKETS = 2048           # memory bound per sketch (collapses the lowest buckets beyond this)
+WINDOW_MINUTES = 60          # rolling approval-rate history kept per worker
+FLUSH_SECONDS = 5
+LIVE_STATS_DIR = os.getenv("LIVE_STATS_DIR", os.path.join(tempfile.gettempdir(), "loanguard_sketches"))
+
+SKETCH_FEATURES = ["applicant_income", "coapplicant_income", "loan_amount", "probability"]
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+ROLLING_WINDOWS = [5, 15, 60]
+
+
+class QuantileSketch:
+    """Mergeable relative-error quantile sketch; values <= 0 land in a dedicated zero bucket."""
+
+    def __init__(self, alpha=ALPHA, max_buckets=MAX_BUCKETS):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.bins = {}
+        self.zero = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        value = float(value)
+        if value <= 0:
+            self.zero += 1
+        else:
+            k = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[k] = self.bins.get(k, 0) + 1
+            if len(self.bins) > self.max_buckets:
+                self._collapse()
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not values.size:
+            return
+        positive = values[values > 0]
+        self.zero += int(values.size - positive.size)
+        if positive.size:
+            keys, counts = np.unique(np.ceil(np.log(positive) / self._log_gamma).astype(int), return_counts=True)
+            for k, c in zip(keys.tolist(), counts.tolist()):
+                self.bins[k] = self.bins.get(k, 0) + c
+            if len(self.bins) > self.max_buckets:
+                self._collapse()
+        self.count += int(values.size)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def _collapse(self):
+        keys = sorted(self.bins)
+        excess = keys[:len(keys) - self.max_buckets]
+        target = keys[len(excess)]
+        self.bins[target] += sum(self.bins.pop(k) for k in excess)
+
+    def merge(self, other):
+        for k, c in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + c
+        if len(self.bins) > self.max_buckets:
+            self._collapse()
+        self.zero += other.zero
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero:
+            return 0.0
+        seen = self.zero
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if seen > rank:
+                estimate = 2 * self.gamma ** k / (self.gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {"bins": self.bins, "zero": self.zero, "count": self.count,
+                "total": self.total, "min": self.min if self.count else None,
+                "max": self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls()
+        s.bins = {int(k): v for k, v in d["bins"].items()}
+        s.zero, s.count, s.total = d["zero"], d["count"], d["total"]
+        s.min = d["min"] if d["min"] is not None else math.inf
+        s.max = d["max"] if d["max"] is not None else -math.inf
+        return s
+
+
+class RollingCounter:
+    """Per-minute (total, approved) ring buffer covering the last WINDOW_MINUTES."""
+
+    def __init__(self, minutes=WINDOW_MINUTES):
+        self.minutes = minutes
+        self.slots = [[-1, 0, 0] for _ in range(minutes)]  # [minute, total, approved]
+
+    def add(self, total, approved, now=None):
+        minute = int((now or time.time()) // 60)
+        slot = self.slots[minute % self.minutes]
+        if slot[0] != minute:
+            slot[0], slot[1], slot[2] = minute, 0, 0
+        slot[1] += total
+        slot[2] += approved
+
+    def to_list(self, now=None):
+        current = int((now or time.time()) // 60)
+        return [s[:] for s in self.slots if current - s[0] < self.minutes]
+
+
+_lock = threading.Lock()
+_sketches = {f: QuantileSketch() for f in SKETCH_FEATURES}
+_rolling = RollingCounter()
+_sources = Counter()
+
+
+def flush():
+    """Write this worker's state where the other workers can merge it."""
+    with _lock:
+        state = {
+            "sketches": {f: s.to_dict() for f, s in _sketches.items()},
+            "rolling": _rolling.to_list(),
+            "sources": dict(_sources),
+        }
+    write_state(LIVE_STATS_DIR, state)
+
+
+_flusher = flusher("sketch-flusher", flush, FLUSH_SECONDS, "Sketches")
+
+
+def record_scoring(source, applicant_income, coapplicant_income, loan_amount, probability, prediction):
+    """Feed one scored application (loan_amount in real ₹). Never raises."""
+    try:
+        _flusher.ensure()
+        with _lock:
+            _sketches["applicant_income"].add(applicant_income)
+            _sketches["coapplicant_income"].add(coapplicant_income)
+            _sketches["loan_amount"].add(loan_amount)
+            _sketches["probability"].add(probability)
+            _rolling.add(1, 1 if prediction == 1 else 0)
+            _sources[source] += 1
+    except Exception:
+        pass  # live stats never block scoring
+
+
+def record_batch(source, applicant_income, coapplicant_income, loan_amount, probability, prediction):
+    """Vectorized record_scoring for array inputs (one lock acquisition per batch)."""
+    try:
+        _flusher.ensure()
+        prediction = np.asarray(prediction)
+        with _lock:
+            _sketches["applicant_income"].add_many(applicant_income)
+            _sketches["coapplicant_income"].add_many(coapplicant_income)
+            _sketches["loan_amount"].add_many(loan_amount)
+            _sketches["probability"].add_many(probability)
+            _rolling.add(int(prediction.size), int((prediction == 1).sum()))
+            _sources[source] += int(prediction.size)
+    except Exception:
+        pass
+
+
+def merged_state():
+    """Merge the flushed state of every live worker (stale files are removed)."""
+    flush()
+    sketches = {f: QuantileSketch() for f in SKETCH_FEATURES}
+    per_minute = Counter(), Counter()
+    sources = Counter()
+    workers = worker_states(LIVE_STATS_DIR)
+    for _, state in workers:
+        for feat, d in state["sketches"].items():
+            if feat in sketches:
+                sketches[feat].merge(QuantileSketch.from_dict(d))
+        for minute, total, approved in state["rolling"]:
+            per_minute[0][minute] += total
+            per_minute[1][minute] += approved
+        sources.update(state["sources"])
+    return sketches, per_minute, sources, len(workers)
+
+
+def get_live_stats():
+    """Live distribution analytics (in-memory sketches, merged across workers)
+    ---
+    responses:
+      200:
+        description: p50/p90/p99 per feature, rolling approval rates and per-source counts
+    """
+    sketches, (totals, approvals), sources, workers = merged_state()
+    current = int(time.time() // 60)
+
+    features = {}
+    for feat, s in sketches.items():
+        features[feat] = {
+            "count": s.count,
+            "mean": round(s.total / s.count, 4) if s.count else None,
+            "min": s.min if s.count else None,
+            "max": s.max if s.count else None,
+            **{name: (round(v, 4) if v is not None else None)
+               for name, v in ((name, s.quantile(q)) for name, q in QUANTILES.items())},
+        }
+
+    rolling = {}
+    for window in ROLLING_WINDOWS:
+        minutes = [m for m in totals if current - m < window]
+        total = sum(totals[m] for m in minutes)
+        approved = sum(approvals[m] for m in minutes)
+        rolling[f"last_{window}m"] = {
+            "total": total,
+            "approved": approved,
+            "approval_rate": round(approved * 100.0 / total, 1) if total else None,
+        }
+
+    return jsonify({
+        "features": features,
+        "rolling_approval": rolling,
+        "sources": dict(sources),
+        "workers": workers,
+        "relative_accuracy": ALPHA,
+    })
@@ -0,0 +1,292 @@
+"""
+synth_data.py — Synthetic loan applications at scale, fitted to data/loan_data.csv
+Fits the training file once (a few hundred rows) and samples any number of rows
+in vectorized blocks:
+  * categorical columns and Loan_Amount_Term: their observed marginals
+  * Loan_Status: conditional on Credit_History (P(Y | history), the dominant signal)
+  * ApplicantIncome / CoapplicantIncome / LoanAmount: jointly, by a smoothed
+    bootstrap in log space (Gaussian KDE around resampled source rows), which
+    keeps each marginal and the income ↔ loan-amount correlation; applicants
+    without a co-applicant keep CoapplicantIncome = 0.
+
+Output is deterministic for a given --seed and --rows (each block of BLOCK_ROWS
+has its own seed), so runs can be reproduced without storing the file.
+
+Drift (for exercising the drift monitor), applied to the last rows only when
+--drift-from is given (e.g. 0.8 = the most recent 20% of created_at):
+    ApplicantIncome*1.4          scale a numeric column
+    LoanAmount+50                shift a numeric column (training units, ₹ thousands)
+    Property_Area:Urban=0.7      set one category's share (others rescaled); categorical
+                                 columns, Credit_History and Loan_Amount_Term only
+
+CLI:
+    python synth_data.py --rows 5000000 --out data/synth_5m.parquet
+    python synth_data.py --rows 1000000 --out synth.csv --seed 7
+    python synth_data.py --rows 2000000 --db --days 60 --drift 'ApplicantIncome*1.4' --drift Credit_History:1=0.6 --drift-from 0.9
+
+CSV / Parquet use the training schema (LoanAmount in ₹ thousands, Loan_Status Y/N).
+--db scores every row with the current model and COPYs into applications
+(LoanAmount in real ₹, status Pending, created_at spread over the last --days).
+"""
+import os
+import re
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+SOURCE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "loan_data.csv")
+BLOCK_ROWS = 100_000
+
+CATEGORICAL = ["Gender", "Married", "Dependents", "Education", "Self_Employed", "Property_Area"]
+JOINT_NUMERIC = ["ApplicantIncome", "CoapplicantIncome", "LoanAmount"]
+SHARE_COLUMNS = CATEGORICAL + ["Credit_History", "Loan_Amount_Term"]   # sampled from marginals
+COLUMNS = ["Loan_ID", "Gender", "Married", "Dependents", "Education", "Self_Employed",
+           "ApplicantIncome", "CoapplicantIncome", "LoanAmount", "Loan_Amount_Term",
+           "Credit_History", "Property_Area", "Loan_Status"]
+
+_DRIFT_RE = re.compile(r"^(?P<col>\w+)(?:(?P<op>[*+])(?P<num>-?[\d.]+)|:(?P<value>[^=]+)=(?P<share>[\d.]+))$")
+
+
+# ── Fit ───────────────────────────────────────────────────────────────────────
+
+def _marginal(series):
+    shares = series.dropna().value_counts(normalize=True).sort_index()
+    return {"values": shares.index.to_numpy(), "p": shares.to_numpy(dtype=float)}
+
+
+def fit(path=SOURCE_CSV):
+    """Fit marginals, P(status | credit history) and the joint numeric KDE from the training CSV."""
+    df = pd.read_csv(path, dtype={"Dependents": str})
+    spec = {"categorical": {col: _marginal(df[col]) for col in CATEGORICAL}}
+    spec["Loan_Amount_Term"] = _marginal(df["Loan_Amount_Term"].dropna().astype(int))
+    spec["Credit_History"] = _marginal(df["Credit_History"].dropna().astype(int))
+
+    labelled = df.dropna(subset=["Credit_History", "Loan_Status"])
+    approved = labelled["Loan_Status"].eq("Y").groupby(labelled["Credit_History"].astype(int)).mean()
+    overall = float(labelled["Loan_Status"].eq("Y").mean())
+    spec["p_approved"] = np.array([approved.get(h, overall) for h in spec["Credit_History"]["values"]])
+
+    numeric = df[JOINT_NUMERIC].dropna().astype(float)
+    numeric = numeric[(numeric["ApplicantIncome"] > 0) & (numeric["LoanAmount"] > 0)]
+    logs = np.log1p(numeric.to_numpy())
+    has_coapplicant = numeric["CoapplicantIncome"].to_numpy() > 0
+    n, d = logs.shape
+    # Silverman's rule of thumb, per dimension; the co-applicant spread ignores the zeros
+    spread = logs.std(axis=0, ddof=1)
+    spread[1] = logs[has_coapplicant, 1].std(ddof=1)
+    bandwidth = (4 / (d + 2)) ** (1 / (d + 4)) * n ** (-1 / (d + 4)) * spread
+    spec["numeric"] = {"log_rows": logs, "has_coapplicant": has_coapplicant,
+                       "bandwidth": bandwidth,
+                       "min": numeric.min().to_numpy(), "max": numeric.max().to_numpy()}
+    return spec
+
+
+# ── Drift ─────────────────────────────────────────────────────────────────────
+
+def parse_drift(specs):
+    """['ApplicantIncome*1.4', 'Property_Area:Urban=0.7'] -> list of drift rules."""
+    rules = []
+    for text in specs or []:
+        m = _DRIFT_RE.match(text.strip())
+        if not m:
+            raise ValueError(f"Bad drift spec {text!r} (use COL*F, COL+D or COL:VALUE=SHARE)")
+        col = m["col"]
+        if col not in COLUMNS[1:-1]:
+            raise ValueError(f"Unknown drift column {col!r}")
+        if m["op"]:
+            if col not in JOINT_NUMERIC + ["Loan_Amount_Term"]:
+                raise ValueError(f"{col} is categorical — use {col}:VALUE=SHARE")
+            rules.append({"col": col, "op": m["op"], "num": float(m["num"])})
+        else:
+            if col not in SHARE_COLUMNS:
+                raise ValueError(f"{col} is continuous — use {col}*F or {col}+D")
+            share = float(m["share"])
+            if not 0 <= share <= 1:
+                raise ValueError(f"Share for {col} must be between 0 and 1")
+            rules.append({"col": col, "value": m["value"], "share": share})
+    return rules
+
+
+def _with_share(marginal, value, share):
+    values, p = marginal["values"], marginal["p"].copy()
+    keys = [str(v) for v in values]
+    if value not in keys:
+        raise ValueError(f"{value!r} is not an observed value ({', '.join(keys)})")
+    i = keys.index(value)
+    rest = p.sum() - p[i]
+    p = p * ((1 - share) / rest if rest > 0 else 0)
+    p[i] = share
+    return {"values": values, "p": p / p.sum()}
+
+
+def drifted_spec(spec, rules):
+    """Copy of `spec` with the categorical share overrides applied (numeric rules apply after sampling)."""
+    out = dict(spec, categorical=dict(spec["categorical"]))
+    for rule in rules:
+        if "share" not in rule:
+            continue
+        col = rule["col"]
+        if col in out["categorical"]:
+            out["categorical"][col] = _with_share(out["categorical"][col], rule["value"], rule["share"])
+        else:
+            out[col] = _with_share(out[col], rule["value"], rule["share"])
+    return out
+
+
+# ── Sample ────────────────────────────────────────────────────────────────────
+
+def _choice(rng, marginal, n):
+    return marginal["values"][rng.choice(len(marginal["p"]), size=n, p=marginal["p"])]
+
+
+def sample_block(spec, n, rng, numeric_rules=()):
+    """n synthetic rows in the training schema (without Loan_ID)."""
+    out = {col: _choice(rng, m, n) for col, m in spec["categorical"].items()}
+
+    num = spec["numeric"]
+    idx = rng.integers(0, len(num["log_rows"]), size=n)
+    logs = num["log_rows"][idx] + rng.standard_normal((n, len(JOINT_NUMERIC))) * num["bandwidth"]
+    # KDE tails are unbounded; keep samples near the observed range
+    values = np.clip(np.expm1(logs), num["min"], num["max"] * 1.5)
+    values[~num["has_coapplicant"][idx], 1] = 0.0
+    numeric = dict(zip(JOINT_NUMERIC, values.T))
+    numeric["Loan_Amount_Term"] = _choice(rng, spec["Loan_Amount_Term"], n).astype(float)
+    for rule in numeric_rules:
+        col = numeric[rule["col"]]
+        numeric[rule["col"]] = col * rule["num"] if rule["op"] == "*" else col + rule["num"]
+
+    out["ApplicantIncome"] = np.maximum(np.rint(numeric["ApplicantIncome"]), 1).astype("int64")
+    out["CoapplicantIncome"] = np.maximum(np.rint(numeric["CoapplicantIncome"]), 0).astype("int64")
+    out["LoanAmount"] = np.maximum(np.rint(numeric["LoanAmount"]), 1).astype("int64")
+    out["Loan_Amount_Term"] = np.maximum(np.rint(numeric["Loan_Amount_Term"]), 1).astype("int64")
+
+    history = _choice(rng, spec["Credit_History"], n).astype("int64")
+    p_approved = spec["p_approved"][np.searchsorted(spec["Credit_History"]["values"], history)]
+    approved = rng.random(n) < p_approved
+    out["Credit_History"] = history
+    out["Loan_Status"] = np.where(approved, "Y", "N")
+    return pd.DataFrame(out)
+
+
+def generate(spec, rows, seed=42, drift=None, drift_from=0.0):
+    """
+    Yield DataFrames of up to BLOCK_ROWS rows (training schema plus a `position`
+    column in [0, 1) = where the row falls in the run, used for created_at).
+    Rows at position >= drift_from get the drift rules.
+    """
+    rules = drift or []
+    share_spec = drifted_spec(spec, rules)
+    numeric_rules = [r for r in rules if "op" in r]
+    for block, start in enumerate(range(0, rows, BLOCK_ROWS)):
+        n = min(BLOCK_ROWS, rows - start)
+        rng = np.random.default_rng([seed, block])
+        position = (start + np.arange(n) + rng.random(n)) / rows
+        drifted = position >= drift_from if rules else np.zeros(n, bool)
+        df = sample_block(spec, n, rng)
+        if drifted.any():
+            shifted = sample_block(share_spec, int(drifted.sum()), np.random.default_rng([seed, block, 1]),
+                                   numeric_rules)
+            shifted.index = np.flatnonzero(drifted)
+            df.loc[drifted] = shifted
+        df.insert(0, "Loan_ID", [f"SYN{i:09d}" for i in range(start, start + n)])
+        df["position"] = position
+        yield df
+
+
+# ── Writers ───────────────────────────────────────────────────────────────────
+
+def write_csv(blocks, path):
+    for i, df in enumerate(blocks):
+        df[COLUMNS].to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        yield len(df)
+
+
+def write_parquet(blocks, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer = None
+    try:
+        for df in blocks:
+            table = pa.Table.from_pandas(df[COLUMNS], preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema, compression="zstd")
+            writer.write_table(table)
+            yield len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def copy_to_db(blocks, days):
+    """Score with the current model and COPY into applications (real ₹, created_at over the last `days`)."""
+    import joblib
+    from bulk_import import copy_chunk, score_frame, classify_risk_vec
+    from db import get_connection
+    models = (joblib.load("models/loan_model.pkl"), joblib.load("models/scaler.pkl"),
+              joblib.load("models/label_encoders.pkl"))
+    end = datetime.now()
+    span = timedelta(days=days)
+    conn = get_connection()
+    try:
+        for df in blocks:
+            rows = df.drop(columns=["Loan_Status"])
+            rows["LoanAmount"] = rows["LoanAmount"] * 1000   # applications stores real ₹
+            rows["prediction"], rows["probability"] = score_frame(rows, *models)
+            rows["risk_level"] = classify_risk_vec(rows["probability"].to_numpy())
+            rows["ApplicantName"] = "Synthetic " + rows["Loan_ID"]
+            rows["status"] = "Pending"
+            rows["created_at"] = (end - span) + pd.to_timedelta(rows["position"] * span.total_seconds(), unit="s")
+            copy_chunk(conn, rows)
+            yield len(rows)
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic loan applications fitted to data/loan_data.csv.")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--out", help="output .csv or .parquet (training schema)")
+    parser.add_argument("--db", action="store_true", help="score and COPY into the applications table instead")
+    parser.add_argument("--days", type=float, default=30, help="--db: spread created_at over this many days")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--source", default=SOURCE_CSV, help="CSV to fit")
+    parser.add_argument("--drift", action="append", metavar="SPEC", help="COL*F, COL+D or COL:VALUE=SHARE (repeatable)")
+    parser.add_argument("--drift-from", type=float, default=0.0,
+                        help="apply drift from this fraction of the run onwards (default: all rows)")
+    args = parser.parse_args()
+
+    if bool(args.out) == args.db:
+        parser.error("give exactly one of --out or --db")
+    if args.out and not args.out.lower().endswith((".csv", ".parquet")):
+        parser.error("--out must end in .csv or .parquet")
+    try:
+        rules = parse_drift(args.drift)
+    except ValueError as e:
+        parser.error(str(e))
+
+    started = time.perf_counter()
+    spec = fit(args.source)
+    blocks = generate(spec, args.rows, seed=args.seed, drift=rules, drift_from=args.drift_from)
+    if args.db:
+        writer = copy_to_db(blocks, args.days)
+    elif args.out.lower().endswith(".parquet"):
+        writer = write_parquet(blocks, args.out)
+    else:
+        writer = write_csv(blocks, args.out)
+
+    written = 0
+    for n in writer:
+        written += n
+        print(f"\r{written:,} / {args.rows:,} rows", end="", file=sys.stderr, flush=True)
+    elapsed = time.perf_counter() - started
+    print(file=sys.stderr)
+    print(f"Generated {written:,} rows to {'applications' if args.db else args.out} in {elapsed:.1f}s "
+          f"— {round(written / elapsed) if elapsed else written:,} rows/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest
+
+import bulk_import
+
+HEADER = ("ApplicantName,Gender,Married,Dependents,Education,Self_Employed,ApplicantIncome,"
+          "CoapplicantIncome,LoanAmount,Loan_Amount_Term,Credit_History,Property_Area,"
+          "prediction,probability,risk_level,status\n")
+ROW = "{name},Male,Yes,0,Graduate,No,5000,0,120000,360,1,Urban,{pred},{prob},{risk},{status}\n"
+
+
+class FakeModel:
+    """Scores every row at 0.95, so any rescored row is easy to spot."""
+
+    def predict_proba(self, X):
+        return np.tile([0.05, 0.95], (len(X), 1))
+
+    def predict(self, X):
+        return np.ones(len(X), dtype=int)
+
+
+class IdentityScaler:
+    def transform(self, X):
+        return np.zeros((len(X), len(X.columns)))
+
+
+MODELS = (FakeModel(), IdentityScaler(), {})
+
+
+class FakeConnection:
+    def __init__(self):
+        self.copied = []
+
+    def cursor(self):
+        return self
+
+    def copy_expert(self, sql, buf):
+        self.copied.append(buf.getvalue())
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _import(csv, score=False):
+    conn = FakeConnection()
+    summary, rejects = bulk_import.run_import(io.BytesIO(csv.encode()), "history.csv", models=MODELS,
+                                              score=score, get_conn=lambda: conn)
+    columns = [db_col for _, db_col in bulk_import.DB_COLUMNS]
+    rows = pd.read_csv(io.StringIO("".join(conn.copied)), header=None, names=columns)
+    return summary, rejects, rows
+
+
+def _mixed_chunk():
+    return (HEADER
+            + ROW.format(name="Historical A", pred=0, prob=0.12, risk="High Risk", status="Rejected")
+            + ROW.format(name="Unscored", pred="", prob="", risk="", status="Pending")
+            + ROW.format(name="Historical B", pred=1, prob=0.55, risk="", status="Approved"))
+
+
+def test_mixed_chunk_keeps_supplied_predictions():
+    summary, rejects, rows = _import(_mixed_chunk())
+    assert summary["inserted"] == 3 and rejects.empty
+    by_name = rows.set_index("applicant_name")
+
+    assert by_name.loc["Historical A", "prediction"] == 0
+    assert by_name.loc["Historical A", "probability"] == pytest.approx(0.12)
+    assert by_name.loc["Historical A", "risk_level"] == "High Risk"
+
+    assert by_name.loc["Historical B", "prediction"] == 1
+    assert by_name.loc["Historical B", "probability"] == pytest.approx(0.55)
+    assert by_name.loc["Historical B", "risk_level"] == "Medium Risk"   # derived from its own probability
+
+    assert by_name.loc["Unscored", "prediction"] == 1
+    assert by_name.loc["Unscored", "probability"] == pytest.approx(0.95)
+    assert by_name.loc["Unscored", "risk_level"] == "Low Risk"
+
+
+def test_score_flag_rescores_every_row():
+    _, _, rows = _import(_mixed_chunk(), score=True)
+    assert (rows["probability"] == 0.95).all()
+    assert (rows["risk_level"] == "Low Risk").all()
+
+
+def test_unscored_rows_without_models_are_refused():
+    conn = FakeConnection()
+    with pytest.raises(ValueError):
+        bulk_import.run_import(io.BytesIO(_mixed_chunk().encode()), "history.csv", models=None,
+                               get_conn=lambda: conn)
+
+
+class FailingConnection(FakeConnection):
+    """Commits the first `ok_chunks` COPYs, then fails."""
+
+    def __init__(self, ok_chunks):
+        super().__init__()
+        self.ok_chunks = ok_chunks
+
+    def copy_expert(self, sql, buf):
+        if len(self.copied) == self.ok_chunks:
+            raise RuntimeError("connection lost")
+        super().copy_expert(sql, buf)
+
+
+def _rows(n):
+    return "".join(ROW.format(name=f"A{i}", pred=1, prob=0.9, risk="", status="Approved") for i in range(n))
+
+
+def test_failure_after_committed_chunks_returns_the_partial_summary():
+    csv = HEADER + _rows(2) + ROW.format(name="Bad", pred=1, prob=0.9, risk="", status="Approved").replace(
+        "Male", "Robot") + _rows(3)
+    conn = FailingConnection(ok_chunks=1)
+    summary, rejects = bulk_import.run_import(io.BytesIO(csv.encode()), "history.csv", models=MODELS,
+                                              chunk_rows=3, get_conn=lambda: conn)
+    assert summary["inserted"] == 2
+    assert summary["rows_read"] == 3
+    assert summary["failed_at_row"] == 4
+    assert summary["error"] == "connection lost"
+    assert list(rejects.index) == [3]
+
+
+def test_failure_before_anything_was_inserted_is_raised():
+    conn = FailingConnection(ok_chunks=0)
+    with pytest.raises(RuntimeError):
+        bulk_import.run_import(io.BytesIO((HEADER + _rows(2)).encode()), "history.csv", models=MODELS,
+                               get_conn=lambda: conn)
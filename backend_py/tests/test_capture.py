@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+import capture
+
+
+def _dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def _touch(directory, name, mtime):
+    path = directory / name
+    path.write_text("{}\n")
+    os.utime(path, (mtime, mtime))
+
+
+def test_prune_keeps_a_live_workers_current_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(capture, "CAPTURE_DIR", str(tmp_path))
+    monkeypatch.setattr(capture, "CAPTURE_MAX_FILES", 2)
+    live, dead = os.getpid(), _dead_pid()
+    # this worker's current file is the oldest one: it rotates rarely under light traffic
+    _touch(tmp_path, f"{live}-20260101T000000000000.ndjson", 1000)
+    _touch(tmp_path, f"{live}-20251231T000000000000.ndjson", 900)   # rotated away earlier
+    _touch(tmp_path, f"{dead}-20260102T000000000000.ndjson", 2000)
+    _touch(tmp_path, f"{dead}-20260103T000000000000.ndjson", 3000)
+    _touch(tmp_path, f"{dead}-20260101T120000000000.ndjson", 1500)
+
+    capture._prune()
+
+    assert sorted(os.listdir(tmp_path)) == sorted([
+        f"{live}-20260101T000000000000.ndjson",
+        f"{dead}-20260102T000000000000.ndjson",
+        f"{dead}-20260103T000000000000.ndjson",
+    ])
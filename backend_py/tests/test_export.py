@@ -0,0 +1,31 @@
+import io
+
+import pyarrow.parquet as pq
+
+from routes import export
+
+HEADER = ",".join(export.APPLICATION_COLUMNS) + "\n"
+
+
+def _row(i, prediction="", probability="", risk=""):
+    return (f"{i},Applicant {i},Male,Yes,3+,Graduate,No,5000,0,120000,360,1,Urban,"
+            f"{prediction},{probability},{risk},Pending,2026-10-19 01:44:44.{i:06d}\n")
+
+
+def test_parquet_export_keeps_one_schema_when_a_column_fills_in_later(monkeypatch):
+    # First CSV blocks: rows imported unscored (prediction / probability all NULL)
+    monkeypatch.setattr(export, "PARQUET_BLOCK_BYTES", 512)
+    csv = HEADER + "".join(_row(i) for i in range(1, 20)) + "".join(
+        _row(i, 1, 0.73, "Low Risk") for i in range(20, 40))
+    parquet = b"".join(export._parquet_chunks(io.BytesIO(csv.encode()),
+                                              export.EXPORT_TABLES["applications"]["types"], lambda: None))
+
+    table = pq.read_table(io.BytesIO(parquet))
+    assert table.num_rows == 39
+    assert pq.ParquetFile(io.BytesIO(parquet)).num_row_groups > 1
+    assert str(table.schema.field("probability").type) == "double"
+    assert str(table.schema.field("prediction").type) == "int64"
+    assert str(table.schema.field("created_at").type) == "timestamp[us]"
+    assert str(table.schema.field("dependents").type) == "string"
+    probabilities = table.column("probability").to_pylist()
+    assert probabilities[:19] == [None] * 19 and probabilities[19:] == [0.73] * 20
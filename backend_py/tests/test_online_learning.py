@@ -0,0 +1,16 @@
+from sklearn.tree import DecisionTreeClassifier
+
+import online_learning
+
+
+def test_non_linear_model_is_skipped_before_taking_the_lock(monkeypatch):
+    def no_connection():
+        raise AssertionError("must not connect for a model that cannot be updated")
+
+    monkeypatch.setattr(online_learning, "load_bundle", lambda: (DecisionTreeClassifier(), None, {}, None))
+    monkeypatch.setattr(online_learning, "get_connection", no_connection)
+
+    result = online_learning.run_update(force=True)
+
+    assert result["skipped"]
+    assert "DecisionTreeClassifier" in result["reason"]
@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+
+import perpid_store
+
+
+def _dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def _write(directory, pid, state):
+    with open(os.path.join(directory, f"{pid}.json"), "w") as f:
+        json.dump(state, f)
+
+
+def test_worker_states_reads_live_workers_and_removes_dead_ones(tmp_path):
+    perpid_store.write_state(str(tmp_path), {"n": 1})
+    dead = _dead_pid()
+    _write(tmp_path, dead, {"n": 2})
+    (tmp_path / "notes.txt").write_text("ignored")
+
+    assert perpid_store.worker_states(str(tmp_path)) == [(os.getpid(), {"n": 1})]
+    assert not (tmp_path / f"{dead}.json").exists()
+    assert (tmp_path / "notes.txt").exists()
+
+
+def test_retire_folds_a_dead_worker_once(tmp_path):
+    def fold(retired, dead):
+        return {"n": (retired or {"n": 0})["n"] + dead["n"]}
+
+    for n in (2, 3):
+        dead = _dead_pid()
+        _write(tmp_path, dead, {"n": n})
+        retire = lambda path: perpid_store.retire(str(tmp_path), path, fold)
+        assert perpid_store.worker_states(str(tmp_path), on_dead=retire) == []
+        perpid_store.retire(str(tmp_path), str(tmp_path / f"{dead}.json"), fold)   # already claimed: no-op
+
+    assert perpid_store.retired_state(str(tmp_path)) == {"n": 5}
+    assert perpid_store.worker_states(str(tmp_path)) == []
+
+
+def test_missing_directory_has_no_workers(tmp_path):
+    assert perpid_store.worker_states(str(tmp_path / "absent")) == []
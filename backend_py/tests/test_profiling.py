@@ -0,0 +1,26 @@
+import pytest
+from flask import Flask
+
+import profiling
+
+app = Flask(__name__)
+
+
+@profiling.profiled
+def view():
+    return "prediction"
+
+
+@pytest.mark.parametrize("flag", ["", "0", "false", "no", "off", "OFF", "pstat"])
+def test_falsy_or_unknown_flag_passes_straight_through(flag):
+    with app.test_request_context(headers={"X-Profile": flag}):
+        assert view() == "prediction"
+    with app.test_request_context(query_string={"profile": flag}):
+        assert view() == "prediction"
+
+
+@pytest.mark.parametrize("flag, fmt", [("1", "pstats"), ("True", "pstats"), ("yes", "pstats"),
+                                       ("pstats", "pstats"), ("collapsed", "collapsed")])
+def test_profiling_flags(flag, fmt):
+    with app.test_request_context(headers={"X-Profile": flag}):
+        assert profiling._requested_format() == fmt
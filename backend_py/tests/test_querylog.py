@@ -0,0 +1,57 @@
+import querylog
+
+
+class FakeCursor:
+    def __init__(self, executed):
+        self.executed = executed
+
+    def execute(self, sql):
+        self.executed.append(sql)
+
+    def fetchall(self):
+        return [("Index Scan using applications_pkey on applications",)]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self.executed)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_parameterized_numbers_positional_placeholders():
+    sql, n = querylog._parameterized("SELECT * FROM t WHERE a = %s AND b LIKE 'x%%' AND c = %s")
+    assert sql == "SELECT * FROM t WHERE a = $1 AND b LIKE 'x%' AND c = $2"
+    assert n == 2
+
+
+def test_parameterized_reuses_numbers_for_named_placeholders():
+    sql, n = querylog._parameterized("UPDATE t SET a = %(v)s WHERE id = %(id)s OR parent = %(id)s")
+    assert sql == "UPDATE t SET a = $1 WHERE id = $2 OR parent = $2"
+    assert n == 2
+
+
+def test_explain_uses_a_generic_plan_without_bound_values(monkeypatch, capsys):
+    conn = FakeConnection()
+    monkeypatch.setattr(querylog, "get_connection", lambda: conn)
+    entry = {"fingerprint": "SELECT * FROM applications WHERE email = ?", "plan": None}
+
+    querylog._explain(entry, "SELECT * FROM applications WHERE email = %s", True)
+
+    assert conn.executed == [
+        "SET LOCAL plan_cache_mode = force_generic_plan",
+        "PREPARE loanguard_explain AS SELECT * FROM applications WHERE email = $1",
+        "EXPLAIN EXECUTE loanguard_explain(NULL)",
+    ]
+    assert entry["plan"].startswith("Index Scan")
+    assert "slow_query" in capsys.readouterr().out
@@ -0,0 +1,28 @@
+import pytest
+
+import synth_data
+
+
+def test_parse_drift_accepts_each_rule_kind():
+    rules = synth_data.parse_drift(["ApplicantIncome*1.4", "LoanAmount+50", "Credit_History:1=0.6",
+                                    "Property_Area:Urban=0.7"])
+    assert [r["col"] for r in rules] == ["ApplicantIncome", "LoanAmount", "Credit_History", "Property_Area"]
+    assert rules[2] == {"col": "Credit_History", "value": "1", "share": 0.6}
+
+
+@pytest.mark.parametrize("spec", ["ApplicantIncome:5000=0.5", "LoanAmount:120=0.2", "CoapplicantIncome:0=0.9"])
+def test_parse_drift_rejects_share_rules_on_continuous_columns(spec):
+    with pytest.raises(ValueError, match="continuous"):
+        synth_data.parse_drift([spec])
+
+
+def test_parse_drift_rejects_scaling_a_categorical_column():
+    with pytest.raises(ValueError, match="categorical"):
+        synth_data.parse_drift(["Gender*2"])
+
+
+def test_share_rule_is_applied_to_the_marginal():
+    spec = synth_data.fit()
+    drifted = synth_data.drifted_spec(spec, synth_data.parse_drift(["Loan_Amount_Term:360=0.5"]))
+    keys = [str(v) for v in drifted["Loan_Amount_Term"]["values"]]
+    assert drifted["Loan_Amount_Term"]["p"][keys.index("360")] == pytest.approx(0.5)
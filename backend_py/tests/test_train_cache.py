@@ -0,0 +1,49 @@
+import os
+
+import pandas as pd
+import pytest
+
+import train_cache
+import train_model
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), train_model.DATA_PATH)
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(train_cache, "FEATURE_CACHE_DIR", str(tmp_path / "features"))
+    return tmp_path
+
+
+def _lines():
+    with open(DATA) as f:
+        header, *rows = f.read().splitlines(keepends=True)
+    dependents = header.split(",").index("Dependents")
+    plus = [r for r in rows if r.split(",")[dependents] == "3+"]
+    return header, [r for r in rows if r not in plus], plus
+
+
+def assert_same_as_cold(path):
+    raw, X, y, encoders = train_cache.prepared_frame(path)
+    cold_raw, cold_X, cold_y, cold_encoders = train_model.prepare_frame(path)
+    pd.testing.assert_frame_equal(raw.reset_index(drop=True), cold_raw.reset_index(drop=True))
+    pd.testing.assert_frame_equal(X.reset_index(drop=True), cold_X.reset_index(drop=True))
+    assert list(y) == list(cold_y)
+    assert sorted(encoders) == sorted(cold_encoders)
+    for col, le in cold_encoders.items():
+        assert list(encoders[col].classes_) == list(le.classes_), col
+
+
+@pytest.mark.parametrize("appended", ["same types", "new 3+ dependents"])
+def test_appended_rows_give_the_cold_result(cache_dir, capsys, appended):
+    header, rows, plus = _lines()
+    assert plus, "fixture data needs Dependents = 3+ rows"
+    path = str(cache_dir / "loans.csv")
+    with open(path, "w") as f:
+        f.write(header + "".join(rows[:200]))
+    train_cache.prepared_frame(path)   # caches the parse of the first 200 rows
+
+    with open(path, "a") as f:
+        f.write("".join(rows[200:] if appended == "same types" else plus))
+    assert_same_as_cold(path)
+    assert ("reused the parse" in capsys.readouterr().out) == (appended == "same types")
@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+import train_model
+import train_streaming
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), train_model.DATA_PATH)
+
+
+def in_memory_preprocessing():
+    """What train_in_memory fits: full-frame fill values, encoders and scaler."""
+    data = train_model.read_frame(DATA)
+    fill = {col: data[col].mode()[0] for col in train_streaming.CATEGORICAL + [train_streaming.TARGET]}
+    fill.update({col: float(data[col].median()) for col in train_streaming.NUMERIC})
+    _, X, _, label_encoders = train_model.prepare_data(data)
+    return fill, label_encoders, StandardScaler().fit(X), list(X.columns)
+
+
+@pytest.mark.parametrize("chunk_rows", [1_000_000, 37])   # one chunk; many chunks, last one partial
+def test_streaming_preprocessing_matches_in_memory(chunk_rows):
+    fill, encoders, scaler, columns = in_memory_preprocessing()
+    stats = train_streaming.collect_statistics(DATA, chunk_rows, seed=42)
+    s_fill, s_encoders, s_scaler = train_streaming.build_preprocessing(stats)
+
+    assert columns == train_streaming.FEATURES
+    assert sorted(s_encoders) == sorted(encoders)
+    for col, le in encoders.items():
+        assert list(s_encoders[col].classes_) == list(le.classes_), col
+    for col in train_streaming.CATEGORICAL + [train_streaming.TARGET]:
+        assert s_fill[col] == fill[col], col
+    # The file is smaller than the reservoir, so the sampled medians are exact here too
+    for col in train_streaming.NUMERIC:
+        assert s_fill[col] == pytest.approx(fill[col]), col
+    np.testing.assert_allclose(s_scaler.mean_, scaler.mean_, rtol=1e-10)
+    np.testing.assert_allclose(s_scaler.var_, scaler.var_, rtol=1e-10)
+    assert s_scaler.n_samples_seen_ == scaler.n_samples_seen_
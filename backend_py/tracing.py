@@ -0,0 +1,80 @@
+"""
+tracing.py — Per-request spans: Server-Timing header + sampled JSON trace lines
+Every metrics.stage(...) block also lands here as a span of the current request.
+All requests get an X-Request-ID and a Server-Timing header (cheap: a list
+append per stage); a sample of requests, plus every request slower than
+TRACE_SLOW_MS, is written to stdout as one JSON line:
+
+    {"trace": "loanguard", "request_id": "...", "route": "/predict", "status": 200,
+     "duration_ms": 41.2, "spans": [{"name": "scoring", "start_ms": 3.1, "duration_ms": 1.4}, ...]}
+"""
+import os
+import re
+import json
+import time
+import uuid
+import random
+from flask import request, g, has_request_context
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))   # share of requests logged
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))           # always log slower requests
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"
+
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def record_span(name, start, duration):
+    """Attach a finished span (perf_counter start, seconds) to the current request."""
+    if has_request_context():
+        spans = g.get("_trace_spans")
+        if spans is not None:
+            spans.append((name, start, duration))
+
+
+def current_request_id():
+    return g.get("request_id") if has_request_context() else None
+
+
+def _server_timing(spans, total):
+    parts = [f"{name};dur={duration * 1000:.2f}" for name, _, duration in spans]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+def register_tracing(app):
+    """Assign request ids, collect spans and emit Server-Timing / trace lines."""
+
+    @app.before_request
+    def _trace_start():
+        incoming = request.headers.get("X-Request-ID", "")
+        g.request_id = incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex[:16]
+        g._trace_start = time.perf_counter()
+        g._trace_spans = []
+        g._trace_sampled = random.random() < TRACE_SAMPLE_RATE
+
+    @app.after_request
+    def _trace_finish(response):
+        start = g.get("_trace_start")
+        if start is None:
+            return response
+        total = time.perf_counter() - start
+        spans = g._trace_spans
+        response.headers["X-Request-ID"] = g.request_id
+        if SERVER_TIMING:
+            response.headers["Server-Timing"] = _server_timing(spans, total)
+
+        if g._trace_sampled or total * 1000 >= TRACE_SLOW_MS:
+            print(json.dumps({
+                "trace": "loanguard",
+                "request_id": g.request_id,
+                "pid": os.getpid(),
+                "method": request.method,
+                "route": request.url_rule.rule if request.url_rule else request.path,
+                "status": response.status_code,
+                "duration_ms": round(total * 1000, 2),
+                "spans": [
+                    {"name": name, "start_ms": round((s - start) * 1000, 2), "duration_ms": round(d * 1000, 2)}
+                    for name, s, d in spans
+                ],
+            }), flush=True)
+        return response
@@ -0,0 +1,233 @@
+"""
+train_cache.py — Content-addressed training cache (used by train_model.py)
+Two levels, both keyed by content rather than file names or timestamps:
+
+  run fingerprint   sha256 of the training data, the run options, the training
+                    code (CODE_FILES) and library versions. After a successful
+                    run it is written to models/train_fingerprint.json together
+                    with the model version; a later run with the same
+                    fingerprint, while that version is still the one in
+                    model_meta.json, keeps the existing artifacts and exits
+                    (--force retrains anyway).
+  feature cache     the parsed training file and the imputed / encoded frames
+                    of train_model.prepare_data, as Feather files in
+                    TRAIN_CACHE_DIR/features/<key>/, keyed by data hash, code
+                    and library versions. When a CSV has only grown by appended
+                    rows, the cached parse of the old file is reused and just
+                    the new bytes are read; imputation and encoding are then
+                    redone over the whole frame (they depend on whole-column
+                    modes / medians / category sets), so the result is the same
+                    as a cold run.
+
+The chunked trainer never holds the full frame, so only the run fingerprint
+applies to it. The newest FEATURE_CACHE_ENTRIES entries are kept.
+"""
+import os
+import io
+import json
+import shutil
+import hashlib
+import tempfile
+from importlib import metadata
+import joblib
+import pandas as pd
+from train_model import read_frame, prepare_data, MODELS_DIR
+from train_source import TRAIN_CACHE_DIR
+
+FEATURE_CACHE_DIR = os.path.join(TRAIN_CACHE_DIR, "features")
+FEATURE_CACHE_ENTRIES = int(os.getenv("FEATURE_CACHE_ENTRIES", "4"))
+FINGERPRINT_PATH = os.path.join(MODELS_DIR, "train_fingerprint.json")
+CODE_FILES = ["train_model.py", "train_streaming.py", "train_search.py", "train_source.py", "train_cache.py"]
+LIBRARIES = ["numpy", "pandas", "scikit-learn", "pyarrow", "joblib", "shap", "mlflow"]
+REQUIRED_ARTIFACTS = ["loan_model.pkl", "scaler.pkl", "label_encoders.pkl", "model_meta.json"]
+HASH_BLOCK = 1 << 20
+
+_digests = {}   # (path, size, mtime_ns) -> sha256, so one run hashes the data once
+
+
+def _sha256(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def file_digest(path, offsets=()):
+    """sha256 of the file, plus the sha256 of its first n bytes for each n in offsets."""
+    offsets = sorted(set(o for o in offsets if 0 < o <= os.path.getsize(path)))
+    digest, prefixes, position = hashlib.sha256(), {}, 0
+    with open(path, "rb") as f:
+        while True:
+            want = HASH_BLOCK
+            if offsets:
+                want = min(want, offsets[0] - position)
+            block = f.read(want)
+            if not block:
+                break
+            digest.update(block)
+            position += len(block)
+            if offsets and position == offsets[0]:
+                prefixes[offsets.pop(0)] = digest.copy().hexdigest()
+    return digest.hexdigest(), prefixes
+
+
+def data_digest(path):
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if key not in _digests:
+        _digests[key] = file_digest(path)[0]
+    return _digests[key]
+
+
+def environment():
+    """Training code and library versions — anything that can change the result for the same data."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    code = {}
+    for name in CODE_FILES:
+        with open(os.path.join(here, name), "rb") as f:
+            code[name] = hashlib.sha256(f.read()).hexdigest()
+    libraries = {}
+    for name in LIBRARIES:
+        try:
+            libraries[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            libraries[name] = None
+    return {"code": code, "libraries": libraries}
+
+
+# ── Run fingerprint ───────────────────────────────────────────────────────────
+
+def fingerprint(path, options):
+    components = {"data": data_digest(path), "options": options, **environment()}
+    return _sha256(components), components
+
+
+def unchanged(key):
+    """model_meta.json of the live artifacts if they were produced by this exact fingerprint, else None."""
+    try:
+        with open(FINGERPRINT_PATH) as f:
+            recorded = json.load(f)
+        with open(os.path.join(MODELS_DIR, "model_meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if recorded.get("fingerprint") != key or recorded.get("model_version") != meta.get("version"):
+        return None   # different inputs, or the model was replaced since (online update, manual copy)
+    if not all(os.path.exists(os.path.join(MODELS_DIR, name)) for name in REQUIRED_ARTIFACTS):
+        return None
+    return meta
+
+
+def record(key, components, meta):
+    with open(FINGERPRINT_PATH + ".tmp", "w") as f:
+        json.dump({"fingerprint": key, "model_version": meta["version"], "components": components}, f, indent=2)
+    os.replace(FINGERPRINT_PATH + ".tmp", FINGERPRINT_PATH)
+
+
+# ── Feature cache ─────────────────────────────────────────────────────────────
+
+def _entries():
+    try:
+        names = os.listdir(FEATURE_CACHE_DIR)
+    except OSError:
+        return []
+    entries = []
+    for name in names:
+        try:
+            with open(os.path.join(FEATURE_CACHE_DIR, name, "entry.json")) as f:
+                entries.append((name, json.load(f)))
+        except (OSError, ValueError):
+            continue   # half-written or foreign directory
+    return entries
+
+
+def _evict():
+    entries = sorted(_entries(), key=lambda e: os.path.getmtime(os.path.join(FEATURE_CACHE_DIR, e[0])),
+                     reverse=True)
+    for name, _ in entries[FEATURE_CACHE_ENTRIES:]:
+        shutil.rmtree(os.path.join(FEATURE_CACHE_DIR, name), ignore_errors=True)
+
+
+def _load_prepared(entry_dir):
+    raw_features = pd.read_feather(os.path.join(entry_dir, "raw_features.feather"))
+    X = pd.read_feather(os.path.join(entry_dir, "X.feather"))
+    y = X.pop("Loan_Status")
+    label_encoders = joblib.load(os.path.join(entry_dir, "label_encoders.pkl"))
+    os.utime(entry_dir)   # most recently used
+    return raw_features, X, y, label_encoders
+
+
+def _parse_appended(path, base, entry_dir):
+    """Cached parse of the file's first base['bytes'] bytes + a parse of the appended rows,
+    or None when the two parses infer different dtypes (e.g. "3+" first appears in a
+    column the head parsed as numbers) — only a full parse then gives the cold result."""
+    head = pd.read_feather(os.path.join(entry_dir, "parsed.feather"))
+    with open(path, "rb") as f:
+        f.seek(base["bytes"])
+        tail_bytes = f.read()
+    text_columns = {c: head[c].dtype for c in head.columns if not pd.api.types.is_numeric_dtype(head[c])}
+    tail = pd.read_csv(io.BytesIO(tail_bytes), header=None, names=list(head.columns), dtype=text_columns)
+    if not head.dtypes.equals(tail.dtypes):
+        return None
+    return pd.concat([head, tail], ignore_index=True)
+
+
+def _find_prefix(path, env_key):
+    """A cached entry (same code / libraries) whose data is a row-aligned prefix of this CSV."""
+    if path.lower().endswith(".parquet"):
+        return None
+    size = os.path.getsize(path)
+    candidates = [(name, e) for name, e in _entries()
+                  if e["env"] == env_key and e.get("csv") and e["ends_with_newline"] and e["bytes"] < size]
+    if not candidates:
+        return None
+    _, prefixes = file_digest(path, [e["bytes"] for _, e in candidates])
+    matches = [(name, e) for name, e in candidates if prefixes.get(e["bytes"]) == e["data"]]
+    return max(matches, key=lambda m: m[1]["bytes"]) if matches else None
+
+
+def prepared_frame(path):
+    """train_model.prepare_frame(path) through the feature cache."""
+    env = environment()
+    env_key = _sha256({"code": env["code"]["train_model.py"], "libraries": env["libraries"]})
+    data = data_digest(path)
+    key = _sha256({"data": data, "env": env_key})[:24]
+    entry_dir = os.path.join(FEATURE_CACHE_DIR, key)
+    if os.path.exists(os.path.join(entry_dir, "entry.json")):
+        print(f"Feature cache hit ({key[:12]})")
+        return _load_prepared(entry_dir)
+
+    parsed = None
+    base = _find_prefix(path, env_key)
+    if base:
+        name, base_entry = base
+        parsed = _parse_appended(path, base_entry, os.path.join(FEATURE_CACHE_DIR, name))
+        if parsed is None:
+            print("Feature cache: appended rows change the column types; parsing the whole file")
+        else:
+            print(f"Feature cache: reused the parse of {base_entry['rows']:,} cached rows, "
+                  f"read {len(parsed) - base_entry['rows']:,} appended rows")
+    if parsed is None:
+        parsed = read_frame(path)
+
+    os.makedirs(FEATURE_CACHE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=FEATURE_CACHE_DIR, prefix=".tmp-")
+    try:
+        parsed.to_feather(os.path.join(tmp, "parsed.feather"))
+        raw_features, X, y, label_encoders = prepare_data(parsed)
+        raw_features.reset_index(drop=True).to_feather(os.path.join(tmp, "raw_features.feather"))
+        X.assign(Loan_Status=y).reset_index(drop=True).to_feather(os.path.join(tmp, "X.feather"))
+        joblib.dump(label_encoders, os.path.join(tmp, "label_encoders.pkl"))
+        with open(path, "rb") as f:
+            f.seek(max(os.path.getsize(path) - 1, 0))
+            ends_with_newline = f.read(1) == b"\n"
+        with open(os.path.join(tmp, "entry.json"), "w") as f:
+            json.dump({"data": data, "env": env_key, "bytes": os.path.getsize(path), "rows": len(parsed),
+                       "csv": not path.lower().endswith(".parquet"), "ends_with_newline": ends_with_newline,
+                       "source": os.path.basename(path)}, f, indent=2)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    try:
+        os.rename(tmp, entry_dir)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)   # another run stored the same entry first
+    _evict()
+    return raw_features, X, y, label_encoders
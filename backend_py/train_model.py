@@ -1,7 +1,9 @@
 import pandas as pd
+import numpy as np
 import joblib
 import os
 import json
+import argparse
 import mlflow
 import mlflow.sklearn
 from sklearn.model_selection import train_test_split
@@ -10,71 +12,94 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score, f1_score
 from datetime import datetime
 
-# Set experiment name
-mlflow.set_experiment("Loan_Risk_Prediction")
+# Reference profile for the drift monitor: training column -> applications column
+PROFILE_NUMERIC = {
+    "ApplicantIncome": "applicant_income",
+    "CoapplicantIncome": "coapplicant_income",
+    "LoanAmount": "loan_amount",
+    "Loan_Amount_Term": "loan_term",
+}
+PROFILE_CATEGORICAL = {
+    "Gender": "gender", "Married": "married", "Dependents": "dependents",
+    "Education": "education", "Self_Employed": "self_employed",
+    "Credit_History": "credit_history", "Property_Area": "property_area",
+}
+PROFILE_QUANTILES = np.linspace(0.1, 0.9, 9)
 
-if not os.path.exists("models"):
-    os.makedirs("models")
 
-data = pd.read_csv("data/loan_data.csv")
+def quantile_histogram(values):
+    """Decile edges + the share of values in each width_bucket-style bin."""
+    values = np.asarray(values, dtype=float)
+    edges = np.unique(np.quantile(values, PROFILE_QUANTILES))
+    counts = np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1)
+    return {"edges": [round(float(e), 6) for e in edges],
+            "proportions": [round(float(c) / len(values), 6) for c in counts]}
 
-if "Loan_ID" in data.columns:
-    data.drop("Loan_ID", axis=1, inplace=True)
 
-for col in data.select_dtypes(include="object").columns:
-    data[col] = data[col].fillna(data[col].mode()[0])
+def build_reference_profile(raw, scores):
+    profile = {"rows": int(len(raw)), "numeric": {}, "categorical": {}}
+    for col, db_col in PROFILE_NUMERIC.items():
+        values = raw[col].astype(float)
+        if col == "LoanAmount":
+            values = values * 1000  # trained in ₹ thousands; applications stores real ₹
+        profile["numeric"][db_col] = quantile_histogram(values)
+    for col, db_col in PROFILE_CATEGORICAL.items():
+        values = raw[col]
+        if col == "Credit_History":
+            values = values.astype(int)
+        shares = values.astype(str).value_counts(normalize=True)
+        profile["categorical"][db_col] = {str(k): round(float(v), 6) for k, v in shares.items()}
+    profile["score"] = quantile_histogram(scores)
+    return profile
 
-for col in data.select_dtypes(include="number").columns:
-    data[col] = data[col].fillna(data[col].median())
+MODELS_DIR = "models"
+DATA_PATH = "data/loan_data.csv"
+DEFAULT_PARAMS = {"max_iter": 1000, "C": 1.0, "solver": "lbfgs"}
 
-data["Loan_Status"] = data["Loan_Status"].map({"Y": 1, "N": 0})
 
-label_encoders = {}
-for col in data.select_dtypes(include="object").columns:
-    le = LabelEncoder()
-    data[col] = le.fit_transform(data[col])
-    label_encoders[col] = le
+def build_explainer(model, shap_background):
+    """The SHAP explainer the API serves for this model (raises if shap cannot build one)."""
+    import shap
+    if hasattr(model, "coef_"):
+        return shap.LinearExplainer(model, shap_background)
+    explainer = shap.TreeExplainer(model)   # search-selected tree ensembles
+    sample = explainer.shap_values(shap_background[:1])
+    if not isinstance(sample, list) and np.ndim(sample) != 2:
+        raise ValueError(f"per-class SHAP output {np.shape(sample)} is not what the API reads")
+    return explainer
 
-X = data.drop("Loan_Status", axis=1)
-y = data["Loan_Status"]
 
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
+def write_profile(profile, model_version):
+    """Reference histograms for PSI/KS drift checks (read by monitoring.py)."""
+    profile["model_version"] = model_version
+    with open(os.path.join(MODELS_DIR, "reference_profile.json"), "w") as pf:
+        json.dump(profile, pf)
 
-X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
-
-with mlflow.start_run():
-    # Model Hyperparameters
-    params = {"max_iter": 1000, "C": 1.0, "solver": "lbfgs"}
-    mlflow.log_params(params)
-
-    model = LogisticRegression(**params)
-    model.fit(X_train, y_train)
-
-    # Predictions and Metrics
-    y_pred = model.predict(X_test)
-    acc = accuracy_score(y_test, y_pred)
-    f1 = f1_score(y_test, y_pred)
 
+def save_artifacts(model, scaler, label_encoders, shap_background, acc, f1, profile, extra_meta=None):
+    """Write the artifact set the API loads (models/*.pkl, model_meta.json, reference_profile.json).
+    Must run inside an MLflow run. extra_meta is merged into model_meta.json."""
     mlflow.log_metric("accuracy", acc)
     mlflow.log_metric("f1_score", f1)
 
     # Save artifacts locally
-    joblib.dump(model, "models/loan_model.pkl")
-    joblib.dump(scaler, "models/scaler.pkl")
-    joblib.dump(label_encoders, "models/label_encoders.pkl")
+    joblib.dump(model, os.path.join(MODELS_DIR, "loan_model.pkl"))
+    joblib.dump(scaler, os.path.join(MODELS_DIR, "scaler.pkl"))
+    joblib.dump(label_encoders, os.path.join(MODELS_DIR, "label_encoders.pkl"))
 
     # Log model to MLflow
     mlflow.sklearn.log_model(model, "loan_risk_model")
 
     # SHAP Explainability — optional (may fail if numba/shap incompatible with NumPy 2.x)
+    explainer_path = os.path.join(MODELS_DIR, "shap_explainer.pkl")
     try:
-        import shap
-        explainer = shap.LinearExplainer(model, X_train)
-        joblib.dump(explainer, "models/shap_explainer.pkl")
+        explainer = build_explainer(model, shap_background)
+        joblib.dump(explainer, explainer_path)
         print("SHAP explainer saved.")
     except Exception as shap_err:
-        print(f"SHAP explainer skipped (NumPy compatibility issue): {shap_err}")
+        if os.path.exists(explainer_path):
+            os.remove(explainer_path)   # would explain the previous model
+        print(f"SHAP explainer skipped: {shap_err}")
 
     # Save model metadata for Admin Panel UI (read by /admin/model-info)
     meta = {
@@ -82,11 +107,172 @@ with mlflow.start_run():
         "trained_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
         "accuracy": round(float(acc), 4),
         "f1": round(float(f1), 4),
+        **(extra_meta or {}),
     }
-    with open("models/model_meta.json", "w") as mf:
+    with open(os.path.join(MODELS_DIR, "model_meta.json"), "w") as mf:
         json.dump(meta, mf)
 
+    write_profile(profile, meta["version"])
+
     # Output format must match app.py parser: "Accuracy: X.XXXX, F1: Y.YYYY"
     print(f"Model Trained. Accuracy: {acc:.4f}, F1: {f1:.4f}")
     print("Logged to MLflow successfully.")
+    return meta
+
+
+def read_frame(path=DATA_PATH):
+    return pd.read_parquet(path) if path.lower().endswith(".parquet") else pd.read_csv(path)
+
+
+def prepare_data(data):
+    """Full-frame imputation and label encoding of a parsed training file (modified in place).
+    Returns (raw_features, X, y, label_encoders); raw_features is imputed but not encoded."""
+    if "Loan_ID" in data.columns:
+        data.drop("Loan_ID", axis=1, inplace=True)
+
+    for col in data.select_dtypes(include="object").columns:
+        data[col] = data[col].fillna(data[col].mode()[0])
+
+    for col in data.select_dtypes(include="number").columns:
+        data[col] = data[col].fillna(data[col].median())
+
+    data["Loan_Status"] = data["Loan_Status"].map({"Y": 1, "N": 0})
+
+    # Raw (imputed, un-encoded) features — the drift monitor's reference distribution
+    raw_features = data.drop("Loan_Status", axis=1).copy()
+
+    label_encoders = {}
+    for col in data.select_dtypes(include="object").columns:
+        le = LabelEncoder()
+        data[col] = le.fit_transform(data[col])
+        label_encoders[col] = le
+
+    X = data.drop("Loan_Status", axis=1)
+    y = data["Loan_Status"]
+    return raw_features, X, y, label_encoders
+
+
+def prepare_frame(path=DATA_PATH):
+    return prepare_data(read_frame(path))
+
+
+def write_live_reference_profile(path=DATA_PATH):
+    """reference_profile.json for the model already in models/, without retraining:
+    the training file's histograms and the live model's scores on it."""
+    raw_features, X, _, _ = prepare_frame(path)
+    model = joblib.load(os.path.join(MODELS_DIR, "loan_model.pkl"))
+    scaler = joblib.load(os.path.join(MODELS_DIR, "scaler.pkl"))
+    label_encoders = joblib.load(os.path.join(MODELS_DIR, "label_encoders.pkl"))
+    for col, le in label_encoders.items():   # the live encoders, not the ones just fitted
+        X[col] = le.transform(raw_features[col])
+    scores = model.predict_proba(scaler.transform(X))[:, 1]
+    with open(os.path.join(MODELS_DIR, "model_meta.json")) as f:
+        version = json.load(f)["version"]
+    write_profile(build_reference_profile(raw_features, scores), version)
+    print(f"Reference profile written for model version {version} ({len(raw_features):,} rows).")
+
+
+def train_in_memory(path=DATA_PATH, params=None, run_params=None):
+    """Original pipeline: prepared frame (see train_cache.py), scaler on the full frame, lbfgs fit."""
+    from train_cache import prepared_frame
+    raw_features, X, y, label_encoders = prepared_frame(path)
+
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+
+    X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
+
+    with mlflow.start_run():
+        # Model Hyperparameters
+        params = params or dict(DEFAULT_PARAMS)
+        mlflow.log_params({**params, **(run_params or {})})
+
+        model = LogisticRegression(**params)
+        model.fit(X_train, y_train)
+
+        # Predictions and Metrics
+        y_pred = model.predict(X_test)
+        acc = accuracy_score(y_test, y_pred)
+        f1 = f1_score(y_test, y_pred)
+
+        profile = build_reference_profile(raw_features, model.predict_proba(X_scaled)[:, 1])
+        return save_artifacts(model, scaler, label_encoders, X_train, acc, f1, profile)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the loan risk model and write models/*.")
+    parser.add_argument("--data", default=DATA_PATH, help="training CSV or Parquet")
+    parser.add_argument("--source", choices=["file", "db"], default="file",
+                        help="db: labelled outcomes from the applications table (see train_source.py)")
+    parser.add_argument("--since", help="--source db: created_at >= this date (YYYY-MM-DD)")
+    parser.add_argument("--until", help="--source db: created_at < this date (YYYY-MM-DD)")
+    parser.add_argument("--sample", type=float, help="--source db: deterministic fraction of rows (0-1]")
+    parser.add_argument("--refresh-cache", action="store_true", help="--source db: refetch every row")
+    parser.add_argument("--chunked", action="store_true",
+                        help="out-of-core training in bounded memory (see train_streaming.py)")
+    parser.add_argument("--chunk-size", type=int, default=200_000, help="--chunked: rows per chunk")
+    parser.add_argument("--epochs", type=int, default=5, help="--chunked: passes of partial_fit")
+    parser.add_argument("--search", action="store_true",
+                        help="parallel model / hyperparameter search with a promotion gate (see train_search.py)")
+    parser.add_argument("--strategy", choices=["grid", "random"], default="grid", help="--search: candidate set")
+    parser.add_argument("--trials", type=int, default=30, help="--search --strategy random: candidates to try")
+    parser.add_argument("--budget", type=float, default=600, help="--search: wall-clock seconds for the trials")
+    parser.add_argument("--workers", type=int, help="--search: pool processes (default: CPU count)")
+    parser.add_argument("--folds", type=int, default=5, help="--search: cross-validation folds")
+    parser.add_argument("--metric", choices=["f1", "accuracy"], default="f1", help="--search: CV ranking metric")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="--search: allowed hold-out accuracy / F1 shortfall vs the default model")
+    parser.add_argument("--max-row-ms", type=float, default=5.0, help="--search: single-row predict + SHAP latency limit (p50)")
+    parser.add_argument("--max-batch-ms", type=float, default=250.0, help="--search: 10k-row predict + SHAP latency limit")
+    parser.add_argument("--max-artifact-mb", type=float, default=20.0, help="--search: pickled model + explainer size limit")
+    parser.add_argument("--reference-profile", action="store_true",
+                        help="only write models/reference_profile.json for the live model from --data (no retrain)")
+    parser.add_argument("--force", action="store_true",
+                        help="retrain even if data, options, code and libraries are unchanged (see train_cache.py)")
+    args = parser.parse_args()
+    if args.search and args.chunked:
+        parser.error("--search trains in memory; it cannot be combined with --chunked")
+    if args.reference_profile:
+        write_live_reference_profile(args.data)
+        return
+
+    # Set experiment name
+    mlflow.set_experiment("Loan_Risk_Prediction")
+    os.makedirs(MODELS_DIR, exist_ok=True)
+
+    path, run_params = args.data, {"source": args.source}
+    if args.source == "db":
+        from train_source import materialize
+        path, summary = materialize(since=args.since, until=args.until, sample=args.sample,
+                                    refresh=args.refresh_cache)
+        print(f"Training rows from applications: {summary['rows']:,} "
+              f"({summary['fetched_into_cache']:,} newly cached, {summary['uncached_tail_rows']:,} uncached)")
+        run_params.update({k: v for k, v in summary.items() if v is not None})
+
+    from train_cache import fingerprint, unchanged, record
+    options = {k: v for k, v in vars(args).items() if k not in ("data", "force", "refresh_cache")}
+    key, components = fingerprint(path, {**options, "default_params": DEFAULT_PARAMS})
+    meta = None if args.force else unchanged(key)
+    if meta:
+        print(f"Training inputs unchanged (fingerprint {key[:12]}); keeping model version {meta['version']}.")
+        print(f"Model unchanged. Accuracy: {meta['accuracy']:.4f}, F1: {meta['f1']:.4f}")
+        return
+
+    if args.search:
+        from train_search import search
+        meta = search(path, strategy=args.strategy, trials=args.trials, budget=args.budget,
+                      workers=args.workers, folds=args.folds, metric=args.metric, run_params=run_params,
+                      limits={"tolerance": args.tolerance, "max_row_ms": args.max_row_ms,
+                              "max_batch_ms": args.max_batch_ms, "max_artifact_mb": args.max_artifact_mb})
+        if meta is None:
+            raise SystemExit(1)
+    elif args.chunked:
+        from train_streaming import train_chunked
+        meta = train_chunked(path, chunk_rows=args.chunk_size, epochs=args.epochs, run_params=run_params)
+    else:
+        meta = train_in_memory(path, run_params=run_params)
+    record(key, components, meta)
+
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+train_search.py — Parallel model / hyperparameter search (python train_model.py --search)
+Candidates come from SEARCH_SPACE: logistic regression (C, class weights) and
+two tree ensembles (histogram gradient boosting, random forest). --strategy
+grid runs every combination; random runs a seeded sample of --trials of them.
+Each trial is scored by stratified k-fold cross-validation on the training
+split in a process pool; trials still running when the --budget (seconds)
+runs out are abandoned. Every finished trial is a nested MLflow run under one
+search run.
+
+Candidates are then taken best-first (by CV --metric) through the promotion
+gate, measured in this process once the pool has stopped:
+
+  quality   hold-out accuracy and F1 no worse than the current default model
+            (DEFAULT_PARAMS, refit on the same split) by more than --tolerance
+  latency   p50 single-row predict_proba + SHAP values <= --max-row-ms and
+            the same on 10k rows <= --max-batch-ms (the explainer is the one
+            save_artifacts would write; without shap only predict_proba)
+  size      pickled model + explainer <= --max-artifact-mb
+
+The first candidate that passes is written through save_artifacts; if none
+does, models/ is left untouched and the command exits non-zero.
+"""
+import io
+import os
+import time
+import random
+import itertools
+import multiprocessing
+import joblib
+import numpy as np
+import mlflow
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.preprocessing import StandardScaler
+from train_model import build_explainer, build_reference_profile, save_artifacts, DEFAULT_PARAMS
+from train_cache import prepared_frame
+
+SEARCH_SPACE = {
+    "logistic_regression": {
+        "C": [0.01, 0.03, 0.1, 0.3, 1.0, 3.0, 10.0],
+        "class_weight": [None, "balanced"],
+    },
+    "hist_gradient_boosting": {
+        "learning_rate": [0.03, 0.1, 0.3],
+        "max_leaf_nodes": [7, 15, 31],
+        "l2_regularization": [0.0, 1.0],
+        "class_weight": [None, "balanced"],
+    },
+    "random_forest": {
+        "n_estimators": [100, 300],
+        "max_depth": [4, 8, None],
+        "min_samples_leaf": [1, 5],
+        "class_weight": [None, "balanced"],
+    },
+}
+BASELINE = ("logistic_regression", {"C": DEFAULT_PARAMS["C"], "class_weight": None})
+LATENCY_ROW_CALLS = 200
+LATENCY_BATCH_ROWS = 10_000
+LATENCY_BATCH_CALLS = 5
+BATCH_TIMING_CUTOFF_SECONDS = 5
+
+_X = _y = _folds = None
+
+
+def build_estimator(family, params, seed=42):
+    if family == "logistic_regression":
+        return LogisticRegression(max_iter=DEFAULT_PARAMS["max_iter"], solver=DEFAULT_PARAMS["solver"], **params)
+    if family == "hist_gradient_boosting":
+        return HistGradientBoostingClassifier(max_iter=200, random_state=seed, **params)
+    if family == "random_forest":
+        return RandomForestClassifier(n_jobs=1, random_state=seed, **params)
+    raise ValueError(f"unknown model family {family!r}")
+
+
+def candidates(strategy, trials, seed):
+    """(family, params) pairs; the baseline configuration is always first."""
+    grid = [(family, dict(zip(space, values)))
+            for family, space in SEARCH_SPACE.items()
+            for values in itertools.product(*space.values())]
+    grid.remove(BASELINE)
+    if strategy == "random":
+        grid = random.Random(seed).sample(grid, min(max(trials - 1, 0), len(grid)))
+    return [BASELINE] + grid
+
+
+# ── Trials (pool workers) ─────────────────────────────────────────────────────
+
+def _init_worker(X, y, folds):
+    global _X, _y, _folds
+    _X, _y, _folds = X, y, folds
+
+
+def _run_trial(trial):
+    family, params = trial
+    accs, f1s, fit_seconds = [], [], 0.0
+    for train, test in _folds:
+        model = build_estimator(family, params)
+        start = time.perf_counter()
+        model.fit(_X[train], _y[train])
+        fit_seconds += time.perf_counter() - start
+        pred = model.predict(_X[test])
+        accs.append(accuracy_score(_y[test], pred))
+        f1s.append(f1_score(_y[test], pred, zero_division=0))
+    return {"family": family, "params": params,
+            "cv_accuracy": float(np.mean(accs)), "cv_accuracy_std": float(np.std(accs)),
+            "cv_f1": float(np.mean(f1s)), "cv_f1_std": float(np.std(f1s)),
+            "fit_seconds": round(fit_seconds / len(_folds), 4)}
+
+
+def run_trials(trials, X, y, folds, workers, budget):
+    """Cross-validate trials in a process pool until done or `budget` seconds pass."""
+    deadline = time.monotonic() + budget
+    results = []
+    pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(X, y, folds))
+    try:
+        pending = pool.imap_unordered(_run_trial, trials)
+        while len(results) < len(trials):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                result = pending.next(timeout=remaining)
+            except multiprocessing.TimeoutError:
+                break
+            results.append(result)
+            yield result
+    finally:
+        pool.terminate()   # abandon whatever is still running past the budget
+        pool.join()
+    if len(results) < len(trials):
+        print(f"Budget of {budget:.0f}s reached: {len(results)}/{len(trials)} trials finished")
+
+
+# ── Promotion gate ────────────────────────────────────────────────────────────
+
+def measure_serving_cost(model, X, shap_background):
+    """Single-row and 10k-row latency (ms) of what /predict serves — predict_proba
+    plus SHAP values from the explainer save_artifacts would write — and pickled
+    size (MB) of model and explainer."""
+    try:
+        explainer = build_explainer(model, shap_background)
+    except Exception as e:
+        print(f"SHAP explainer unavailable ({e}); timing predict_proba only.")
+        explainer = None
+
+    def serve(rows):
+        model.predict_proba(rows)
+        if explainer is not None:
+            explainer.shap_values(rows)
+
+    row = X[:1]
+    batch = X[np.arange(LATENCY_BATCH_ROWS) % len(X)]
+    for _ in range(20):
+        serve(row)
+    timings = []
+    for _ in range(LATENCY_ROW_CALLS):
+        start = time.perf_counter()
+        serve(row)
+        timings.append(time.perf_counter() - start)
+    batch_timings = []
+    for _ in range(LATENCY_BATCH_CALLS):
+        start = time.perf_counter()
+        serve(batch)
+        batch_timings.append(time.perf_counter() - start)
+        if batch_timings[-1] > BATCH_TIMING_CUTOFF_SECONDS:   # exact SHAP on big ensembles: one call says enough
+            break
+    buf = io.BytesIO()
+    joblib.dump((model, explainer), buf)
+    return {"row_p50_ms": round(float(np.median(timings)) * 1000, 4),
+            "row_p99_ms": round(float(np.percentile(timings, 99)) * 1000, 4),
+            "batch_10k_ms": round(min(batch_timings) * 1000, 2),
+            "artifact_mb": round(buf.tell() / 2**20, 3)}
+
+
+def gate(holdout, cost, floor, limits):
+    """Reasons a candidate may not be promoted (empty list = promote)."""
+    reasons = []
+    for metric in ("accuracy", "f1"):
+        if holdout[metric] < floor[metric] - limits["tolerance"]:
+            reasons.append(f"hold-out {metric} {holdout[metric]:.4f} < default model {floor[metric]:.4f}")
+    if cost["row_p50_ms"] > limits["max_row_ms"]:
+        reasons.append(f"single-row latency {cost['row_p50_ms']} ms > {limits['max_row_ms']} ms")
+    if cost["batch_10k_ms"] > limits["max_batch_ms"]:
+        reasons.append(f"10k-row latency {cost['batch_10k_ms']} ms > {limits['max_batch_ms']} ms")
+    if cost["artifact_mb"] > limits["max_artifact_mb"]:
+        reasons.append(f"artifact {cost['artifact_mb']} MB > {limits['max_artifact_mb']} MB")
+    return reasons
+
+
+def _holdout_scores(model, X, y):
+    pred = model.predict(X)
+    return {"accuracy": float(accuracy_score(y, pred)), "f1": float(f1_score(y, pred, zero_division=0))}
+
+
+def _label(result):
+    params = ",".join(f"{k}={v}" for k, v in result["params"].items())
+    return f"{result['family']}({params})"
+
+
+def search(path, strategy="grid", trials=30, budget=600, workers=None, folds=5, metric="f1",
+           gate_top=5, limits=None, seed=42, run_params=None):
+    """Run the search and promote the best candidate that passes the gate. Returns its meta or None."""
+    limits = {"tolerance": 0.01, "max_row_ms": 5.0, "max_batch_ms": 250.0, "max_artifact_mb": 20.0,
+              **(limits or {})}
+    workers = workers or os.cpu_count() or 1
+    raw_features, X_frame, y_frame, label_encoders = prepared_frame(path)
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X_frame)
+    y = y_frame.to_numpy()
+    # Same split as train_in_memory, so hold-out numbers are comparable with a plain retrain
+    X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
+    cv = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(X_train, y_train))
+    plan = candidates(strategy, trials, seed)
+    print(f"Search: {len(plan)} candidates, {folds}-fold CV, {workers} workers, budget {budget:.0f}s")
+
+    with mlflow.start_run(run_name=f"search-{strategy}"):
+        mlflow.log_params({"mode": "search", "strategy": strategy, "candidates": len(plan), "folds": folds,
+                           "workers": workers, "budget_seconds": budget, "metric": metric,
+                           **{f"gate_{k}": v for k, v in limits.items()}, **(run_params or {})})
+        results = []
+        for result in run_trials(plan, X_train, y_train, cv, workers, budget):
+            results.append(result)
+            with mlflow.start_run(run_name=_label(result), nested=True):
+                mlflow.log_params({"family": result["family"], **result["params"]})
+                for key in ("cv_accuracy", "cv_accuracy_std", "cv_f1", "cv_f1_std", "fit_seconds"):
+                    mlflow.log_metric(key, result[key])
+        mlflow.log_metric("trials_finished", len(results))
+        if not results:
+            print("No trial finished within the budget; nothing promoted.")
+            return None
+
+        baseline = build_estimator(*BASELINE).fit(X_train, y_train)
+        floor = _holdout_scores(baseline, X_test, y_test)
+        ranked = sorted(results, key=lambda r: (r[f"cv_{metric}"], r["cv_accuracy"]), reverse=True)
+        for rank, result in enumerate(ranked[:gate_top], 1):
+            model = build_estimator(result["family"], result["params"]).fit(X_train, y_train)
+            holdout = _holdout_scores(model, X_test, y_test)
+            cost = measure_serving_cost(model, X_test, X_train)
+            reasons = gate(holdout, cost, floor, limits)
+            with mlflow.start_run(run_name=f"gate-{rank}:{_label(result)}", nested=True):
+                mlflow.log_params({"family": result["family"], **result["params"], "promoted": not reasons})
+                for key, value in {**{f"holdout_{k}": v for k, v in holdout.items()}, **cost}.items():
+                    mlflow.log_metric(key, value)
+            verdict = "PROMOTE" if not reasons else "reject: " + "; ".join(reasons)
+            print(f"#{rank} {_label(result)} cv_{metric}={result[f'cv_{metric}']:.4f} "
+                  f"hold-out acc={holdout['accuracy']:.4f} f1={holdout['f1']:.4f} "
+                  f"row={cost['row_p50_ms']}ms 10k={cost['batch_10k_ms']}ms {cost['artifact_mb']}MB -> {verdict}")
+            if reasons:
+                continue
+
+            profile = build_reference_profile(raw_features, model.predict_proba(X_scaled)[:, 1])
+            return save_artifacts(model, scaler, label_encoders, X_train, holdout["accuracy"], holdout["f1"],
+                                  profile, extra_meta={"model_type": result["family"],
+                                                       "params": result["params"],
+                                                       "cv": {"accuracy": round(result["cv_accuracy"], 4),
+                                                              "f1": round(result["cv_f1"], 4)},
+                                                       "serving_cost": cost})
+        print(f"None of the top {min(gate_top, len(ranked))} candidates passed the promotion gate; "
+              f"models/ left unchanged.")
+        return None
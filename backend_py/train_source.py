@@ -0,0 +1,221 @@
+"""
+train_source.py — Training data from the applications table (python train_model.py --source db)
+Labelled outcomes are rows whose final status is Approved (Y) or Rejected (N).
+They are streamed through a named server-side cursor and kept in a local
+columnar cache (Parquet segments in TRAIN_CACHE_DIR) keyed by a label
+watermark: the highest id below which every application has a final status.
+Applications still open after SETTLE_DAYS are treated as never labelled, so
+one forgotten row cannot hold the watermark back forever.
+
+A retrain fetches only (cached watermark, current watermark] into a new
+segment, plus the few labelled rows above the current watermark (not cached,
+since open rows below them may still be labelled). Status changes on rows
+that were already final when cached are not seen; use --refresh-cache after
+bulk relabelling.
+
+The date window (--since / --until on created_at) and --sample (deterministic
+by id hash, so repeat runs see the same rows) are applied when the training
+file is materialized, so changing them never refetches.
+"""
+import os
+import json
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from db import get_connection
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRAIN_CACHE_DIR = os.getenv("TRAIN_CACHE_DIR", os.path.join(os.path.dirname(__file__), "data", "train_cache"))
+SETTLE_DAYS = int(os.getenv("TRAIN_SETTLE_DAYS", "90"))
+FETCH_ROWS = 50_000
+MANIFEST = "manifest.json"
+FINAL_STATUSES = ("Approved", "Rejected")
+DB_COLUMNS = ["id", "created_at", "gender", "married", "dependents", "education", "self_employed",
+              "applicant_income", "coapplicant_income", "loan_amount", "loan_term", "credit_history",
+              "property_area", "status"]
+TRAINING_COLUMNS = ["Loan_ID", "Gender", "Married", "Dependents", "Education", "Self_Employed",
+                    "ApplicantIncome", "CoapplicantIncome", "LoanAmount", "Loan_Amount_Term",
+                    "Credit_History", "Property_Area", "Loan_Status"]
+HASH_MULTIPLIER = 2654435761   # Knuth multiplicative hash for id sampling
+HASH_MODULUS = 2**32
+
+
+def label_watermark(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT COALESCE(
+            (SELECT MIN(id) - 1 FROM applications
+              WHERE status NOT IN %s AND created_at >= NOW() - make_interval(days => %s)),
+            (SELECT MAX(id) FROM applications),
+            0)
+    """, (FINAL_STATUSES, SETTLE_DAYS))
+    watermark = cur.fetchone()[0]
+    cur.close()
+    return watermark
+
+
+def stream_labelled(conn, low, high=None, chunk_rows=FETCH_ROWS):
+    """Yield DataFrames of final-status rows with low < id <= high through a named cursor."""
+    cur = conn.cursor(name=f"train_fetch_{low}")
+    cur.itersize = chunk_rows
+    cur.execute(f"""
+        SELECT {', '.join(DB_COLUMNS)} FROM applications
+         WHERE id > %s {'AND id <= %s' if high is not None else ''} AND status IN %s
+         ORDER BY id
+    """, (low, high, FINAL_STATUSES) if high is not None else (low, FINAL_STATUSES))
+    try:
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield pd.DataFrame(rows, columns=DB_COLUMNS)
+    finally:
+        cur.close()
+
+
+def _load_manifest():
+    try:
+        with open(os.path.join(TRAIN_CACHE_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"watermark": 0, "segments": [], "rows": 0}
+
+
+def _save_manifest(manifest):
+    path = os.path.join(TRAIN_CACHE_DIR, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _schema(columns):
+    """Fixed Arrow schema, so a chunk with an all-null column cannot change the file's types."""
+    import pyarrow as pa
+    types = {"id": pa.int64(), "created_at": pa.timestamp("us")}
+    numeric = {"applicant_income", "coapplicant_income", "loan_amount", "loan_term", "credit_history",
+               "ApplicantIncome", "CoapplicantIncome", "LoanAmount", "Loan_Amount_Term", "Credit_History"}
+    return pa.schema([(c, types.get(c, pa.float64() if c in numeric else pa.string())) for c in columns])
+
+
+def _write_parquet(chunks, path, schema):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer, rows = None, 0
+    try:
+        for df in chunks:
+            table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path + ".tmp", schema, compression="zstd")
+            writer.write_table(table)
+            rows += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        os.replace(path + ".tmp", path)
+    return rows
+
+
+def sync_cache(conn, refresh=False):
+    """Bring the segment cache up to the current label watermark. Returns (manifest, fetched rows)."""
+    os.makedirs(TRAIN_CACHE_DIR, exist_ok=True)
+    manifest = _load_manifest()
+    watermark = label_watermark(conn)
+    if refresh or watermark < manifest["watermark"]:   # explicit refresh, or the table was reset
+        for name in manifest["segments"]:
+            try:
+                os.remove(os.path.join(TRAIN_CACHE_DIR, name))
+            except OSError:
+                pass
+        manifest = {"watermark": 0, "segments": [], "rows": 0}
+
+    fetched = 0
+    if watermark > manifest["watermark"]:
+        name = f"applications_{manifest['watermark'] + 1}_{watermark}.parquet"
+        fetched = _write_parquet(stream_labelled(conn, manifest["watermark"], watermark),
+                                 os.path.join(TRAIN_CACHE_DIR, name), _schema(DB_COLUMNS))
+        if fetched:
+            manifest["segments"].append(name)
+        manifest["watermark"] = watermark
+        manifest["rows"] += fetched
+        manifest["synced_at"] = datetime.now().isoformat(timespec="seconds")
+        _save_manifest(manifest)
+    return manifest, fetched
+
+
+def _cached_chunks(manifest, chunk_rows):
+    import pyarrow.parquet as pq
+    for name in manifest["segments"]:
+        for batch in pq.ParquetFile(os.path.join(TRAIN_CACHE_DIR, name)).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+
+
+def _keep(df, since, until, sample):
+    mask = np.ones(len(df), dtype=bool)
+    created = pd.to_datetime(df["created_at"])
+    if since is not None:
+        mask &= (created >= pd.Timestamp(since)).to_numpy()
+    if until is not None:
+        mask &= (created < pd.Timestamp(until)).to_numpy()
+    if sample is not None and sample < 1:
+        hashed = (df["id"].to_numpy(dtype=np.uint64) * np.uint64(HASH_MULTIPLIER)) % np.uint64(HASH_MODULUS)
+        mask &= hashed < np.uint64(int(sample * HASH_MODULUS))
+    return df[mask]
+
+
+def to_training_schema(df):
+    """applications rows -> the loan_data.csv schema (LoanAmount back in ₹ thousands)."""
+    return pd.DataFrame({
+        "Loan_ID": "APP" + df["id"].astype(str),
+        "Gender": df["gender"].astype(object),
+        "Married": df["married"].astype(object),
+        "Dependents": df["dependents"].astype(object),
+        "Education": df["education"].astype(object),
+        "Self_Employed": df["self_employed"].astype(object),
+        "ApplicantIncome": df["applicant_income"].astype(float),
+        "CoapplicantIncome": df["coapplicant_income"].astype(float),
+        "LoanAmount": df["loan_amount"].astype(float) / 1000,
+        "Loan_Amount_Term": df["loan_term"].astype(float),
+        "Credit_History": df["credit_history"].astype(float),
+        "Property_Area": df["property_area"].astype(object),
+        "Loan_Status": np.where(df["status"] == "Approved", "Y", "N"),
+    })
+
+
+def materialize(since=None, until=None, sample=None, refresh=False, chunk_rows=FETCH_ROWS):
+    """
+    Sync the cache and write the selected rows, in the training schema, to
+    TRAIN_CACHE_DIR/training.parquet. Returns (path, summary).
+    """
+    conn = get_connection()
+    try:
+        manifest, fetched = sync_cache(conn, refresh)
+
+        tail = {"rows": 0}
+
+        def rows():
+            yield from _cached_chunks(manifest, chunk_rows)
+            for df in stream_labelled(conn, manifest["watermark"], chunk_rows=chunk_rows):
+                tail["rows"] += len(df)
+                yield df
+
+        def selected():
+            for df in rows():
+                kept = _keep(df, since, until, sample)
+                if len(kept):
+                    yield to_training_schema(kept)
+
+        path = os.path.join(TRAIN_CACHE_DIR, "training.parquet")
+        written = _write_parquet(selected(), path, _schema(TRAINING_COLUMNS))
+        conn.commit()   # close the read transaction of the named cursors
+    finally:
+        conn.close()
+
+    if not written:
+        raise ValueError("No labelled applications (status Approved/Rejected) match the selection")
+    summary = {"rows": written, "cached_rows": manifest["rows"], "fetched_into_cache": fetched,
+               "uncached_tail_rows": tail["rows"], "watermark": manifest["watermark"],
+               "since": since, "until": until, "sample": sample}
+    return path, summary
@@ -0,0 +1,225 @@
+"""
+train_streaming.py — Out-of-core training (python train_model.py --chunked)
+Streams the training file in chunks so memory is bounded by the chunk size and
+a fixed-size row sample, whatever the dataset size:
+
+  pass 1     per-column category counts, numeric moments (Chan's parallel
+             mean/M2 merge) and null counts, plus a uniform reservoir sample
+             of rows. Modes come from the counts, medians from the sample, and
+             the scaler moments are derived exactly from the moments once the
+             imputed values are folded in — no second pass needed.
+  passes 2-N SGD (log loss, averaged) partial_fit over the training rows of each
+             chunk, --epochs times. The train/test split is a seeded per-chunk
+             mask, identical in every pass.
+  last pass  hold-out accuracy / F1 from streamed confusion counts.
+
+The result is written through train_model.save_artifacts, so the artifact set
+is the same as the in-memory pipeline: the SGD weights are carried over into a
+LogisticRegression, the scaler is a StandardScaler, and the encoders are
+LabelEncoders. The drift reference profile and the SHAP background come from
+the reservoir sample.
+"""
+import os
+from collections import Counter
+import numpy as np
+import pandas as pd
+import mlflow
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from train_model import build_reference_profile, save_artifacts, DEFAULT_PARAMS
+
+CATEGORICAL = ["Gender", "Married", "Dependents", "Education", "Self_Employed", "Property_Area"]
+NUMERIC = ["ApplicantIncome", "CoapplicantIncome", "LoanAmount", "Loan_Amount_Term", "Credit_History"]
+FEATURES = ["Gender", "Married", "Dependents", "Education", "Self_Employed",
+            "ApplicantIncome", "CoapplicantIncome", "LoanAmount", "Loan_Amount_Term",
+            "Credit_History", "Property_Area"]
+TARGET = "Loan_Status"
+DTYPES = {**{c: "object" for c in CATEGORICAL + [TARGET]}, **{c: "float64" for c in NUMERIC}}
+
+RESERVOIR_ROWS = 100_000
+SHAP_BACKGROUND_ROWS = 10_000
+TEST_SIZE = 0.2
+
+
+def iter_chunks(path, chunk_rows):
+    """Training-schema chunks with fixed dtypes (a chunk without '3+' must not turn Dependents numeric)."""
+    if path.lower().endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=FEATURES + [TARGET]):
+            df = batch.to_pandas()
+            for col in CATEGORICAL + [TARGET]:
+                df[col] = df[col].astype("object").where(df[col].notna(), None)
+            yield df.astype({c: "float64" for c in NUMERIC})
+    else:
+        yield from pd.read_csv(path, usecols=FEATURES + [TARGET], dtype=DTYPES, chunksize=chunk_rows)
+
+
+# ── Pass 1: streaming statistics ──────────────────────────────────────────────
+
+class _Moments:
+    """Count / mean / M2 of a numeric column, mergeable chunk by chunk."""
+
+    def __init__(self):
+        self.n, self.mean, self.m2 = 0, 0.0, 0.0
+
+    def merge(self, n, mean, m2):
+        if n == 0:
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.n * n / total
+        self.n = total
+
+    def add(self, values):
+        values = values[~np.isnan(values)]
+        if len(values):
+            mean = values.mean()
+            self.merge(len(values), mean, float(((values - mean) ** 2).sum()))
+
+
+def _mode(counts):
+    """pandas mode()[0] semantics: most frequent, smallest value on ties."""
+    top = max(counts.values())
+    return min(v for v, c in counts.items() if c == top)
+
+
+def _reservoir_merge(reservoir, keys, chunk, rng, size):
+    """Keep the `size` rows with the smallest uniform keys seen so far (a uniform sample)."""
+    chunk_keys = rng.random(len(chunk))
+    rows = chunk if reservoir is None else pd.concat([reservoir, chunk], ignore_index=True)
+    keys = chunk_keys if keys is None else np.concatenate([keys, chunk_keys])
+    if len(rows) > size:
+        keep = np.argpartition(keys, size)[:size]
+        rows, keys = rows.iloc[keep].reset_index(drop=True), keys[keep]
+    return rows, keys
+
+
+def collect_statistics(path, chunk_rows, seed):
+    counts = {col: Counter() for col in CATEGORICAL + [TARGET]}
+    moments = {col: _Moments() for col in NUMERIC}
+    nulls = Counter()
+    rows, reservoir, keys = 0, None, None
+    rng = np.random.default_rng([seed, 0])
+    for chunk in iter_chunks(path, chunk_rows):
+        rows += len(chunk)
+        for col in counts:
+            counts[col].update(chunk[col].value_counts().to_dict())
+            nulls[col] += int(chunk[col].isna().sum())
+        for col in NUMERIC:
+            values = chunk[col].to_numpy(dtype=float)
+            moments[col].add(values)
+            nulls[col] += int(np.isnan(values).sum())
+        reservoir, keys = _reservoir_merge(reservoir, keys, chunk, rng, RESERVOIR_ROWS)
+    if rows == 0:
+        raise ValueError(f"{path} has no rows")
+    return {"rows": rows, "counts": counts, "moments": moments, "nulls": nulls, "reservoir": reservoir}
+
+
+def build_preprocessing(stats):
+    """Imputation values, LabelEncoders and a StandardScaler from the pass-1 statistics."""
+    fill = {col: _mode(stats["counts"][col]) for col in CATEGORICAL + [TARGET]}
+    fill.update({col: float(stats["reservoir"][col].median()) for col in NUMERIC})
+
+    label_encoders = {}
+    means, variances = [], []
+    for col in FEATURES:
+        if col in CATEGORICAL:
+            counts = stats["counts"][col].copy()
+            counts[fill[col]] += stats["nulls"][col]
+            le = LabelEncoder()
+            le.classes_ = np.array(sorted(counts), dtype=object)
+            label_encoders[col] = le
+            codes = np.arange(len(le.classes_), dtype=float)
+            weights = np.array([counts[c] for c in le.classes_], dtype=float)
+            mean = float((codes * weights).sum() / weights.sum())
+            means.append(mean)
+            variances.append(float((weights * (codes - mean) ** 2).sum() / weights.sum()))
+        else:
+            m = _Moments()
+            m.merge(stats["moments"][col].n, stats["moments"][col].mean, stats["moments"][col].m2)
+            m.merge(stats["nulls"][col], fill[col], 0.0)   # imputed rows sit at the median
+            means.append(m.mean)
+            variances.append(m.m2 / m.n)
+
+    scaler = StandardScaler()
+    scaler.n_features_in_ = len(FEATURES)
+    scaler.feature_names_in_ = np.array(FEATURES, dtype=object)
+    scaler.n_samples_seen_ = np.int64(stats["rows"])
+    scaler.mean_ = np.array(means)
+    scaler.var_ = np.array(variances)
+    scaler.scale_ = np.where(scaler.var_ > 0, np.sqrt(scaler.var_), 1.0)
+    return fill, label_encoders, scaler
+
+
+# ── Passes 2+: incremental fit ────────────────────────────────────────────────
+
+def impute(chunk, fill):
+    return chunk.fillna({col: fill[col] for col in CATEGORICAL + NUMERIC + [TARGET]})
+
+
+def transform(chunk, fill, label_encoders, scaler):
+    """Impute, encode and scale one chunk. Returns (X_scaled, y)."""
+    chunk = impute(chunk, fill)
+    X = chunk[FEATURES].copy()
+    for col, le in label_encoders.items():
+        X[col] = le.transform(X[col])
+    y = (chunk[TARGET] == "Y").astype(int).to_numpy()
+    return scaler.transform(X), y
+
+
+def _split(n, chunk_index, seed):
+    return np.random.default_rng([seed, 1, chunk_index]).random(n) < TEST_SIZE
+
+
+def as_logistic_regression(sgd, n_iter):
+    """Carry SGD weights over to the estimator type the API has always loaded."""
+    model = LogisticRegression(**DEFAULT_PARAMS)
+    model.classes_ = sgd.classes_.copy()
+    model.coef_ = sgd.coef_.copy()
+    model.intercept_ = sgd.intercept_.copy()
+    model.n_features_in_ = sgd.n_features_in_
+    model.n_iter_ = np.array([n_iter], dtype=np.int32)
+    return model
+
+
+def train_chunked(path, chunk_rows=200_000, epochs=5, alpha=1e-4, seed=42, run_params=None):
+    stats = collect_statistics(path, chunk_rows, seed)
+    fill, label_encoders, scaler = build_preprocessing(stats)
+    print(f"Pass 1: {stats['rows']:,} rows, reservoir {len(stats['reservoir']):,}")
+
+    sgd = SGDClassifier(loss="log_loss", alpha=alpha, average=True, random_state=seed)
+    classes = np.array([0, 1])
+    for epoch in range(epochs):
+        for i, chunk in enumerate(iter_chunks(path, chunk_rows)):
+            X, y = transform(chunk, fill, label_encoders, scaler)
+            train = ~_split(len(y), i, seed)
+            order = np.random.default_rng([seed, 2, epoch, i]).permutation(int(train.sum()))
+            sgd.partial_fit(X[train][order], y[train][order], classes=classes)
+        print(f"Epoch {epoch + 1}/{epochs} done")
+
+    tp = fp = fn = correct = total = 0
+    for i, chunk in enumerate(iter_chunks(path, chunk_rows)):
+        X, y = transform(chunk, fill, label_encoders, scaler)
+        test = _split(len(y), i, seed)
+        pred = sgd.predict(X[test])
+        truth = y[test]
+        tp += int(((pred == 1) & (truth == 1)).sum())
+        fp += int(((pred == 1) & (truth == 0)).sum())
+        fn += int(((pred == 0) & (truth == 1)).sum())
+        correct += int((pred == truth).sum())
+        total += len(truth)
+    acc = correct / total if total else 0.0
+    f1 = 2 * tp / (2 * tp + fp + fn) if tp + fp + fn else 0.0
+
+    model = as_logistic_regression(sgd, epochs)
+    sample = impute(stats["reservoir"], fill)
+    X_sample, _ = transform(stats["reservoir"], fill, label_encoders, scaler)
+    profile = build_reference_profile(sample[FEATURES], model.predict_proba(X_sample)[:, 1])
+    profile["rows"] = stats["rows"]
+
+    with mlflow.start_run():
+        mlflow.log_params({"mode": "chunked", "solver": "sgd_log_loss_averaged", "alpha": alpha,
+                           "epochs": epochs, "chunk_rows": chunk_rows, "rows": stats["rows"],
+                           "data": os.path.basename(path), **(run_params or {})})
+        return save_artifacts(model, scaler, label_encoders, X_sample[:SHAP_BACKGROUND_ROWS], acc, f1, profile)
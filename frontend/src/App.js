@@ -1,4 +1,4 @@
-﻿import React, { useState, useEffect } from "react";
+﻿import React, { useState, useEffect, useRef } from "react";
 import axios from "axios";
 import { PieChart, Pie, Cell, ResponsiveContainer, Tooltip } from "recharts";
 import { toast, ToastContainer } from "react-toastify";
@@ -26,6 +26,8 @@ const selectOptions = {
 };
 
 const numericFields = ["ApplicantIncome", "CoapplicantIncome", "LoanAmount", "Loan_Amount_Term", "Credit_History"];
+const APPLICATIONS_PAGE_SIZE = 100;
+const RISK_FILTER_LEVELS = { low: "Low Risk", medium: "Medium Risk", high: "High Risk" };
 
 /* ── Global dark dashboard CSS ── */
 const DASH_CSS = `
@@ -114,6 +116,10 @@ function Dashboard({ token, onLogout }) {
   const [errors, setErrors] = useState({});
   const [result, setResult] = useState(null);
   const [applications, setApplications] = useState([]);
+  const [nextAfterId, setNextAfterId] = useState(null);
+  const [totalEstimate, setTotalEstimate] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const applicationsRequest = useRef(0);
   const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(false);
   const [activeTab, setActiveTab] = useState("predict");
@@ -157,9 +163,24 @@ function Dashboard({ token, onLogout }) {
     } finally { setLoading(false); }
   };
 
-  const fetchApplications = async () => {
-    try { const res = await axios.get(`${API_BASE}/applications`, authHeaders); setApplications(res.data); }
+  // Keyset pages of APPLICATIONS_PAGE_SIZE; status / risk filters are applied by the server,
+  // so "Load more" walks the whole filtered table rather than the newest rows only
+  const fetchApplications = async (afterId = null) => {
+    const requestId = ++applicationsRequest.current;
+    const params = { limit: APPLICATIONS_PAGE_SIZE };
+    if (afterId !== null) params.after_id = afterId;
+    if (filterStatus !== "all") params.status = filterStatus;
+    if (filterRisk !== "all") params.risk_level = RISK_FILTER_LEVELS[filterRisk];
+    if (afterId !== null) setLoadingMore(true);
+    try {
+      const res = await axios.get(`${API_BASE}/applications`, { ...authHeaders, params });
+      if (requestId !== applicationsRequest.current) return; // a newer filter / refresh superseded this page
+      setApplications(prev => afterId === null ? res.data.items : [...prev, ...res.data.items]);
+      setNextAfterId(res.data.next_after_id);
+      setTotalEstimate(res.data.total_estimate);
+    }
     catch (e) { if (e.response?.status === 401) onLogout(); }
+    finally { if (afterId !== null) setLoadingMore(false); }
   };
 
   const fetchStats = async () => {
@@ -177,7 +198,8 @@ function Dashboard({ token, onLogout }) {
     } catch (e) { if (e.response?.status === 401) onLogout(); }
   };
 
-  useEffect(() => { fetchApplications(); fetchStats(); }, []);
+  useEffect(() => { fetchStats(); }, []);
+  useEffect(() => { fetchApplications(); }, [filterStatus, filterRisk]);
 
   const pieData = stats ? [
     { name: "Approved", value: stats.approved, color: "#22c55e" },
@@ -625,6 +647,19 @@ function Dashboard({ token, onLogout }) {
                           )}
                         </tbody>
                       </table>
+                      {nextAfterId !== null && (
+                        <div style={{ padding: 12, textAlign: "center" }}>
+                          <button onClick={() => fetchApplications(nextAfterId)} disabled={loadingMore}
+                            style={{
+                              padding: "8px 18px", background: "rgba(255,255,255,0.04)",
+                              border: "1px solid rgba(255,255,255,0.08)", borderRadius: 10,
+                              color: "rgba(148,163,184,0.8)", fontSize: 11, fontWeight: 700,
+                              cursor: loadingMore ? "wait" : "pointer"
+                            }}>
+                            {loadingMore ? "Loading…" : `Load more (${applications.length.toLocaleString()} of ~${(totalEstimate ?? 0).toLocaleString()})`}
+                          </button>
+                        </div>
+                      )}
                     </div>
                   </div>
                 </div>
@@ -25,6 +25,38 @@ const axisProps = {
     axisLine: false, tickLine: false,
 };
 
+// Date windows sent to /analytics/dashboard as date_from (and date_to for "custom")
+const RANGES = [
+    { key: "all", label: "All Time", days: null },
+    { key: "7d", label: "Last 7 Days", days: 7 },
+    { key: "30d", label: "Last 30 Days", days: 30 },
+    { key: "90d", label: "Last 90 Days", days: 90 },
+    { key: "custom", label: "Custom Range", days: null },
+];
+
+const controlStyle = {
+    padding: "8px 14px", background: "rgba(255,255,255,0.05)",
+    border: "1px solid rgba(255,255,255,0.09)", borderRadius: 10, colorScheme: "dark",
+    color: "rgba(148,163,184,0.7)", fontSize: 11, fontWeight: 700, cursor: "pointer", letterSpacing: 1,
+};
+
+const isoDay = (d) =>
+    `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, "0")}-${String(d.getDate()).padStart(2, "0")}`;
+
+function windowParams(range, customFrom, customTo) {
+    if (range === "custom") {
+        const params = {};
+        if (customFrom) params.date_from = customFrom;
+        if (customTo) params.date_to = customTo;
+        return params;
+    }
+    const days = RANGES.find(r => r.key === range).days;
+    if (!days) return {};
+    const from = new Date();
+    from.setDate(from.getDate() - (days - 1));
+    return { date_from: isoDay(from) };
+}
+
 function Analytics({ token }) {
     const [trends, setTrends] = useState([]);
     const [income, setIncome] = useState([]);
@@ -33,30 +65,41 @@ function Analytics({ token }) {
     const [areaStats, setAreaStats] = useState([]);
     const [drift, setDrift] = useState(null);
     const [loading, setLoading] = useState(true);
+    const [loaded, setLoaded] = useState(false);
+    const [range, setRange] = useState("all");
+    const [customFrom, setCustomFrom] = useState("");
+    const [customTo, setCustomTo] = useState("");
 
     const headers = { Authorization: `Bearer ${token}` };
 
     useEffect(() => {
-        const fetchAll = async () => {
+        axios.get(`${API_BASE}/drift-status`, { headers })
+            .then(d => setDrift(d.data))
+            .catch(e => console.error(e));
+    }, [token]);
+
+    useEffect(() => {
+        const fetchDashboard = async () => {
             setLoading(true);
             try {
-                const [t, i, r, l, a, d] = await Promise.all([
-                    axios.get(`${API_BASE}/analytics/trends`, { headers }),
-                    axios.get(`${API_BASE}/analytics/income-bracket`, { headers }),
-                    axios.get(`${API_BASE}/analytics/risk`, { headers }),
-                    axios.get(`${API_BASE}/analytics/loan-distribution`, { headers }),
-                    axios.get(`${API_BASE}/analytics/property-area`, { headers }),
-                    axios.get(`${API_BASE}/drift-status`, { headers }),
-                ]);
-                setTrends(t.data); setIncome(i.data); setRisk(r.data);
-                setLoanDist(l.data); setAreaStats(a.data); setDrift(d.data);
+                const dash = await axios.get(`${API_BASE}/analytics/dashboard`, {
+                    headers, params: windowParams(range, customFrom, customTo),
+                });
+                setTrends(dash.data.trends); setIncome(dash.data.income_bracket); setRisk(dash.data.risk);
+                setLoanDist(dash.data.loan_distribution); setAreaStats(dash.data.property_area);
             } catch (e) { console.error(e); }
-            finally { setLoading(false); }
+            finally { setLoading(false); setLoaded(true); }
         };
-        fetchAll();
-    }, [token]);
+        fetchDashboard();
+    }, [token, range, customFrom, customTo]);
 
-    if (loading) return (
+    // Without a window the backend keeps the trend line at its 30-day span
+    const rangeLabel = RANGES.find(r => r.key === range).label;
+    const trendLabel = range === "all" ? "Last 30 Days"
+        : range === "custom" ? `${customFrom || "Start"} → ${customTo || "Today"}` : rangeLabel;
+
+    // Full-page spinner only for the first load; a range change keeps the controls mounted
+    if (loading && !loaded) return (
         <div style={{
             display: "flex", flexDirection: "column", alignItems: "center",
             justifyContent: "center", padding: "80px 0", gap: 16
@@ -92,7 +135,10 @@ function Analytics({ token }) {
     };
 
     return (
-        <div style={{ display: "flex", flexDirection: "column", gap: 20, paddingBottom: 40 }}>
+        <div style={{
+            display: "flex", flexDirection: "column", gap: 20, paddingBottom: 40,
+            opacity: loading ? 0.6 : 1, transition: "opacity 0.2s",
+        }}>
             {/* Header */}
             <div style={{
                 display: "flex", alignItems: "center", justifyContent: "space-between",
@@ -104,7 +150,7 @@ function Analytics({ token }) {
                     </h2>
                     <p style={{ fontSize: 12, color: "rgba(148,163,184,0.4)" }}>Live model performance metrics</p>
                 </div>
-                <div style={{ display: "flex", gap: 10 }}>
+                <div style={{ display: "flex", gap: 10, alignItems: "center" }}>
                     <button style={{
                         padding: "8px 18px", background: "rgba(255,255,255,0.05)",
                         border: "1px solid rgba(255,255,255,0.09)", borderRadius: 10,
@@ -112,13 +158,18 @@ function Analytics({ token }) {
                     }}>
                         Export CSV
                     </button>
-                    <button style={{
-                        padding: "8px 18px", background: "rgba(255,255,255,0.05)",
-                        border: "1px solid rgba(255,255,255,0.09)", borderRadius: 10,
-                        color: "rgba(148,163,184,0.7)", fontSize: 11, fontWeight: 700, cursor: "pointer", letterSpacing: 1
-                    }}>
-                        Last 30 Days
-                    </button>
+                    {range === "custom" && (
+                        <>
+                            <input type="date" value={customFrom} max={customTo || undefined}
+                                onChange={e => setCustomFrom(e.target.value)} style={controlStyle} aria-label="From date" />
+                            <input type="date" value={customTo} min={customFrom || undefined}
+                                onChange={e => setCustomTo(e.target.value)} style={controlStyle} aria-label="To date" />
+                        </>
+                    )}
+                    <select value={range} onChange={e => setRange(e.target.value)} style={controlStyle}
+                        aria-label="Date range">
+                        {RANGES.map(r => <option key={r.key} value={r.key}>{r.label}</option>)}
+                    </select>
                 </div>
             </div>
 
@@ -174,7 +225,7 @@ function Analytics({ token }) {
 
             {/* Trend Line Chart */}
             <div style={cardStyle}>
-                <span style={sectionLabel}>Approval Trend — Last 30 Days</span>
+                <span style={sectionLabel}>Approval Trend — {trendLabel}</span>
                 {trends.length > 0 ? (
                     <ResponsiveContainer width="100%" height={280}>
                         <LineChart data={trends}>